@@ -0,0 +1,116 @@
+import json
+import re
+
+import numpy as np
+
+from ..db.local_search import ExactIndex
+
+_EQ = re.compile(r"""^(\w+) == ["'](.*)["']$""")
+_NE = re.compile(r"""^(\w+) != ["'](.*)["']$""")
+_IN = re.compile(r'^(\w+) in (\[.*\])$')
+
+
+class _Hit:
+    def __init__(self, id_field, key, score):
+        self.entity = {id_field: key}
+        self.id = key
+        self.score = score
+        self.distance = score
+
+
+class _FakeQueryIterator:
+    def __init__(self, rows, batch_size):
+        self._rows = rows
+        self._batch_size = batch_size
+
+    def next(self):
+        batch, self._rows = self._rows[:self._batch_size], self._rows[self._batch_size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class FakeCollection:
+    """
+    In-memory stand-in for a pymilvus Collection with one VARCHAR primary key
+    and one embedding field. Supports the calls and filter expressions this
+    service makes (==, !=, in, joined by "and"); search is exact cosine.
+    """
+
+    def __init__(self, name: str, id_field: str):
+        self.name = name
+        self.id_field = id_field
+        self.index = ExactIndex()
+
+    @property
+    def num_entities(self):
+        return len(self.index)
+
+    def load(self):
+        pass
+
+    def release(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def upsert(self, data):
+        ids, embeddings = data[0], data[1]
+        self.index.add([str(key) for key in ids], np.asarray(embeddings, dtype=np.float32))
+
+    insert = upsert
+
+    def delete(self, expr):
+        self.index.remove(self._matching(expr))
+
+    def query(self, expr, output_fields=None, limit=None):
+        rows = []
+        for key in self._matching(expr):
+            row = {self.id_field: key}
+            if output_fields and "embedding" in output_fields:
+                row["embedding"] = self.index.get(key).tolist()
+            rows.append(row)
+        return rows[:limit] if limit else rows
+
+    def query_iterator(self, batch_size=1000, expr=None, output_fields=None, limit=None):
+        return _FakeQueryIterator(self.query(expr, output_fields, limit), batch_size)
+
+    def search(self, data, anns_field, param, limit, expr=None, output_fields=None):
+        excluded, included = self._filters(expr)
+        results = self.index.search(np.asarray(data, dtype=np.float32), limit, exclude=[excluded] * len(data), include=included)
+        return [[_Hit(self.id_field, key, score) for key, score in hits] for hits in results]
+
+    def _filters(self, expr):
+        excluded, included = [], None
+        for clause in (expr.split(" and ") if expr else []):
+            clause = clause.strip()
+            if _NE.match(clause):
+                if _NE.match(clause).group(2):
+                    excluded.append(_NE.match(clause).group(2))
+            elif _EQ.match(clause):
+                included = [_EQ.match(clause).group(2)]
+            elif _IN.match(clause):
+                included = json.loads(_IN.match(clause).group(2))
+            else:
+                raise ValueError(f"FakeCollection cannot evaluate expression: {clause}")
+        return excluded, included
+
+    def _matching(self, expr):
+        excluded, included = self._filters(expr)
+        keys = included if included is not None else list(self.index._rows)
+        return [key for key in keys if key in self.index and key not in excluded]
+
+
+class FakeMilvus:
+    """Registry of fake collections, callable like pymilvus.Collection(name)."""
+
+    def __init__(self):
+        self.collections = {
+            "participants": FakeCollection("participants", "pid"),
+            "hackathons": FakeCollection("hackathons", "hid"),
+        }
+
+    def __call__(self, name, *args, **kwargs):
+        return self.collections[name]
@@ -0,0 +1,110 @@
+"""
+Recall-vs-latency sweep for the participant vector search.
+
+Loads every participant vector into an exact (brute-force) index, samples
+stored vectors as queries and, for each ef (HNSW) or nprobe (IVF) value,
+measures recall@k of the approximate search against the exact top-k together
+with per-query latency:
+
+    python -m python_src.benchmarks.recall_sweep --values 16 32 64 128 256 --top-k 10
+    python -m python_src.benchmarks.recall_sweep --engine local --values 1 4 8 16 32
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ..db.index_manager import describe_index, search_params
+from ..db.local_search import ExactIndex, IVFIndex, load_participants_from_milvus
+from ..db.milvus_client import ensure_loaded, get_participant_collection
+
+
+def _milvus_searcher(collection, parameter, top_k):
+    def search(query, exclude, value):
+        param = search_params(collection, top_k + 1, **{parameter: value})
+        hits = collection.search(
+            data=[query.tolist()], anns_field="embedding", param=param,
+            limit=top_k + 1, expr=None, output_fields=["pid"],
+        )[0]
+        return [hit.entity.get("pid") for hit in hits if hit.entity.get("pid") != exclude][:top_k]
+    return search
+
+
+def _local_searcher(exact, top_k):
+    ivf = IVFIndex()
+    live = np.flatnonzero(exact._valid[:exact._size])
+    ivf.add([exact._ids[i] for i in live], exact._matrix[live])
+    ivf.train()
+
+    def search(query, exclude, value):
+        return [pid for pid, _ in ivf.search([query], top_k, exclude=[[exclude]], nprobe=value)[0]]
+    return search
+
+
+def run_sweep(values, top_k: int = 10, queries: int = 200, engine: str = "milvus", seed: int = 0):
+    exact = ExactIndex()
+    load_participants_from_milvus(exact)
+    if len(exact) <= top_k:
+        raise ValueError(f"Need more than {top_k} participant vectors, found {len(exact)}")
+
+    rng = np.random.default_rng(seed)
+    live = np.flatnonzero(exact._valid[:exact._size])
+    sample = rng.choice(live, size=min(queries, len(live)), replace=False)
+    query_ids = [exact._ids[i] for i in sample]
+    query_vectors = exact._matrix[sample]
+    truth = exact.search(query_vectors, top_k, exclude=[[pid] for pid in query_ids])
+
+    if engine == "local":
+        parameter, index_type = "nprobe", "IVF (local)"
+        search = _local_searcher(exact, top_k)
+    else:
+        collection = ensure_loaded(get_participant_collection())
+        index_type, _ = describe_index(collection)
+        parameter = "ef" if index_type == "HNSW" else "nprobe"
+        search = _milvus_searcher(collection, parameter, top_k)
+
+    rows = []
+    for value in values:
+        # Warm up caches and connections before timing
+        search(query_vectors[0], query_ids[0], value)
+        recalls, latencies = [], []
+        for query, pid, expected in zip(query_vectors, query_ids, truth):
+            started = time.perf_counter()
+            found = search(query, pid, value)
+            latencies.append(time.perf_counter() - started)
+            expected_ids = {hit for hit, _ in expected}
+            recalls.append(len(expected_ids & set(found)) / len(expected_ids))
+        latencies_ms = np.asarray(latencies) * 1000.0
+        rows.append({
+            parameter: value,
+            "recall_mean": float(np.mean(recalls)),
+            "recall_p5": float(np.percentile(recalls, 5)),
+            "p50_ms": float(np.percentile(latencies_ms, 50)),
+            "p95_ms": float(np.percentile(latencies_ms, 95)),
+        })
+        print(f"{parameter}={value}: recall@{top_k} {rows[-1]['recall_mean']:.3f}, p95 {rows[-1]['p95_ms']:.2f}ms")
+
+    return {"engine": engine, "index_type": index_type, "vectors": len(exact), "queries": len(sample),
+            "top_k": top_k, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency for a range of ef / nprobe values")
+    parser.add_argument("--values", type=int, nargs="+", default=[8, 16, 32, 64, 128, 256])
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--engine", choices=["milvus", "local"], default="milvus")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    report = run_sweep(args.values, args.top_k, args.queries, args.engine)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Benchmarks for the embedding, upsert and recommendation hot paths.
+
+Milvus is replaced by an in-memory fake and Mongo / the job workers are
+switched off, so runs are reproducible and need no cluster. The embedding
+benchmarks use the real model unless --fake-embedder is given. Each
+benchmark runs in its own process, so its peak RSS is its own.
+
+    python -m python_src.benchmarks.run --output bench.json
+    python -m python_src.benchmarks.run --output new.json --compare bench.json --threshold 0.1
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _summarize(latencies, items_per_call=1, elapsed=None):
+    latencies_ms = np.asarray(latencies) * 1000.0
+    elapsed = elapsed if elapsed is not None else float(np.sum(latencies))
+    return {
+        "iterations": len(latencies),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mean_ms": float(np.mean(latencies_ms)),
+        "throughput_per_s": len(latencies) * items_per_call / elapsed if elapsed > 0 else 0.0,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _timed(fn, iterations, warmup=3):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _random_skills(rng, length):
+    return [f"skill-{rng.randrange(5000)}" for _ in range(length)]
+
+
+def _random_vectors(rng, n, dim):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _no_mongo():
+    raise RuntimeError("Mongo is not available in benchmarks")
+
+
+def _install_fakes(args):
+    from ..db import milvus_client, mongo_client
+    from ..utils import embedder, job_queue
+    from .fake_milvus import FakeMilvus
+
+    fake = FakeMilvus()
+    milvus_client.Collection = fake
+    milvus_client._milvus_connected = True
+    # Fail fast instead of waiting out the server selection timeout
+    mongo_client.connect_mongo = _no_mongo
+    mongo_client.connect_mongo_async = _no_mongo
+    # App startup would otherwise start workers polling the Mongo jobs collection
+    job_queue.job_queue.workers = 0
+
+    if args.fake_embedder:
+        rng = np.random.default_rng(0)
+
+        def fake_embed_batch(skill_lists):
+            return _random_vectors(rng, len(skill_lists), embedder.EMB_DIM)
+
+        embedder._embed_batch = fake_embed_batch
+        embedder._batcher.embed_fn = fake_embed_batch
+        embedder._model_ready.set()
+    else:
+        embedder.load_model()
+    return fake
+
+
+def bench_embedding(args, results, fake):
+    from ..utils import embedder
+
+    rng = random.Random(0)
+    for length in args.skill_lengths:
+        for batch_size in args.batch_sizes:
+            def run():
+                embedder._embed_batch([_random_skills(rng, length) for _ in range(batch_size)])
+            latencies = _timed(run, args.iterations)
+            results[f"embed_batch[b={batch_size},skills={length}]"] = _summarize(latencies, items_per_call=batch_size)
+
+    # End-to-end get_skill_embedding under concurrency: exercises the micro-batcher
+    # (unique skill lists so every call misses the embedding cache)
+    for concurrency in args.concurrency:
+        lists = [_random_skills(rng, 10) + [f"unique-{concurrency}-{i}"] for i in range(args.iterations * concurrency)]
+
+        def call(skills):
+            started = time.perf_counter()
+            embedder.get_skill_embedding(skills)
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            latencies = list(pool.map(call, lists))
+            elapsed = time.perf_counter() - started
+        results[f"get_skill_embedding[concurrency={concurrency}]"] = _summarize(latencies, elapsed=elapsed)
+
+
+def _seed(args, fake):
+    from ..utils import embedder
+
+    rng = np.random.default_rng(1)
+    pids = [f"user-{i}" for i in range(args.participants)]
+    hids = [f"hackathon-{i}" for i in range(args.hackathons)]
+    fake.collections["participants"].upsert([pids, _random_vectors(rng, len(pids), embedder.EMB_DIM)])
+    fake.collections["hackathons"].upsert([hids, _random_vectors(rng, len(hids), embedder.EMB_DIM)])
+    return pids, hids
+
+
+def bench_insert(args, results, fake):
+    from ..db import milvus_client
+    from ..utils import embedder
+
+    pids, _ = _seed(args, fake)
+    vectors = _random_vectors(np.random.default_rng(2), args.iterations + 3, embedder.EMB_DIM)
+    counter = iter(range(len(vectors)))
+
+    def insert():
+        i = next(counter)
+        milvus_client.insert_participant(pid=pids[i % len(pids)], embedding=vectors[i])
+    results["insert_participant"] = _summarize(_timed(insert, args.iterations))
+    milvus_client.flush_write_buffers()
+
+
+def bench_recommend(args, results, fake):
+    from ..utils import recommender
+
+    pids, hids = _seed(args, fake)
+    pick = random.Random(2)
+
+    def recommend():
+        recommender.recommend_teammates(pidx=pick.choice(pids), hidx=pick.choice(hids), top_k=10)
+    results["recommend_teammates"] = _summarize(_timed(recommend, args.iterations))
+
+
+def bench_route(args, results, fake):
+    from fastapi.testclient import TestClient
+    from ..main import app
+
+    pids, _ = _seed(args, fake)
+    pick = random.Random(2)
+    with TestClient(app) as client:
+        def route():
+            response = client.get("/getTeammateRecommendations", params={"uidx": pick.choice(pids), "top_k": 50})
+            response.raise_for_status()
+        results["GET /getTeammateRecommendations"] = _summarize(_timed(route, args.iterations))
+
+
+BENCHMARKS = {
+    "embedding": bench_embedding,
+    "insert": bench_insert,
+    "recommend": bench_recommend,
+    "route": bench_route,
+}
+
+
+def _run_benchmark(name, args):
+    """Body of one benchmark process: fakes, then the benchmark itself. Returns its results."""
+    fake = _install_fakes(args)
+    results = {}
+    BENCHMARKS[name](args, results, fake)
+    return results
+
+
+def compare(current, baseline, threshold):
+    """Return a list of regressions: p95 latency up or throughput down by more than threshold."""
+    regressions = []
+    for name, now in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] > 0 and now["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {now['p95_ms']:.2f}ms")
+        if before["throughput_per_s"] > 0 and now["throughput_per_s"] < before["throughput_per_s"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_per_s']:.1f}/s -> {now['throughput_per_s']:.1f}/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding, upsert and recommendation hot paths")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--skill-lengths", type=int, nargs="+", default=[3, 10, 30])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--participants", type=int, default=20000)
+    parser.add_argument("--hackathons", type=int, default=100)
+    parser.add_argument("--fake-embedder", action="store_true", help="random vectors instead of the model")
+    parser.add_argument("--skip-embedding", action="store_true")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    # Keep benchmark state out of the working directory; set before the service modules are imported
+    scratch = tempfile.mkdtemp(prefix="bench-")
+    os.environ.setdefault("WRITE_BUFFER_WAL_DIR", os.path.join(scratch, "wal"))
+    os.environ.setdefault("EMBED_CACHE_DIR", "")
+    os.environ.setdefault("LOCAL_SEARCH_SNAPSHOT", "")
+
+    results = {}
+    # A fresh interpreter per benchmark: no model, buffers or peak RSS carried over from the previous one
+    context = multiprocessing.get_context("spawn")
+    for name in BENCHMARKS:
+        if name == "embedding" and args.skip_embedding:
+            continue
+        with context.Pool(1) as pool:
+            results.update(pool.apply(_run_benchmark, (name, args)))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "fake_embedder": args.fake_embedder,
+            "embed_backend": os.getenv("EMBED_BACKEND", "torch"),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
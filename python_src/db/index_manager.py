@@ -0,0 +1,160 @@
+"""
+Vector index management for the Milvus collections.
+
+Creates or rebuilds HNSW / IVF_FLAT / IVF_SQ8 indexes (COSINE metric) with
+build parameters sized to the collection, and turns per-request ef / nprobe
+overrides into search parameters that match the index actually in place:
+
+    python -m python_src.db.index_manager --collection participants --index-type HNSW --rebuild
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+
+from .milvus_client import ensure_milvus_connected, get_participant_collection, get_hackathon_collection, _loaded_collections
+from ..utils.metrics import timed_milvus
+
+INDEX_TYPES = ("HNSW", "IVF_FLAT", "IVF_SQ8")
+MILVUS_INDEX_TYPE = os.getenv("MILVUS_INDEX_TYPE", "HNSW")
+METRIC_TYPE = "COSINE"
+EMBEDDING_FIELD = "embedding"
+
+# Defaults when a request does not override them; None derives them from the index
+MILVUS_SEARCH_EF = int(os.getenv("MILVUS_SEARCH_EF", "0")) or None
+MILVUS_SEARCH_NPROBE = int(os.getenv("MILVUS_SEARCH_NPROBE", "0")) or None
+# How long a process trusts its copy of a collection's index description, seconds;
+# a rebuild run from another process is picked up after at most this long
+INDEX_INFO_TTL = float(os.getenv("INDEX_INFO_TTL", "60"))
+
+_index_info = {}  # collection name -> (expires at, (index_type, build params))
+_index_info_lock = threading.Lock()
+
+
+def build_params(index_type: str, num_rows: int) -> dict:
+    """Index build parameters scaled to the number of vectors."""
+    if index_type == "HNSW":
+        # Larger graphs need more links per node to keep recall at the same ef
+        if num_rows < 100_000:
+            return {"M": 16, "efConstruction": 200}
+        if num_rows < 5_000_000:
+            return {"M": 24, "efConstruction": 300}
+        return {"M": 32, "efConstruction": 400}
+    if index_type in ("IVF_FLAT", "IVF_SQ8"):
+        # ~4 * sqrt(n) clusters, rounded to a power of two
+        nlist = 2 ** round(math.log2(max(16, 4 * math.sqrt(max(1, num_rows)))))
+        return {"nlist": int(min(65536, nlist))}
+    raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+
+
+def default_search_params(index_type: str, params: dict, top_k: int) -> dict:
+    """Recall-oriented defaults for an index: ef >= top_k, nprobe ~ nlist / 16."""
+    if index_type == "HNSW":
+        return {"ef": max(64, top_k)}
+    if index_type in ("IVF_FLAT", "IVF_SQ8"):
+        return {"nprobe": max(8, params.get("nlist", 128) // 16)}
+    return {}
+
+
+def describe_index(collection):
+    """(index_type, build params) of the collection's embedding index, or (None, {}) if it has none."""
+    with _index_info_lock:
+        entry = _index_info.get(collection.name)
+        if entry is not None and entry[0] >= time.monotonic():
+            return entry[1]
+    info = (None, {})
+    for index in getattr(collection, "indexes", []):
+        if index.field_name == EMBEDDING_FIELD:
+            info = (index.params.get("index_type"), _build_params_of(index.params))
+            break
+    _remember_index_info(collection.name, info)
+    return info
+
+
+def _remember_index_info(name: str, info):
+    with _index_info_lock:
+        _index_info[name] = (time.monotonic() + INDEX_INFO_TTL, info)
+
+
+def _build_params_of(index_params: dict) -> dict:
+    # Depending on the server version the build params come nested (possibly as
+    # a JSON string) or flattened next to index_type, with values as strings
+    params = index_params.get("params")
+    if isinstance(params, str):
+        params = json.loads(params)
+    if params is None:
+        params = {k: v for k, v in index_params.items() if k not in ("index_type", "metric_type")}
+    return {k: int(v) if str(v).isdigit() else v for k, v in params.items()}
+
+
+def search_params(collection, top_k: int, ef: int = None, nprobe: int = None) -> dict:
+    """
+    Milvus search parameters for the collection's current index. ef applies to
+    HNSW and nprobe to IVF indexes; an override for the other kind is ignored.
+    """
+    index_type, params = describe_index(collection)
+    values = default_search_params(index_type, params, top_k)
+    if index_type == "HNSW":
+        ef = ef or MILVUS_SEARCH_EF
+        if ef:
+            # Milvus rejects ef below the requested limit
+            values["ef"] = max(int(ef), top_k)
+    elif index_type in ("IVF_FLAT", "IVF_SQ8"):
+        nprobe = nprobe or MILVUS_SEARCH_NPROBE
+        if nprobe:
+            values["nprobe"] = min(int(nprobe), params.get("nlist", int(nprobe)))
+    return {"metric_type": METRIC_TYPE, "params": values}
+
+
+def ensure_index(collection, index_type: str = MILVUS_INDEX_TYPE, rebuild: bool = False):
+    """
+    Create the embedding index if missing. With rebuild=True an existing index
+    of a different type, or built for a very different collection size, is
+    dropped and rebuilt (the collection is unavailable for search meanwhile).
+    """
+    ensure_milvus_connected()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+
+    collection.flush()
+    wanted = build_params(index_type, collection.num_entities)
+    with _index_info_lock:
+        _index_info.pop(collection.name, None)
+    current_type, current_params = describe_index(collection)
+    if current_type == index_type and current_params == wanted:
+        return current_type, current_params
+    if current_type is not None:
+        if not rebuild:
+            print(f"Note: {collection.name} keeps its {current_type} index {current_params}; pass rebuild to apply {index_type} {wanted}")
+            return current_type, current_params
+        collection.release()
+        _loaded_collections.discard(collection.name)
+        collection.drop_index()
+
+    with timed_milvus("create_index", collection.name):
+        collection.create_index(
+            field_name=EMBEDDING_FIELD,
+            index_params={"index_type": index_type, "metric_type": METRIC_TYPE, "params": wanted},
+        )
+    _remember_index_info(collection.name, (index_type, wanted))
+    print(f"✅ Built {index_type} index on {collection.name} ({collection.num_entities} vectors) with {wanted}")
+    return index_type, wanted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or rebuild the Milvus vector indexes")
+    parser.add_argument("--collection", choices=["participants", "hackathons", "all"], default="all")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=MILVUS_INDEX_TYPE)
+    parser.add_argument("--rebuild", action="store_true", help="drop and rebuild an index that differs")
+    args = parser.parse_args()
+
+    collections = {"participants": get_participant_collection, "hackathons": get_hackathon_collection}
+    for name, get_collection in collections.items():
+        if args.collection in (name, "all"):
+            ensure_index(get_collection(), args.index_type, rebuild=args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
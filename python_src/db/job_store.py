@@ -0,0 +1,211 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from .mongo_client import get_async_jobs_collection
+
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SUPERSEDED = "superseded"
+
+_indexes_ready = False
+
+
+class JobSuperseded(Exception):
+    """A newer job for the same key was enqueued; the current one should stop."""
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+async def ensure_job_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    jobs = get_async_jobs_collection()
+    await jobs.create_index([("status", 1), ("_id", 1)])
+    await jobs.create_index([("type", 1), ("key", 1), ("status", 1)])
+    # Finished jobs are removed by Mongo once they are older than the retention period
+    await jobs.create_index("finishedAt", expireAfterSeconds=JOB_RETENTION_SECONDS)
+    _indexes_ready = True
+
+
+async def enqueue_job(job_type: str, key: str, payload: dict) -> dict:
+    """
+    Persist a queued job and supersede older jobs with the same (type, key):
+    queued ones are dropped, running ones are told to stop at their next
+    progress report (and cannot record a success), so only the latest
+    request for a key takes effect.
+    """
+    await ensure_job_indexes()
+    jobs = get_async_jobs_collection()
+    now = _now()
+    job = {
+        "_id": ObjectId(),
+        "type": job_type,
+        "key": key,
+        "payload": payload,
+        "status": QUEUED,
+        "stage": QUEUED,
+        "progress": 0.0,
+        "attempts": 0,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    await jobs.insert_one(job)
+
+    # ObjectIds increase with creation time, so only strictly older jobs are superseded
+    older = {"type": job_type, "key": key, "_id": {"$lt": job["_id"]}}
+    await jobs.update_many(
+        {**older, "status": QUEUED},
+        {"$set": {"status": SUPERSEDED, "supersededBy": job["_id"], "finishedAt": now, "updatedAt": now}},
+    )
+    await jobs.update_many(
+        {**older, "status": RUNNING},
+        {"$set": {"supersededBy": job["_id"], "updatedAt": now}},
+    )
+    return job
+
+
+def _owned(job_id, worker_id: str) -> dict:
+    # A worker whose lease expired and was re-claimed elsewhere no longer matches
+    return {"_id": job_id, "status": RUNNING, "worker": worker_id}
+
+
+async def active_job(job_type: str, key: str):
+    """The newest queued or running job for (type, key), or None."""
+    return await get_async_jobs_collection().find_one(
+        {"type": job_type, "key": key, "status": {"$in": [QUEUED, RUNNING]}}, sort=[("_id", -1)],
+    )
+
+
+async def claim_next_job(worker_id: str):
+    """
+    Atomically take the oldest queued job, or a running one whose worker
+    stopped renewing its lease. Jobs of a (type, key) that already has a live
+    running job wait for it, so same-key jobs never run side by side and the
+    newest one always writes last.
+    """
+    jobs = get_async_jobs_collection()
+    now = _now()
+    live = {"status": RUNNING, "leaseUntil": {"$gte": now}}
+    busy = [{"type": job["type"], "key": job["key"]} async for job in jobs.find(live, {"type": 1, "key": 1})]
+    claimable = {"$or": [{"status": QUEUED}, {"status": RUNNING, "leaseUntil": {"$lt": now}}]}
+    if busy:
+        claimable["$nor"] = busy
+    job = await jobs.find_one_and_update(
+        claimable,
+        {
+            "$set": {
+                "status": RUNNING,
+                "worker": worker_id,
+                "startedAt": now,
+                "updatedAt": now,
+                "leaseUntil": now + timedelta(seconds=JOB_LEASE_SECONDS),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("_id", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    # Two workers can claim same-key jobs between the busy read and the claim; the older job goes first
+    if job is not None and await jobs.find_one(
+        {**live, "type": job["type"], "key": job["key"], "_id": {"$lt": job["_id"]}}, {"_id": 1},
+    ):
+        await jobs.update_one(
+            _owned(job["_id"], worker_id),
+            {"$set": {"status": QUEUED, "updatedAt": _now()}, "$unset": {"leaseUntil": "", "worker": ""},
+             "$inc": {"attempts": -1}},
+        )
+        return None
+    return job
+
+
+async def report_progress(job_id, worker_id: str, stage: str, progress: float):
+    """
+    Record progress and renew the lease; raises JobSuperseded if a newer job
+    replaced this one or this worker no longer holds it.
+    """
+    jobs = get_async_jobs_collection()
+    now = _now()
+    job = await jobs.find_one_and_update(
+        _owned(job_id, worker_id),
+        {"$set": {
+            "stage": stage,
+            "progress": progress,
+            "updatedAt": now,
+            "leaseUntil": now + timedelta(seconds=JOB_LEASE_SECONDS),
+        }},
+        projection={"supersededBy": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None or job.get("supersededBy") is not None:
+        raise JobSuperseded(str(job_id))
+
+
+async def renew_lease(job_id, worker_id: str) -> bool:
+    """Extend this worker's lease; False if the job is no longer its to run."""
+    now = _now()
+    renewed = await get_async_jobs_collection().update_one(
+        _owned(job_id, worker_id),
+        {"$set": {"leaseUntil": now + timedelta(seconds=JOB_LEASE_SECONDS)}},
+    )
+    return renewed.matched_count == 1
+
+
+async def finish_job(job_id, worker_id: str, status: str, result=None, error: str = None) -> str:
+    """
+    Record the outcome of a job this worker holds. A success of a job that
+    was superseded meanwhile is recorded as superseded. Returns the status
+    written, or None if the job was no longer this worker's.
+    """
+    jobs = get_async_jobs_collection()
+    now = _now()
+    update = {"status": status, "updatedAt": now, "finishedAt": now}
+    match = _owned(job_id, worker_id)
+    if status == SUCCEEDED:
+        update.update(stage="done", progress=1.0, result=result)
+        match["supersededBy"] = None
+    if error is not None:
+        update["error"] = error
+    finished = await jobs.update_one(match, {"$set": update, "$unset": {"leaseUntil": ""}})
+    if finished.matched_count:
+        return status
+    if status == SUCCEEDED:
+        return await finish_job(job_id, worker_id, SUPERSEDED)
+    return None
+
+
+async def release_job(job_id, worker_id: str):
+    """Put a job this worker was running back in the queue (e.g. on shutdown)."""
+    await get_async_jobs_collection().update_one(
+        _owned(job_id, worker_id),
+        {"$set": {"status": QUEUED, "updatedAt": _now()}, "$unset": {"leaseUntil": "", "worker": ""}},
+    )
+
+
+async def get_job(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        return None
+    return await get_async_jobs_collection().find_one({"_id": ObjectId(job_id)})
+
+
+def job_to_response(job: dict) -> dict:
+    """Public view of a job document."""
+    response = {"jobId": str(job["_id"])}
+    for field in ("type", "key", "status", "stage", "progress", "attempts", "result", "error",
+                  "createdAt", "startedAt", "finishedAt"):
+        if job.get(field) is not None:
+            response[field] = job[field]
+    if job.get("supersededBy") is not None:
+        response["supersededBy"] = str(job["supersededBy"])
+    return response
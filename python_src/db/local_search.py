@@ -0,0 +1,485 @@
+import fcntl
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+LOCAL_SEARCH_ENGINE = os.getenv("LOCAL_SEARCH_ENGINE", "exact")  # exact | ivf
+LOCAL_SEARCH_SNAPSHOT = os.getenv("LOCAL_SEARCH_SNAPSHOT", ".local_search/participants")
+LOCAL_SEARCH_BLOCK_ROWS = int(os.getenv("LOCAL_SEARCH_BLOCK_ROWS", "65536"))
+# Rebuild from Milvus this often (seconds) so writes from other processes show up; 0 builds once.
+# A snapshot older than this is not served.
+LOCAL_SEARCH_REFRESH_SECONDS = float(os.getenv("LOCAL_SEARCH_REFRESH_SECONDS", "300"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 picks ~4*sqrt(n) at training time
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+
+
+def _normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    """Indices of the k highest scores of a 1-D array, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+class ExactIndex:
+    """
+    Brute-force cosine search over L2-normalized vectors.
+
+    Vectors live in one float32 matrix; removed rows are masked and reused.
+    Scoring is a blocked matrix product against all live rows followed by
+    argpartition, so memory stays bounded by LOCAL_SEARCH_BLOCK_ROWS per query batch.
+    """
+
+    kind = "exact"
+
+    def __init__(self, dim: int = None):
+        self.dim = dim
+        self._matrix = None
+        self._valid = np.zeros(0, dtype=bool)
+        self._ids = []
+        self._rows = {}
+        self._free = []
+        self._size = 0  # rows handed out so far (live + free)
+        self._dirty = False  # changed since the last save / restore
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def add(self, ids, vectors):
+        """Insert or replace vectors for ids."""
+        vectors = _normalize(vectors)
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[0] == 0:
+                self.dim = vectors.shape[1]
+                self._matrix = np.zeros((1024, self.dim), dtype=np.float32)
+                self._valid = np.zeros(1024, dtype=bool)
+                self._ids, self._rows, self._free, self._size = [], {}, [], 0
+            elif not self._matrix.flags.writeable:
+                # Restored from a read-only memory-mapped snapshot: copy on first write
+                self._matrix = np.array(self._matrix)
+            rows = [self._row_for(key) for key in ids]
+            self._matrix[rows] = vectors
+            self._valid[rows] = True
+            self._dirty = True
+            self._on_add(np.asarray(rows), vectors)
+
+    def remove(self, ids):
+        with self._lock:
+            for key in ids:
+                row = self._rows.pop(key, None)
+                if row is not None:
+                    self._valid[row] = False
+                    self._ids[row] = None
+                    self._free.append(row)
+                    self._dirty = True
+
+    def get(self, key):
+        with self._lock:
+            row = self._rows.get(key)
+            return None if row is None else self._matrix[row].copy()
+
+    def search(self, queries, top_k: int, exclude=None, include=None):
+        """
+        Cosine top-k for each query vector.
+
+        exclude: one iterable of ids per query that must not be returned.
+        include: optional iterable of ids to restrict the search to.
+        Returns one list of (id, score) per query, best first.
+        """
+        queries = _normalize(queries)
+        with self._lock:
+            if self._matrix is None or not self._rows or top_k <= 0:
+                return [[] for _ in range(len(queries))]
+            exclude_rows = [self._rows_of(ids) for ids in exclude] if exclude is not None else None
+            if include is not None:
+                candidates = self._rows_of(include)
+                return self._search_rows(queries, candidates, top_k, exclude_rows)
+            return self._search_all(queries, top_k, exclude_rows)
+
+    def _search_all(self, queries, top_k, exclude_rows):
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, self._size, LOCAL_SEARCH_BLOCK_ROWS):
+            end = min(start + LOCAL_SEARCH_BLOCK_ROWS, self._size)
+            scores = queries @ self._matrix[start:end].T
+            scores[:, ~self._valid[start:end]] = -np.inf
+            if exclude_rows is not None:
+                for q, rows in enumerate(exclude_rows):
+                    local = rows[(rows >= start) & (rows < end)] - start
+                    scores[q, local] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end), scores.shape)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        return [self._hits(best_rows[q], best_scores[q], top_k) for q in range(len(queries))]
+
+    def _search_rows(self, queries, candidates, top_k, exclude_rows):
+        """Score only the given rows (used for include filters and IVF probing)."""
+        results = []
+        for q, query in enumerate(queries):
+            rows = candidates[q] if isinstance(candidates, list) else candidates
+            if exclude_rows is not None and len(exclude_rows[q]):
+                rows = rows[~np.isin(rows, exclude_rows[q])]
+            rows = rows[self._valid[rows]]
+            scores = self._matrix[rows] @ query
+            results.append(self._hits(rows, scores, top_k))
+        return results
+
+    def _hits(self, rows, scores, top_k):
+        order = _top_k(scores, top_k)
+        return [(self._ids[rows[i]], float(scores[i])) for i in order if np.isfinite(scores[i])]
+
+    def _rows_of(self, ids):
+        return np.fromiter((self._rows[key] for key in ids if key in self._rows), dtype=np.int64)
+
+    def _row_for(self, key):
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = self._size
+            self._size += 1
+            if row >= self._matrix.shape[0]:
+                grow = self._matrix.shape[0]
+                self._matrix = np.concatenate([self._matrix, np.zeros((grow, self.dim), dtype=np.float32)])
+                self._valid = np.concatenate([self._valid, np.zeros(grow, dtype=bool)])
+        while len(self._ids) <= row:
+            self._ids.append(None)
+        self._ids[row] = key
+        self._rows[key] = row
+        return row
+
+    def _on_add(self, rows, vectors):
+        pass
+
+    def save(self, path: str, force: bool = False) -> bool:
+        """
+        Snapshot to <path>.npy (vectors) and <path>.json (row ids); skipped when
+        nothing changed since the last save / restore. Files are written next to
+        the target and renamed into place, so a snapshot that is memory-mapped
+        (by this or another process) is never truncated under its readers.
+        """
+        with self._lock:
+            if not (self._dirty or force):
+                return False
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            matrix = self._matrix[:self._size] if self._matrix is not None else np.zeros((0, self.dim or 0), dtype=np.float32)
+            with open(f"{path}.npy.tmp", "wb") as f:
+                np.save(f, matrix)
+            with open(f"{path}.json.tmp", "w") as f:
+                json.dump({"kind": self.kind, "ids": self._ids[:self._size]}, f)
+            os.replace(f"{path}.npy.tmp", f"{path}.npy")
+            os.replace(f"{path}.json.tmp", f"{path}.json")
+            self._dirty = False
+            return True
+
+    def restore(self, path: str):
+        """Load a snapshot; vectors stay memory-mapped until the first write."""
+        with self._lock:
+            matrix = np.load(f"{path}.npy", mmap_mode="r")
+            with open(f"{path}.json") as f:
+                ids = json.load(f)["ids"]
+            self._matrix = matrix
+            self.dim = matrix.shape[1]
+            self._size = matrix.shape[0]
+            self._ids = list(ids)
+            self._rows = {key: row for row, key in enumerate(ids) if key is not None}
+            self._free = [row for row, key in enumerate(ids) if key is None]
+            self._valid = np.array([key is not None for key in ids], dtype=bool)
+            self._dirty = False
+        return self
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file approximate search: vectors are bucketed by their nearest
+    k-means centroid and a query only scores the nprobe closest buckets.
+    Falls back to exact search until train() has been called.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, dim: int = None, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = []  # centroid -> set of rows
+        self._list_rows = []  # centroid -> cached array of those rows, None when stale
+
+    def train(self, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """Spherical k-means over (a sample of) the live vectors, then bucket every row."""
+        with self._lock:
+            live = np.flatnonzero(self._valid[:self._size])
+            if len(live) == 0:
+                return
+            nlist = self.nlist or int(4 * np.sqrt(len(live)))
+            nlist = max(1, min(nlist, len(live)))
+            rng = np.random.default_rng(seed)
+            sample = self._matrix[rng.choice(live, size=min(sample_size, len(live)), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = ~sums.any(axis=1)
+                sums[empty] = centroids[empty]  # keep empty clusters where they were
+                centroids = _normalize(sums)
+            self._centroids = centroids
+            self._assign = np.full(self._matrix.shape[0], -1, dtype=np.int32)
+            for start in range(0, len(live), LOCAL_SEARCH_BLOCK_ROWS):
+                block = live[start:start + LOCAL_SEARCH_BLOCK_ROWS]
+                self._assign[block] = np.argmax(self._matrix[block] @ centroids.T, axis=1)
+            self._build_lists()
+
+    def _build_lists(self):
+        assigned = np.flatnonzero(self._assign[:self._size] >= 0)
+        order = assigned[np.argsort(self._assign[assigned], kind="stable")]
+        bounds = np.searchsorted(self._assign[order], np.arange(len(self._centroids) + 1))
+        self._list_rows = [order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))]
+        self._lists = [set(rows.tolist()) for rows in self._list_rows]
+
+    def _assign_rows(self, rows, vectors):
+        if len(self._assign) < self._matrix.shape[0]:
+            self._assign = np.concatenate([self._assign, np.full(self._matrix.shape[0] - len(self._assign), -1, dtype=np.int32)])
+        labels = np.argmax(vectors @ self._centroids.T, axis=1)
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            previous = self._assign[row]
+            if previous == label:
+                continue
+            if previous >= 0:
+                self._lists[previous].discard(row)
+                self._list_rows[previous] = None
+            self._lists[label].add(row)
+            self._list_rows[label] = None
+            self._assign[row] = label
+
+    def _list(self, centroid):
+        rows = self._list_rows[centroid]
+        if rows is None:
+            rows = self._list_rows[centroid] = np.fromiter(self._lists[centroid], dtype=np.int64)
+        return rows
+
+    def _on_add(self, rows, vectors):
+        if self._centroids is not None:
+            self._assign_rows(rows, vectors)
+
+    def search(self, queries, top_k: int, exclude=None, include=None, nprobe: int = None):
+        if self._centroids is None or include is not None:
+            return super().search(queries, top_k, exclude=exclude, include=include)
+        queries = _normalize(queries)
+        nprobe = min(nprobe or self.nprobe, len(self._centroids))
+        with self._lock:
+            probes = np.argsort(-(queries @ self._centroids.T), axis=1)[:, :nprobe]
+            # Only the probed inverted lists are touched; removed rows are masked in _search_rows
+            candidates = [np.concatenate([self._list(c) for c in probe]) for probe in probes]
+            exclude_rows = [self._rows_of(ids) for ids in exclude] if exclude is not None else None
+            return self._search_rows(queries, candidates, top_k, exclude_rows)
+
+    def save(self, path: str, force: bool = False) -> bool:
+        with self._lock:
+            if not super().save(path, force):
+                return False
+            if self._centroids is not None:
+                with open(f"{path}.ivf.npz.tmp", "wb") as f:
+                    np.savez(f, centroids=self._centroids, assign=self._assign[:self._size])
+                os.replace(f"{path}.ivf.npz.tmp", f"{path}.ivf.npz")
+            return True
+
+    def restore(self, path: str):
+        with self._lock:
+            super().restore(path)
+            if os.path.exists(f"{path}.ivf.npz"):
+                data = np.load(f"{path}.ivf.npz")
+                self._centroids = data["centroids"]
+                self._assign = np.array(data["assign"])
+                self._build_lists()
+        return self
+
+
+def create_index(kind: str = LOCAL_SEARCH_ENGINE):
+    if kind == "ivf":
+        return IVFIndex()
+    return ExactIndex()
+
+
+_participant_index = None
+_participant_index_lock = threading.Lock()
+_snapshot_lock = None  # held open by the one process that writes the snapshot
+_journal = None  # this process' writes made while a rebuild streams Milvus
+_maintainer = None
+
+
+def get_participant_index():
+    """
+    Process-wide local participant index, or None while it is still being
+    built (callers fall back to Milvus). The first call starts the background
+    thread that restores / builds it and keeps it reconciled with Milvus.
+    """
+    if _participant_index is None:
+        start_participant_index()
+    return _participant_index
+
+
+def start_participant_index():
+    global _maintainer
+    with _participant_index_lock:
+        if _maintainer is None:
+            _maintainer = threading.Thread(target=_maintain_participant_index, name="local-search-refresh", daemon=True)
+            _maintainer.start()
+
+
+def _restore_snapshot():
+    """Install LOCAL_SEARCH_SNAPSHOT if it is recent enough to serve; returns its age in seconds, or None."""
+    global _participant_index
+    if not LOCAL_SEARCH_SNAPSHOT or not os.path.exists(f"{LOCAL_SEARCH_SNAPSHOT}.json"):
+        return None
+    age = time.time() - os.path.getmtime(f"{LOCAL_SEARCH_SNAPSHOT}.json")
+    if 0 < LOCAL_SEARCH_REFRESH_SECONDS < age:
+        # Too old to serve as exact results; build from Milvus instead
+        return None
+    index = create_index().restore(LOCAL_SEARCH_SNAPSHOT)
+    with _participant_index_lock:
+        _participant_index = index
+    print(f"✅ Restored local participant index ({len(index)} vectors) from {LOCAL_SEARCH_SNAPSHOT}")
+    return age
+
+
+def _maintain_participant_index():
+    if LOCAL_SEARCH_SNAPSHOT:
+        _claim_snapshot_writer()
+    age = _restore_snapshot()
+    if age is not None and LOCAL_SEARCH_REFRESH_SECONDS <= 0:
+        return
+    delay = 0.0 if age is None else LOCAL_SEARCH_REFRESH_SECONDS - age
+    while True:
+        time.sleep(max(0.0, delay))
+        try:
+            rebuild_participant_index()
+        except Exception as e:
+            print(f"❌ Error rebuilding local participant index: {str(e)}")
+            delay = 30.0
+            continue
+        if LOCAL_SEARCH_REFRESH_SECONDS <= 0:
+            return
+        delay = LOCAL_SEARCH_REFRESH_SECONDS
+
+
+def rebuild_participant_index():
+    """
+    Stream the Milvus collection into a new index and swap it in. Picks up
+    writes made by other workers and tools (bulk sync, change sync, snapshot
+    import), which the running index never sees.
+    """
+    global _participant_index, _journal
+    index = create_index()
+    with _participant_index_lock:
+        _journal = []
+    try:
+        load_participants_from_milvus(index)
+    except BaseException:
+        with _participant_index_lock:
+            _journal = None
+        raise
+    with _participant_index_lock:
+        # Writes made here during the stream may be missing from it; replay them on top.
+        # Replay and swap share one lock hold, so no write falls between the two
+        for op, pids, embeddings in _journal:
+            if op == "add":
+                index.add(pids, embeddings)
+            else:
+                index.remove(pids)
+        _participant_index, _journal = index, None
+    if _snapshot_lock is not None:
+        index.save(LOCAL_SEARCH_SNAPSHOT)
+
+
+def load_participants_from_milvus(index, batch_size: int = 2000):
+    from .milvus_client import ensure_loaded, get_participant_collection
+
+    collection = ensure_loaded(get_participant_collection())
+    iterator = collection.query_iterator(batch_size=batch_size, expr="pid != ''", output_fields=["pid", "embedding"])
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            index.add([row["pid"] for row in batch], [row["embedding"] for row in batch])
+    finally:
+        iterator.close()
+    if isinstance(index, IVFIndex):
+        index.train()
+    print(f"✅ Built local participant index ({len(index)} vectors) from Milvus")
+
+
+def _record(op, pids, embeddings=None):
+    with _participant_index_lock:
+        index = _participant_index
+        if _journal is not None:
+            _journal.append((op, list(pids), embeddings))
+    return index
+
+
+def on_participants_upserted(pids, embeddings):
+    """Keep the local index current with this process' writes (no-op until the index is in use)."""
+    index = _record("add", pids, embeddings)
+    if index is not None:
+        index.add(pids, embeddings)
+
+
+def on_participants_removed(pids):
+    index = _record("remove", pids)
+    if index is not None:
+        index.remove(pids)
+
+
+def on_participants_cleared():
+    with _participant_index_lock:
+        index = _participant_index
+    if index is not None:
+        on_participants_removed(list(index._rows))
+
+
+def _claim_snapshot_writer() -> bool:
+    """
+    True if this process writes LOCAL_SEARCH_SNAPSHOT. The first process to
+    take the lock file keeps it for its lifetime, so concurrent workers never
+    write the snapshot over each other.
+    """
+    global _snapshot_lock
+    if _snapshot_lock is None:
+        os.makedirs(os.path.dirname(LOCAL_SEARCH_SNAPSHOT) or ".", exist_ok=True)
+        lock_file = open(f"{LOCAL_SEARCH_SNAPSHOT}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        _snapshot_lock = lock_file
+    return True
+
+
+def save_participant_index():
+    if _participant_index is not None and _snapshot_lock is not None:
+        _participant_index.save(LOCAL_SEARCH_SNAPSHOT)
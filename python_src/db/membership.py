@@ -0,0 +1,128 @@
+"""
+Hackathon membership (which participants are registered for which hackathon),
+read from Mongo and used to scope recommendation searches to an event.
+
+Milvus participants can belong to many hackathons, so membership is not a
+partition key; searches filter on the primary key (`pid in [...]`), which
+Milvus resolves per segment before scoring and so scales with the event
+rather than the whole user base.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from bson import ObjectId
+
+from .mongo_client import get_hackathons_collection, get_users_collection
+from .recommendation_cache import recommendation_cache
+from ..utils.metrics import timed
+
+# "hackathons": an array of registered users on each hackathon document;
+# "users": an array of joined hackathons on each user document
+MEMBERSHIP_SOURCE = os.getenv("MEMBERSHIP_SOURCE", "hackathons")
+HACKATHON_PARTICIPANTS_FIELD = os.getenv("HACKATHON_PARTICIPANTS_FIELD", "participants")
+USER_HACKATHONS_FIELD = os.getenv("USER_HACKATHONS_FIELD", "registeredHackathons")
+MEMBERSHIP_TTL = float(os.getenv("MEMBERSHIP_TTL", "120"))  # seconds
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "1000"))
+# Scope recommendation searches to the hackathon's participants
+SCOPE_SEARCH_TO_HACKATHON = os.getenv("SCOPE_SEARCH_TO_HACKATHON", "1") == "1"
+
+_UNKNOWN = object()
+
+
+def _member_id(entry):
+    # Registrations may be stored as ids or as embedded {"_id"/"userId"/"user": id} documents
+    if isinstance(entry, dict):
+        for field in ("userId", "user", "_id", "id"):
+            if entry.get(field) is not None:
+                return str(entry[field])
+        return None
+    return str(entry) if entry is not None else None
+
+
+def load_hackathon_members(hid: str):
+    """Registered participant ids of a hackathon, or None if the hackathon records no membership."""
+    if MEMBERSHIP_SOURCE == "users":
+        values = [hid] + ([ObjectId(hid)] if ObjectId.is_valid(hid) else [])
+        with timed("mongo_find", collection="users"):
+            users = frozenset(str(user["_id"]) for user in
+                              get_users_collection().find({USER_HACKATHONS_FIELD: {"$in": values}}, {"_id": 1}))
+        # No user lists the hackathon: unknown membership (e.g. a wrong field name), not an empty event
+        return users or None
+
+    if not ObjectId.is_valid(hid):
+        return None
+    with timed("mongo_find", collection="hackathons"):
+        doc = get_hackathons_collection().find_one({"_id": ObjectId(hid)}, {HACKATHON_PARTICIPANTS_FIELD: 1})
+    if doc is None or doc.get(HACKATHON_PARTICIPANTS_FIELD) is None:
+        return None
+    members = (_member_id(entry) for entry in doc[HACKATHON_PARTICIPANTS_FIELD])
+    return frozenset(member for member in members if member)
+
+
+class HackathonMembership:
+    """
+    TTL + LRU cache of hackathon -> frozenset of participant ids.
+
+    refresh() reloads a hackathon immediately (the /syncHackathonMembership
+    webhook); otherwise an entry is reloaded once its TTL expires. Whenever a
+    reload finds a different set, the hackathon's cached recommendations are
+    invalidated since they were ranked over the old set. Both members() and
+    refresh() may query Mongo synchronously, so async code calls them through
+    a thread.
+    """
+
+    def __init__(self, loader=load_hackathon_members, ttl: float = MEMBERSHIP_TTL, max_size: int = MEMBERSHIP_CACHE_SIZE):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0}
+
+    def members(self, hid: str):
+        """frozenset of registered pids, or None when membership is unknown (search unscoped)."""
+        with self._lock:
+            entry = self._entries.get(hid)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._entries.move_to_end(hid)
+                self.stats["hits"] += 1
+                return entry[1]
+        return self._load(hid)[1]
+
+    def refresh(self, hid: str) -> bool:
+        """Reload one hackathon now; True if its membership differs from the cached copy."""
+        previous, current = self._load(hid)
+        return previous is not _UNKNOWN and previous != current
+
+    def _load(self, hid):
+        members = self.loader(hid)
+        with self._lock:
+            previous = self._entries.get(hid, (None, _UNKNOWN))[1]
+            self._entries[hid] = (time.monotonic() + self.ttl, members)
+            self._entries.move_to_end(hid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self.stats["loads"] += 1
+        if previous is not _UNKNOWN and previous != members:
+            recommendation_cache.invalidate_hackathon(hid)
+        return previous, members
+
+    def get_stats(self):
+        return {**self.stats, "cached": len(self._entries)}
+
+
+membership = HackathonMembership()
+
+
+def hackathon_scope(hid: str):
+    """Ids a search for this hackathon may return, or None for an unscoped search."""
+    if not SCOPE_SEARCH_TO_HACKATHON:
+        return None
+    try:
+        return membership.members(str(hid))
+    except Exception as e:
+        # Degrade to an unscoped search rather than failing the recommendation
+        print(f"❌ Error loading membership for hackathon {hid}: {str(e)}")
+        return None
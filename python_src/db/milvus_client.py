@@ -1,7 +1,34 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pymilvus import connections
 from pymilvus import Collection
+from .write_buffer import WriteBehindBuffer
+from .recommendation_cache import recommendation_cache
+from .vector_store import VectorStore
+from .local_search import on_participants_upserted, on_participants_removed, on_participants_cleared
+from ..utils.metrics import timed_milvus
+
+# Queue single-item upserts and flush them to Milvus in the background
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+
+# Blocking Milvus calls made from async handlers run on this bounded pool so a
+# slow cluster cannot starve the event loop or Starlette's shared threadpool
+MILVUS_EXECUTOR_WORKERS = int(os.getenv("MILVUS_EXECUTOR_WORKERS", "16"))
 
 _milvus_connected = False
+_milvus_executor = ThreadPoolExecutor(max_workers=MILVUS_EXECUTOR_WORKERS, thread_name_prefix="milvus")
+_loaded_collections = set()
+_hackathon_buffer = None
+_participant_buffer = None
+
+# Local copies of embeddings this process wrote or fetched, so lookups skip Milvus
+_hackathon_vectors = VectorStore()
+_participant_vectors = VectorStore()
 
 def connect_milvus():
     global _milvus_connected
@@ -26,6 +53,13 @@ def ensure_milvus_connected():
     if not _milvus_connected:
         connect_milvus()
     
+async def run_milvus(fn, *args, **kwargs):
+    """Run a blocking Milvus helper on the dedicated Milvus executor."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context over so per-request timings are attributed correctly
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_milvus_executor, functools.partial(context.run, fn, *args, **kwargs))
+
 def get_hackathon_collection():
     ensure_milvus_connected()
     return Collection("hackathons")
@@ -34,66 +68,128 @@ def get_participant_collection():
     ensure_milvus_connected()
     return Collection("participants")
 
+def ensure_loaded(collection):
+    """Load a collection once per process instead of on every request."""
+    if collection.name not in _loaded_collections:
+        with timed_milvus("load", collection.name):
+            collection.load()
+        _loaded_collections.add(collection.name)
+    return collection
+
+def upsert_hackathons(hids: list, embeddings: list):
+    """Write hackathon embeddings with Milvus native upsert (no flush, no reload)."""
+    ensure_milvus_connected()
+    with timed_milvus("upsert", "hackathons"):
+        ensure_loaded(get_hackathon_collection()).upsert([hids, embeddings])
+
+def upsert_participants(pids: list, embeddings: list):
+    """Write participant embeddings with Milvus native upsert (no flush, no reload)."""
+    ensure_milvus_connected()
+    with timed_milvus("upsert", "participants"):
+        ensure_loaded(get_participant_collection()).upsert([pids, embeddings])
+
+def _get_hackathon_buffer():
+    global _hackathon_buffer
+    if _hackathon_buffer is None:
+        _hackathon_buffer = WriteBehindBuffer("hackathons", upsert_hackathons)
+    return _hackathon_buffer
+
+def _get_participant_buffer():
+    global _participant_buffer
+    if _participant_buffer is None:
+        _participant_buffer = WriteBehindBuffer("participants", upsert_participants)
+    return _participant_buffer
+
+def flush_write_buffers():
+    """Push every buffered write to Milvus now (used on shutdown)."""
+    for buffer in (_hackathon_buffer, _participant_buffer):
+        if buffer is not None:
+            buffer.flush()
+
 def insert_hackathon(hid: str, embedding: list):
     """
     Insert or update hackathon embedding in Milvus (upsert logic).
-    If hackathon exists, deletes old entry and inserts new one.
+    With WRITE_BEHIND enabled the write is logged and queued, and reaches
+    Milvus on the next buffer flush; otherwise it is upserted directly.
     """
-    ensure_milvus_connected()
-    collection = get_hackathon_collection()
-    collection.load()  # Load collection for querying
-    
-    try:
-        # Check if hackathon already exists
-        existing = collection.query(
-            expr=f'hid == "{hid}"',
-            output_fields=["hid"]
-        )
-        
-        # If exists, delete old entry first (upsert behavior)
-        if existing:
-            print(f"Updating existing hackathon {hid} in Milvus")
-            collection.delete(expr=f'hid == "{hid}"')
-            collection.flush()
-        else:
-            print(f"Inserting new hackathon {hid} into Milvus")
-    except Exception as e:
-        print(f"Note: Could not check existing hackathon (will insert): {str(e)}")
-    
-    # Insert new embedding
-    collection.insert([[hid], [embedding]])
-    collection.flush()  # Ensure data is persisted
-    collection.load()  # Reload collection to make data queryable immediately
+    if WRITE_BEHIND:
+        _get_hackathon_buffer().put(hid, embedding)
+    else:
+        upsert_hackathons([hid], [embedding])
+    _hackathon_vectors.put(hid, embedding)
+    recommendation_cache.invalidate_hackathon(hid)
     print(f"✅ Hackathon {hid} synced to Milvus successfully")
 
 def insert_participant(pid: str, embedding: list):
     """
     Insert or update participant embedding in Milvus (upsert logic).
-    If participant exists, deletes old entry and inserts new one.
+    With WRITE_BEHIND enabled the write is logged and queued, and reaches
+    Milvus on the next buffer flush; otherwise it is upserted directly.
     """
-    ensure_milvus_connected()
-    collection = get_participant_collection()
-    collection.load()  # Load collection for querying
-    
-    try:
-        # Check if participant already exists
-        existing = collection.query(
-            expr=f'pid == "{pid}"',
-            output_fields=["pid"]
-        )
-        
-        # If exists, delete old entry first (upsert behavior)
-        if existing:
-            collection.delete(expr=f'pid == "{pid}"')
-            collection.flush()
-    except Exception as e:
-        print(f"Note: Could not check existing participant (will insert): {str(e)}")
-    
-    # Insert new embedding
-    collection.insert([[pid], [embedding]])
-    collection.flush()  # Ensure data is persisted
-    collection.load()  # Reload collection to make data queryable immediately
-    
+    if WRITE_BEHIND:
+        _get_participant_buffer().put(pid, embedding)
+    else:
+        upsert_participants([pid], [embedding])
+    _participant_vectors.put(pid, embedding)
+    on_participants_upserted([pid], [embedding])
+    recommendation_cache.invalidate_participant(pid)
+
+def _get_embedding(key: str, buffer, vectors: VectorStore, get_collection, id_field: str):
+    # Unflushed writes first, then the local vector cache, then a Milvus query
+    if buffer is not None:
+        embedding = buffer.get(key)
+        if embedding is not None:
+            return embedding
+    embedding = vectors.get(key)
+    if embedding is not None:
+        return embedding
+    collection = ensure_loaded(get_collection())
+    with timed_milvus("query", collection.name):
+        data = collection.query(expr=f'{id_field} == "{key}"', output_fields=["embedding"])
+    if not data:
+        return None
+    vectors.put(key, data[0]["embedding"])
+    return np.asarray(data[0]["embedding"], dtype=np.float32)
+
+def _in_expr(field: str, ids) -> str:
+    # json.dumps yields a double-quoted, escaped list literal that Milvus accepts
+    return f"{field} in {json.dumps([str(i) for i in ids])}"
+
+def _get_embeddings(keys, buffer, vectors: VectorStore, get_collection, id_field: str):
+    # Same lookup order as _get_embedding, but all misses share one `in` query
+    found = {}
+    for key in keys:
+        embedding = buffer.get(key) if buffer is not None else None
+        if embedding is not None:
+            found[key] = embedding
+    found.update(vectors.get_many([key for key in keys if key not in found]))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        collection = ensure_loaded(get_collection())
+        with timed_milvus("query", collection.name):
+            data = collection.query(expr=_in_expr(id_field, missing), output_fields=[id_field, "embedding"])
+        if data:
+            vectors.put_many([row[id_field] for row in data], [row["embedding"] for row in data])
+        for row in data:
+            found[row[id_field]] = np.asarray(row["embedding"], dtype=np.float32)
+    return found
+
+def get_hackathon_embeddings(hids):
+    """{hid: embedding} for every known hackathon in hids, with at most one Milvus query."""
+    return _get_embeddings(list(dict.fromkeys(hids)), _hackathon_buffer, _hackathon_vectors, get_hackathon_collection, "hid")
+
+def get_participant_embeddings(pids):
+    """{pid: embedding} for every known participant in pids, with at most one Milvus query."""
+    return _get_embeddings(list(dict.fromkeys(pids)), _participant_buffer, _participant_vectors, get_participant_collection, "pid")
+
+def get_hackathon_embedding(hid: str):
+    """Latest embedding for a hackathon, checking unflushed writes and the local cache before Milvus. None if unknown."""
+    return _get_embedding(hid, _hackathon_buffer, _hackathon_vectors, get_hackathon_collection, "hid")
+
+def get_participant_embedding(pid: str):
+    """Latest embedding for a participant, checking unflushed writes and the local cache before Milvus. None if unknown."""
+    return _get_embedding(pid, _participant_buffer, _participant_vectors, get_participant_collection, "pid")
+
 def batch_insert_hackathons(hids: list, embeddings: list):
     ensure_milvus_connected()
     collection = get_hackathon_collection()
@@ -106,43 +202,78 @@ def batch_insert_participants(pids: list, embeddings: list):
     collection.insert([pids, embeddings])
     collection.flush()  # ensure data is persisted
 
-def update_hackathon(hid: str, new_embedding: list):
+def batch_upsert_hackathons(hids: list, embeddings: list):
+    """
+    Replace many hackathon embeddings at once with a single native upsert.
+    Pending buffered writes for the same ids are dropped so they cannot
+    overwrite these newer values later. Flushing is left to the caller.
+    """
+    if _hackathon_buffer is not None:
+        _hackathon_buffer.discard(hids)
+    upsert_hackathons(hids, embeddings)
+    _hackathon_vectors.put_many(hids, embeddings)
+    for hid in hids:
+        recommendation_cache.invalidate_hackathon(hid)
+
+def batch_upsert_participants(pids: list, embeddings: list):
+    """
+    Replace many participant embeddings at once with a single native upsert.
+    Pending buffered writes for the same ids are dropped so they cannot
+    overwrite these newer values later. Flushing is left to the caller.
+    """
+    if _participant_buffer is not None:
+        _participant_buffer.discard(pids)
+    upsert_participants(pids, embeddings)
+    _participant_vectors.put_many(pids, embeddings)
+    on_participants_upserted(pids, embeddings)
+    for pid in pids:
+        recommendation_cache.invalidate_participant(pid)
+
+def batch_delete_hackathons(hids: list):
+    """Remove hackathon embeddings (buffered, cached and stored). Flushing is left to the caller."""
+    if _hackathon_buffer is not None:
+        _hackathon_buffer.discard(hids)
     ensure_milvus_connected()
-    collection = get_hackathon_collection()
-    collection.load()
-    
-    # Check if hid exists
-    existing = collection.query(
-        expr=f'hid == "{hid}"',
-        output_fields=["hid"]
-    )
-    
-    if not existing:
+    with timed_milvus("delete", "hackathons"):
+        ensure_loaded(get_hackathon_collection()).delete(expr=_in_expr("hid", hids))
+    for hid in hids:
+        _hackathon_vectors.remove(hid)
+        recommendation_cache.invalidate_hackathon(hid)
+
+def batch_delete_participants(pids: list):
+    """Remove participant embeddings (buffered, cached, indexed and stored). Flushing is left to the caller."""
+    if _participant_buffer is not None:
+        _participant_buffer.discard(pids)
+    ensure_milvus_connected()
+    with timed_milvus("delete", "participants"):
+        ensure_loaded(get_participant_collection()).delete(expr=_in_expr("pid", pids))
+    on_participants_removed(pids)
+    for pid in pids:
+        _participant_vectors.remove(pid)
+        recommendation_cache.invalidate_participant(pid)
+
+def flush_collection(collection_name: str):
+    ensure_milvus_connected()
+    with timed_milvus("flush", collection_name):
+        Collection(collection_name).flush()
+
+def update_hackathon(hid: str, new_embedding: list):
+    # Check if hid exists (including writes still in the buffer)
+    if get_hackathon_embedding(hid) is None:
         raise ValueError(f"Hackathon with hid '{hid}' not found")
     
-    # Update the embedding
-    collection.delete(expr=f'hid == "{hid}"')
-    collection.insert([[hid], [new_embedding]])
-    collection.flush()
+    # Update the embedding; evicts buffered / cached copies and cached recommendations
+    batch_upsert_hackathons([hid], [new_embedding])
+    flush_collection("hackathons")
 
 def update_participant(pid: str, new_embedding: list):
-    ensure_milvus_connected()
-    collection = get_participant_collection()
-    collection.load()
-    
-    # Check if pid exists
-    existing = collection.query(
-        expr=f'pid == "{pid}"',
-        output_fields=["pid"]
-    )
-    
-    if not existing:
+    # Check if pid exists (including writes still in the buffer)
+    if get_participant_embedding(pid) is None:
         raise ValueError(f"User with pid '{pid}' not found")
     
-    # Update the embedding
-    collection.delete(expr=f'pid == "{pid}"')
-    collection.insert([[pid], [new_embedding]])
-    collection.flush()
+    # Update the embedding; evicts buffered / cached copies and cached recommendations
+    batch_upsert_participants([pid], [new_embedding])
+    flush_collection("participants")
 
 def delete_all_entries(collection_name: str):
     ensure_milvus_connected()
@@ -156,11 +287,24 @@ def delete_all_entries(collection_name: str):
     else:
         expr = "1 == 1"  # Always true expression as fallback
     
+    # Buffered writes would otherwise re-create entries after the delete
+    buffer = {"participants": _participant_buffer, "hackathons": _hackathon_buffer}.get(collection_name)
+    if buffer is not None:
+        buffer.discard_all()
+    
     # Perform deletion
     delete_result = collection.delete(expr=expr)
     
     # Flush to ensure changes are persisted
     collection.flush()
     
+    # Drop every cached copy and every cached recommendation ranked over the old vectors
+    if collection_name == "participants":
+        _participant_vectors.clear()
+        on_participants_cleared()
+    elif collection_name == "hackathons":
+        _hackathon_vectors.clear()
+    recommendation_cache.invalidate_all()
+    
     print(f"Deleted all entries from {collection_name}")
     return delete_result
\ No newline at end of file
@@ -1,10 +1,35 @@
+import os
+
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 
 # Global connection state
 _mongo_connected = False
 _client = None
 _db = None
+_async_client = None
+_async_db = None
+
+# Field on user documents holding the list of skill strings
+USER_SKILLS_FIELD = os.getenv("USER_SKILLS_FIELD", "skills")
+
+
+def _client_options():
+    """Connection pool settings shared by the sync and async clients."""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "2")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "retryReads": True,
+    }
+    # e.g. "zstd,zlib" to trade a little CPU for less bandwidth on remote clusters
+    compressors = os.getenv("MONGO_COMPRESSORS")
+    if compressors:
+        options["compressors"] = compressors
+    return options
 
 def connect_mongo():
     global _mongo_connected, _client, _db
@@ -18,7 +43,7 @@ def connect_mongo():
     MONGO_DB = os.getenv("MONGO_DB")
 
     
-    _client = MongoClient(MONGO_URI)
+    _client = MongoClient(MONGO_URI, **_client_options())
     _db = _client[MONGO_DB]
     _mongo_connected = True
     print("✅ Mongo connected successfully")
@@ -45,4 +70,48 @@ def get_hackathons_collection():
 def get_users_collection():
     """Get users collection"""
     ensure_mongo_connected()
-    return _db["users"]
\ No newline at end of file
+    return _db["users"]
+
+def get_jobs_collection():
+    """Get background jobs collection"""
+    ensure_mongo_connected()
+    return _db["jobs"]
+
+def connect_mongo_async():
+    """Create the motor (asyncio) client used by async request handlers"""
+    global _async_client, _async_db
+
+    import os
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    _async_client = AsyncIOMotorClient(os.getenv("MONGO_URI"), **_client_options())
+    _async_db = _async_client[os.getenv("MONGO_DB")]
+    print("✅ Async Mongo client ready")
+
+def get_async_mongo_db():
+    """Get async MongoDB database instance"""
+    if _async_db is None:
+        connect_mongo_async()
+    return _async_db
+
+def get_async_hackathons_collection():
+    """Get async hackathons collection"""
+    return get_async_mongo_db()["hackathons"]
+
+def get_async_users_collection():
+    """Get async users collection"""
+    return get_async_mongo_db()["users"]
+
+def get_async_jobs_collection():
+    """Get async background jobs collection"""
+    return get_async_mongo_db()["jobs"]
+
+def get_async_sync_state_collection():
+    """Get async change-stream sync state collection (resume tokens, synced skill hashes)"""
+    return get_async_mongo_db()["vector_sync_state"]
+
+def get_async_materialized_recommendations_collection():
+    """Get async precomputed per-hackathon recommendations collection"""
+    return get_async_mongo_db()["materialized_recommendations"]
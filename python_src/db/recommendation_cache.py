@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", "300"))  # seconds
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000"))
+REDIS_URL = os.getenv("REDIS_URL")  # set to share the cache between workers
+
+
+class LocalCacheBackend:
+    """
+    In-process TTL + LRU store. Same interface as RedisCacheBackend, so it doubles as its test stand-in.
+
+    Counters expire once no stored entry can outlive them (the longest TTL
+    seen after their last increment), so they are bounded by the invalidation
+    rate. Increments hand out values from one process-wide sequence: a counter
+    that expired and is bumped again never repeats a value an older entry was
+    keyed with.
+    """
+
+    blocking = False  # safe to call on an event loop
+
+    def __init__(self, max_size: int = RECOMMENDATION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._counters = OrderedDict()  # key -> (expires_at, value), soonest expiry first
+        self._sequence = 0
+        self._max_ttl = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._max_ttl = max(self._max_ttl, ttl)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_counters(self, keys):
+        with self._lock:
+            self._expire_counters()
+            return [self._counters[key][1] if key in self._counters else 0 for key in keys]
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            now = self._expire_counters()
+            self._sequence += 1
+            # _max_ttl never shrinks, so appending keeps the dict ordered by expiry
+            self._counters[key] = (now + self._max_ttl, self._sequence)
+            self._counters.move_to_end(key)
+            return self._sequence
+
+    def _expire_counters(self) -> float:
+        now = time.monotonic()
+        while self._counters:
+            key, (expires_at, _) = next(iter(self._counters.items()))
+            if expires_at >= now:
+                break
+            del self._counters[key]
+        return now
+
+
+class RedisCacheBackend:
+    """Redis-backed store shared by every worker; LRU eviction is left to Redis' maxmemory policy."""
+
+    blocking = True  # network round trips: async callers run it on a thread
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("REDIS_URL is set but the 'redis' package is not installed") from e
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        value = self._redis.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value, ttl: float):
+        self._redis.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def get_counters(self, keys):
+        return [int(value or 0) for value in self._redis.mget(keys)]
+
+    def incr(self, key: str) -> int:
+        return self._redis.incr(key)
+
+
+class RecommendationCache:
+    """
+    Caches ranked recommendation lists keyed by (kind, uidx, hidx, top_k).
+
+    Every participant and hackathon has an embedding version counter that is
+    bumped whenever its embedding is upserted; the versions are part of the
+    cache key, so an update makes exactly the affected entries unreachable
+    while the TTL bounds staleness from other participants' changes. A global
+    counter, also in every key, drops everything at once (e.g. after a
+    collection is wiped).
+    """
+
+    def __init__(self, backend, ttl: float = RECOMMENDATION_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _key(self, kind, uidx, hidx, top_k):
+        version_keys = ["version:all", f"version:p:{uidx}"] + ([f"version:h:{hidx}"] if hidx is not None else [])
+        versions = ":".join(str(v) for v in self.backend.get_counters(version_keys))
+        return f"rec:{kind}:{uidx}:{hidx}:{top_k}:{versions}"
+
+    def lookup(self, kind: str, uidx: str, hidx, top_k: int):
+        """Return (key, cached result or None); pass the key to store() after computing."""
+        key = self._key(kind, uidx, hidx, top_k)
+        cached = self.backend.get(key)
+        self.stats["hits" if cached is not None else "misses"] += 1
+        return key, cached
+
+    def store(self, key: str, result):
+        self.backend.set(key, result, self.ttl)
+
+    def get_or_compute(self, kind: str, uidx: str, hidx, top_k: int, compute):
+        key, cached = self.lookup(kind, uidx, hidx, top_k)
+        if cached is not None:
+            return cached
+        result = compute()
+        self.store(key, result)
+        return result
+
+    def invalidate_participant(self, pid: str):
+        self.backend.incr(f"version:p:{pid}")
+        self.stats["invalidations"] += 1
+
+    def invalidate_hackathon(self, hid: str):
+        self.backend.incr(f"version:h:{hid}")
+        self.stats["invalidations"] += 1
+
+    def invalidate_all(self):
+        self.backend.incr("version:all")
+        self.stats["invalidations"] += 1
+
+    def get_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+recommendation_cache = RecommendationCache(RedisCacheBackend(REDIS_URL) if REDIS_URL else LocalCacheBackend())
@@ -1,16 +1,19 @@
 from pymilvus import FieldSchema, CollectionSchema, DataType, Collection, utility
-from milvus_client import connect_milvus
+from .milvus_client import connect_milvus
+from .index_manager import ensure_index
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+EMB_DIM = int(os.getenv("EMB_DIM", "768"))
+
 def create_collections():
     connect_milvus()
     # Participants collection
     if not utility.has_collection("participants"):
         participant_fields = [
             FieldSchema(name="pid", dtype=DataType.VARCHAR, max_length=64, is_primary=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=os.getenv("EMB_DIM")),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=EMB_DIM),
         ]
         participants_schema = CollectionSchema(participant_fields, description="Participants collection")
         Collection(name="participants", schema=participants_schema)
@@ -19,9 +22,14 @@ def create_collections():
     if not utility.has_collection("hackathons"):
         hackathon_fields = [
             FieldSchema(name="hid", dtype=DataType.VARCHAR, max_length=64, is_primary=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=os.getenv("EMB_DIM")),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=EMB_DIM),
         ]
         hackathon_schema = CollectionSchema(hackathon_fields, description="Hackathons collection")
         Collection(name="hackathons", schema=hackathon_schema)
 
-create_collections()
\ No newline at end of file
+    # Collections cannot be loaded for search without an index
+    ensure_index(Collection("participants"))
+    ensure_index(Collection("hackathons"))
+
+if __name__ == "__main__":
+    create_collections()
@@ -0,0 +1,180 @@
+"""
+Snapshot export / import of the embedding collections.
+
+Export streams every (id, embedding) pair out of Milvus with a query
+iterator into <path>.npy (float32 matrix, one row per id) and <path>.json
+(row ids plus metadata). Only one iterator batch is held in memory: vectors
+are appended to a raw scratch file and the .npy header is written once the
+row count is known. The .json uses the same layout as a local search index
+snapshot, so ExactIndex().restore(path) can serve or benchmark straight
+from an export.
+
+Import memory-maps the .npy and upserts it in large chunks, which restores a
+collection in minutes instead of re-embedding every user:
+
+    python -m python_src.db.snapshot export --collection participants --path snapshots/participants
+    python -m python_src.db.snapshot import --collection participants --path snapshots/participants
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .milvus_client import ensure_loaded, flush_write_buffers, get_hackathon_collection, get_participant_collection
+from ..utils.metrics import timed_milvus
+
+SNAPSHOT_EXPORT_BATCH_SIZE = int(os.getenv("SNAPSHOT_EXPORT_BATCH_SIZE", "2000"))
+SNAPSHOT_IMPORT_BATCH_SIZE = int(os.getenv("SNAPSHOT_IMPORT_BATCH_SIZE", "5000"))
+EMB_DIM = int(os.getenv("EMB_DIM", "768"))
+
+COLLECTIONS = {
+    "participants": ("pid", get_participant_collection),
+    "hackathons": ("hid", get_hackathon_collection),
+}
+
+_COPY_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def _collection_dim(collection):
+    """Embedding dimension declared in the collection schema, if it can be read."""
+    try:
+        for field in collection.schema.fields:
+            if field.name == "embedding":
+                return int(field.params["dim"])
+    except Exception:
+        pass
+    return None
+
+
+def export_collection(collection_name: str, path: str, batch_size: int = SNAPSHOT_EXPORT_BATCH_SIZE):
+    """Write <path>.npy / <path>.json for one collection. Returns the snapshot metadata."""
+    id_field, get_collection = COLLECTIONS[collection_name]
+    # Buffered writes from this process would otherwise be missing from the snapshot
+    flush_write_buffers()
+    collection = ensure_loaded(get_collection())
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    started = time.perf_counter()
+    raw_path, ids_tmp = f"{path}.npy.part", f"{path}.json.tmp"
+    count, dim = 0, None
+    iterator = collection.query_iterator(batch_size=batch_size, expr=f"{id_field} != ''", output_fields=[id_field, "embedding"])
+    try:
+        with open(raw_path, "wb") as raw, open(ids_tmp, "w") as ids:
+            ids.write('{"kind": "exact", "ids": [')
+            while True:
+                with timed_milvus("query_iterator", collection_name):
+                    batch = iterator.next()
+                if not batch:
+                    break
+                vectors = np.asarray([row["embedding"] for row in batch], dtype=np.float32)
+                if dim is None:
+                    dim = vectors.shape[1]
+                raw.write(vectors.tobytes())
+                ids.write(("," if count else "") + ",".join(json.dumps(str(row[id_field])) for row in batch))
+                count += len(batch)
+            dim = dim or _collection_dim(collection) or EMB_DIM
+            meta = {
+                "collection": collection_name,
+                "id_field": id_field,
+                "count": count,
+                "dim": dim,
+                "exported_at": datetime.now(timezone.utc).isoformat(),
+            }
+            ids.write("], " + json.dumps(meta)[1:])
+    finally:
+        iterator.close()
+
+    # Prepend the .npy header now that the shape is known, copying in bounded chunks
+    npy_tmp = f"{path}.npy.tmp"
+    with open(npy_tmp, "wb") as out, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(out, {"descr": "<f4", "fortran_order": False, "shape": (count, dim)})
+        while True:
+            chunk = raw.read(_COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            out.write(chunk)
+    os.remove(raw_path)
+    os.replace(npy_tmp, f"{path}.npy")
+    os.replace(ids_tmp, f"{path}.json")
+
+    print(f"✅ Exported {count} {collection_name} vectors to {path}.npy in {time.perf_counter() - started:.1f}s")
+    return meta
+
+
+def load_snapshot(path: str):
+    """(ids, memory-mapped float32 matrix, metadata) of a snapshot."""
+    matrix = np.load(f"{path}.npy", mmap_mode="r")
+    with open(f"{path}.json") as f:
+        data = json.load(f)
+    ids = data.pop("ids")
+    if len(ids) != matrix.shape[0]:
+        raise ValueError(f"Snapshot {path} has {len(ids)} ids but {matrix.shape[0]} vectors")
+    return ids, matrix, data
+
+
+def import_collection(path: str, collection_name: str = None, batch_size: int = SNAPSHOT_IMPORT_BATCH_SIZE,
+                      insert: bool = False):
+    """
+    Load a snapshot into a collection (the one it was exported from by default).
+    insert=True skips the upsert's delete step, for a freshly created collection.
+    Returns the number of vectors written.
+    """
+    ids, matrix, meta = load_snapshot(path)
+    collection_name = collection_name or meta.get("collection")
+    if collection_name not in COLLECTIONS:
+        raise ValueError(f"Unknown collection: {collection_name}")
+    _, get_collection = COLLECTIONS[collection_name]
+    collection = get_collection()
+    expected_dim = _collection_dim(collection)
+    if expected_dim is not None and len(ids) and matrix.shape[1] != expected_dim:
+        raise ValueError(f"Snapshot dim {matrix.shape[1]} does not match {collection_name} dim {expected_dim}")
+
+    started = time.perf_counter()
+    write = collection.insert if insert else collection.upsert
+    for start in range(0, len(ids), batch_size):
+        end = min(start + batch_size, len(ids))
+        with timed_milvus("insert" if insert else "upsert", collection_name):
+            write([ids[start:end], np.asarray(matrix[start:end], dtype=np.float32).tolist()])
+    with timed_milvus("flush", collection_name):
+        collection.flush()
+
+    print(f"✅ Imported {len(ids)} {collection_name} vectors from {path}.npy in {time.perf_counter() - started:.1f}s")
+    return len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import embedding collection snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="stream a collection to <path>.npy / <path>.json")
+    export_parser.add_argument("--collection", choices=[*COLLECTIONS, "all"], default="all")
+    export_parser.add_argument("--path", required=True, help="output prefix; with --collection all, a directory")
+    export_parser.add_argument("--batch-size", type=int, default=SNAPSHOT_EXPORT_BATCH_SIZE)
+
+    import_parser = subparsers.add_parser("import", help="bulk-load a snapshot back into Milvus")
+    import_parser.add_argument("--collection", choices=list(COLLECTIONS), help="defaults to the exported collection")
+    import_parser.add_argument("--path", required=True, help="snapshot prefix (without .npy / .json), or an export directory")
+    import_parser.add_argument("--batch-size", type=int, default=SNAPSHOT_IMPORT_BATCH_SIZE)
+    import_parser.add_argument("--insert", action="store_true", help="insert instead of upsert (empty collection)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for name in COLLECTIONS:
+            if args.collection == "all":
+                export_collection(name, os.path.join(args.path, name), args.batch_size)
+            elif args.collection == name:
+                export_collection(name, args.path, args.batch_size)
+    elif os.path.isdir(args.path):
+        # A directory written by `export --collection all`
+        for name in COLLECTIONS:
+            if args.collection in (None, name) and os.path.exists(os.path.join(args.path, f"{name}.npy")):
+                import_collection(os.path.join(args.path, name), name, args.batch_size, insert=args.insert)
+    else:
+        import_collection(args.path, args.collection, args.batch_size, insert=args.insert)
+
+
+if __name__ == "__main__":
+    main()
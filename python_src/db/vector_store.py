@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+VECTOR_CACHE_MAX_ROWS = int(os.getenv("VECTOR_CACHE_MAX_ROWS", "100000"))
+# Other workers may update an embedding behind this process' back, so rows expire
+VECTOR_CACHE_TTL = float(os.getenv("VECTOR_CACHE_TTL", "60"))  # seconds
+
+
+class VectorStore:
+    """
+    Bounded id -> embedding cache backed by one contiguous float32 matrix.
+
+    Rows are handed out from the matrix (which grows geometrically up to
+    max_rows) and tracked in an id -> row dict kept in LRU order; when full,
+    the least recently used id gives up its row.
+    """
+
+    def __init__(self, max_rows: int = VECTOR_CACHE_MAX_ROWS, ttl: float = VECTOR_CACHE_TTL):
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._matrix = None
+        self._written_at = None
+        self._rows = OrderedDict()
+        self._free = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._live_row(key)
+            return None if row is None else self._matrix[row].copy()
+
+    def get_many(self, keys):
+        """Return {key: embedding} for the keys that are cached."""
+        with self._lock:
+            rows = {key: self._live_row(key) for key in keys}
+            rows = {key: row for key, row in rows.items() if row is not None}
+            if not rows:
+                return {}
+            block = self._matrix[list(rows.values())]
+            return dict(zip(rows.keys(), block))
+
+    def put(self, key: str, embedding):
+        self.put_many([key], [embedding])
+
+    def put_many(self, keys, embeddings):
+        if self.max_rows <= 0:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self._matrix is None:
+                capacity = min(1024, self.max_rows)
+                self._matrix = np.zeros((capacity, embeddings.shape[1]), dtype=np.float32)
+                self._written_at = np.zeros(capacity, dtype=np.float64)
+            now = time.monotonic()
+            for key, embedding in zip(keys, embeddings):
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._allocate_row()
+                    self._rows[key] = row
+                self._rows.move_to_end(key)
+                self._matrix[row] = embedding
+                self._written_at[row] = now
+
+    def remove(self, key: str):
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self._free.append(row)
+
+    def clear(self):
+        with self._lock:
+            self._free.extend(self._rows.values())
+            self._rows.clear()
+
+    def _live_row(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        if time.monotonic() - self._written_at[row] > self.ttl:
+            del self._rows[key]
+            self._free.append(row)
+            return None
+        self._rows.move_to_end(key)
+        return row
+
+    def _allocate_row(self):
+        if self._free:
+            return self._free.pop()
+        used = len(self._rows)
+        capacity = self._matrix.shape[0]
+        if used < capacity:
+            return used
+        if capacity < self.max_rows:
+            new_capacity = min(capacity * 2, self.max_rows)
+            self._matrix = np.concatenate([self._matrix, np.zeros((new_capacity - capacity, self._matrix.shape[1]), dtype=np.float32)])
+            self._written_at = np.concatenate([self._written_at, np.zeros(new_capacity - capacity)])
+            return used
+        # Full: recycle the least recently used row
+        _, row = self._rows.popitem(last=False)
+        return row
@@ -0,0 +1,202 @@
+import base64
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+WRITE_BUFFER_MAX_SIZE = int(os.getenv("WRITE_BUFFER_MAX_SIZE", "500"))
+WRITE_BUFFER_FLUSH_INTERVAL = float(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL", "1.0"))  # seconds
+WRITE_BUFFER_WAL_DIR = os.getenv("WRITE_BUFFER_WAL_DIR", ".write_buffer")  # empty string disables the WAL
+
+
+def _encode(embedding) -> str:
+    return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode(data: str):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).copy()
+
+
+class WriteBehindBuffer:
+    """
+    Coalescing write-behind buffer for one Milvus collection.
+
+    put() records the embedding in a per-process write-ahead log and in memory,
+    keeping only the latest embedding per id; a background thread hands the
+    pending entries to flush_fn(ids, embeddings) once max_size entries are
+    waiting or every flush_interval seconds. Logs left behind by a crashed
+    process are replayed into this buffer on start; discards are logged as
+    tombstones so a replay never resurrects a dropped write.
+    """
+
+    def __init__(self, name: str, flush_fn, max_size: int = WRITE_BUFFER_MAX_SIZE,
+                 flush_interval: float = WRITE_BUFFER_FLUSH_INTERVAL, wal_dir: str = WRITE_BUFFER_WAL_DIR):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+        self._wal = None
+        self._wal_seq = 0
+        if wal_dir:
+            self._wal_root = os.path.join(wal_dir, name)
+            self._wal_dir = os.path.join(self._wal_root, str(os.getpid()))
+            if os.path.exists(self._wal_dir):
+                # Left behind by an earlier process that had the same pid (e.g. pid 1 in a container)
+                os.rename(self._wal_dir, f"{self._wal_dir}.{time.time_ns()}")
+            os.makedirs(self._wal_dir, exist_ok=True)
+            self._dir_lock = open(os.path.join(self._wal_dir, "lock"), "a")
+            fcntl.flock(self._dir_lock, fcntl.LOCK_EX)
+            self._wal = open(os.path.join(self._wal_dir, "current.wal"), "a")
+            self._recover()
+
+    def start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"write-buffer-{self.name}", daemon=True)
+                self._worker.start()
+
+    def put(self, key: str, embedding):
+        self._put_many([key], [embedding])
+
+    def _put_many(self, keys, embeddings):
+        # One log append and fsync for the whole group
+        embeddings = [np.asarray(embedding, dtype=np.float32) for embedding in embeddings]
+        with self._lock:
+            self._log([{"id": key, "embedding": _encode(embedding)} for key, embedding in zip(keys, embeddings)])
+            for key, embedding in zip(keys, embeddings):
+                self._pending[key] = embedding
+                self._pending.move_to_end(key)
+            full = len(self._pending) >= self.max_size
+        self.start()
+        if full:
+            self._wake.set()
+
+    def _log(self, entries):
+        if self._wal is not None and entries:
+            self._wal.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+
+    def get(self, key: str):
+        """Latest buffered embedding for key that may not have reached Milvus yet, else None."""
+        with self._lock:
+            embedding = self._pending.get(key)
+            if embedding is None:
+                embedding = self._inflight.get(key)
+            return embedding
+
+    def discard(self, keys):
+        """
+        Drop buffered writes that are about to be superseded by a direct upsert.
+        Waits for a flush in progress, whose older values could otherwise reach
+        Milvus after the upsert.
+        """
+        # Every logged entry belongs to a pending key once no flush is running
+        with self._flush_lock, self._lock:
+            dropped = [key for key in keys if key in self._pending]
+            self._log([{"id": key, "discard": True} for key in dropped])
+            for key in dropped:
+                del self._pending[key]
+
+    def discard_all(self):
+        with self._flush_lock, self._lock:
+            if self._pending:
+                self._log([{"discard_all": True}])
+                self._pending.clear()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._inflight = dict(self._pending)
+                self._pending.clear()
+                flushing_path = self._rotate_wal()
+            try:
+                self.flush_fn(list(self._inflight.keys()), list(self._inflight.values()))
+            except Exception as e:
+                print(f"❌ Write-behind flush of {len(self._inflight)} {self.name} failed, will retry: {str(e)}")
+                with self._lock:
+                    # Put the batch back without clobbering anything written meanwhile
+                    for key, embedding in self._inflight.items():
+                        if key not in self._pending:
+                            self._pending[key] = embedding
+                    self._inflight = {}
+                return 0
+            with self._lock:
+                flushed = len(self._inflight)
+                self._inflight = {}
+            if flushing_path:
+                self._remove_flushed_wals(flushing_path)
+            return flushed
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _rotate_wal(self):
+        """Freeze the current log as a numbered segment covering the batch being flushed."""
+        if self._wal is None:
+            return None
+        self._wal.close()
+        self._wal_seq += 1
+        flushing_path = os.path.join(self._wal_dir, f"{self._wal_seq:012d}.flushing")
+        os.rename(os.path.join(self._wal_dir, "current.wal"), flushing_path)
+        self._wal = open(os.path.join(self._wal_dir, "current.wal"), "a")
+        return flushing_path
+
+    def _remove_flushed_wals(self, flushing_path):
+        # A successful flush also covers every earlier failed batch, which was merged back into it
+        for name in os.listdir(self._wal_dir):
+            path = os.path.join(self._wal_dir, name)
+            if name.endswith(".flushing") and path <= flushing_path:
+                os.remove(path)
+
+    def _recover(self):
+        """Replay logs of processes that died with unflushed writes."""
+        for name in sorted(os.listdir(self._wal_root)):
+            directory = os.path.join(self._wal_root, name)
+            if directory == self._wal_dir or not os.path.isdir(directory):
+                continue
+            with open(os.path.join(directory, "lock"), "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # owned by a live worker
+                segments = sorted(f for f in os.listdir(directory) if f.endswith(".flushing"))
+                recovered = OrderedDict()
+                for segment in segments + ["current.wal"]:
+                    path = os.path.join(directory, segment)
+                    if not os.path.exists(path):
+                        continue
+                    with open(path) as f:
+                        for line in f:
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                continue  # torn write at crash time
+                            if entry.get("discard_all"):
+                                recovered.clear()
+                            elif entry.get("discard"):
+                                recovered.pop(entry["id"], None)
+                            else:
+                                recovered[entry["id"]] = _decode(entry["embedding"])
+                # Logged here before the old directory goes away
+                self._put_many(list(recovered), list(recovered.values()))
+            shutil.rmtree(directory, ignore_errors=True)
+            if recovered:
+                print(f"Recovered {len(recovered)} buffered {self.name} writes from {directory}")
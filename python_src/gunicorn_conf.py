@@ -0,0 +1,20 @@
+"""
+Pre-fork deployment: gunicorn -c python_src/gunicorn_conf.py python_src.main:app
+
+The master loads the embedding model once before forking, so every worker
+shares the weights copy-on-write instead of holding its own copy, and workers
+are ready as soon as they are forked.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def on_starting(server):
+    from python_src.utils.embedder import load_model
+
+    load_model()
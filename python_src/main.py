@@ -4,13 +4,34 @@ from dotenv import load_dotenv
 load_dotenv("python_src/.env")
 load_dotenv()  # Also try loading from root directory
 
-from fastapi import FastAPI, HTTPException
+import time
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .utils.embedder import get_skill_embedding
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .utils.embedder import get_skill_embedding_async, embedding_cache_stats, start_background_load, is_model_ready, model_status
 from .models.participants import UpdateSkillsRequest
-from .db.milvus_client import insert_participant, insert_hackathon
-from .utils.hackathon_context import generate_hackathon_skills
-from .utils.recommender import recommend_teammates
+from .models.recommendation import BatchRecommendationsRequest, TeamRecommendationRequest, MaterializeRecommendationsRequest
+from .db.milvus_client import insert_participant, flush_write_buffers, run_milvus
+from .utils.hackathon_context import hackathon_context_cache_stats
+from .utils.gemini import scheduler as gemini_scheduler
+from .utils.recommender import (
+    SEARCH_BACKEND,
+    recommend_teammates_async, recommend_teammates_batch_async,
+    recommend_team_async, recommend_similar_participants_async,
+)
+from .db.recommendation_cache import recommendation_cache
+from .db.local_search import save_participant_index, start_participant_index
+from .utils.bulk_sync import run_bulk_sync, sync_participant_chunk, sync_hackathon_chunk
+from .utils.job_queue import job_queue, sync_hackathon, HACKATHON_SYNC, MATERIALIZE_RECOMMENDATIONS
+from .utils.materializer import get_materialized_recommendations, materialized_stats, SERVE_MATERIALIZED
+from .db.job_store import get_job, job_to_response
+from .db.membership import membership
+from .utils.metrics import timed, observe, start_request_timing, finish_request_timing, render_prometheus, profiler
+
+# Exposes /debug/profiler/* for on-demand sampling profiles; keep off in public deployments
+ENABLE_PROFILER_ENDPOINT = os.getenv("ENABLE_PROFILER_ENDPOINT", "0") == "1"
 
 app = FastAPI()
 
@@ -32,15 +53,109 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    # Per-stage durations are returned as Server-Timing when asked for with "X-Server-Timing: 1"
+    token = start_request_timing(request.headers.get("x-server-timing") == "1")
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        # Label by route template, not raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        observe("saathi_request_seconds", elapsed, route=getattr(route, "path", "unmatched"),
+                method=request.method, status=str(status))
+        server_timing = finish_request_timing(token)
+    if server_timing is not None:
+        response.headers["Server-Timing"] = ", ".join(filter(None, [server_timing, f"total;dur={elapsed * 1000:.2f}"]))
+    return response
+
+@app.on_event("startup")
+def load_embedding_model():
+    # Non-blocking: the worker starts serving while the model loads (no-op if preloaded)
+    start_background_load()
+
+@app.on_event("startup")
+def start_local_search():
+    # Builds in the background; searches use Milvus until the index is ready
+    if SEARCH_BACKEND in ("local", "shadow"):
+        start_participant_index()
+
+@app.on_event("startup")
+async def start_job_workers():
+    try:
+        await job_queue.start()
+    except Exception as e:
+        print(f"❌ Could not start job workers: {str(e)}")
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_queue.stop()
+
+@app.on_event("shutdown")
+def flush_pending_writes():
+    flush_write_buffers()
+    save_participant_index()
+
 @app.get("/health")
-def healthcheck():
+async def healthcheck():
+    """Liveness: the process is up, whether or not the model has loaded yet."""
     return {"status": "ok"}
 
+@app.get("/ready")
+async def readiness():
+    """Readiness: 503 until the embedding model is loaded and requests can be served."""
+    if not is_model_ready():
+        raise HTTPException(status_code=503, detail=f"Embedding model {model_status()}")
+    return {"status": "ready"}
+
+@app.get("/cacheStats")
+async def cache_stats():
+    return {
+        "embeddings": embedding_cache_stats(),
+        "recommendations": recommendation_cache.get_stats(),
+        "hackathon_contexts": hackathon_context_cache_stats(),
+        "gemini": gemini_scheduler.get_stats(),
+        "membership": membership.get_stats(),
+        "materialized": materialized_stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus exposition of request, stage and Milvus latency histograms plus cache gauges."""
+    embeddings = embedding_cache_stats()
+    recommendations = recommendation_cache.get_stats()
+    gauges = {f"saathi_embedding_cache_{key}": value for key, value in embeddings.items()
+              if isinstance(value, (int, float))}
+    gauges.update({f"saathi_recommendation_cache_{key}": value for key, value in recommendations.items()})
+    gauges["saathi_model_ready"] = int(is_model_ready())
+    return PlainTextResponse(render_prometheus(gauges))
+
+if ENABLE_PROFILER_ENDPOINT:
+    @app.post("/debug/profiler/start")
+    async def start_profiler(interval_ms: float = 10.0):
+        profiler.start(interval_ms)
+        return {"status": "running", "interval_ms": profiler.interval * 1000}
+
+    @app.post("/debug/profiler/stop")
+    async def stop_profiler(limit: int = 200):
+        """Stop sampling and return the collapsed stacks (flamegraph.pl / speedscope input)."""
+        profiler.stop()
+        return PlainTextResponse(profiler.folded(limit))
+
+    @app.get("/debug/profiler")
+    async def profiler_status():
+        return {"running": profiler.running, "samples": profiler.samples}
+
 @app.post("/updateSkills")
-def update_skills_list(payload: UpdateSkillsRequest):
+async def update_skills_list(payload: UpdateSkillsRequest):
     try:
-        embedding = get_skill_embedding(payload.skills)
-        insert_participant(pid=str(payload.pidx), embedding=embedding)
+        with timed("embed"):
+            embedding = await get_skill_embedding_async(payload.skills)
+        await run_milvus(insert_participant, pid=str(payload.pidx), embedding=embedding)
         return {"status": "success", "message": f"Skills updated for user {payload.pidx}"}
     except Exception as e:
         print(f"❌ Error updating skills for {payload.pidx}: {str(e)}")
@@ -48,109 +163,205 @@ def update_skills_list(payload: UpdateSkillsRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to update skills: {str(e)}")
 
-@app.post("/updateHackathonSkills")
-def update_hackathon_skills(payload: dict):
+@app.post("/updateHackathonSkills", status_code=202)
+async def update_hackathon_skills(payload: dict, sync: bool = False):
     """
     Sync a hackathon to Milvus vector database.
     Expected payload: {"hackathonId": "<mongo_id>", "skills": ["skill1", "skill2", ...] (optional)}
     If skills not provided, will use AI to generate them from hackathon context.
+
+    Queues a background job and returns its id at once; poll /jobs/{jobId} for
+    progress. A newer request for the same hackathon supersedes a pending one.
+    Pass ?sync=true to run inline and get the result in the response.
+    """
+    hidx = payload.get("hackathonId")
+    provided_skills = payload.get("skills")
+
+    if not hidx:
+        raise HTTPException(status_code=400, detail="hackathonId is required")
+
+    try:
+        if sync:
+            result = await sync_hackathon(str(hidx), provided_skills or None)
+            return JSONResponse({
+                "status": "success",
+                "hackathonId": hidx,
+                "skills": result["skills"],
+                "message": f"Hackathon {hidx} synced successfully to AI database"
+            })
+
+        job = await job_queue.enqueue(HACKATHON_SYNC, str(hidx), {"hackathonId": str(hidx), "skills": provided_skills or None})
+        return {
+            "status": "queued",
+            "hackathonId": hidx,
+            "jobId": str(job["_id"]),
+            "message": f"Hackathon {hidx} sync queued"
+        }
+    except Exception as e:
+        print(f"❌ Error syncing hackathon {hidx}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to sync hackathon: {str(e)}")
+
+@app.post("/syncHackathonMembership")
+async def sync_hackathon_membership(payload: dict):
+    """
+    Reload a hackathon's registered participants from Mongo, e.g. right after
+    someone joins or leaves. Expected payload: {"hackathonId": "<mongo_id>"}
     """
+    hidx = payload.get("hackathonId")
+    if not hidx:
+        raise HTTPException(status_code=400, detail="hackathonId is required")
     try:
-        hidx = payload.get("hackathonId")
-        provided_skills = payload.get("skills")
-        
-        if not hidx:
-            raise HTTPException(status_code=400, detail="hackathonId is required")
-        
-        # If skills provided, use them directly; otherwise generate using AI
-        if provided_skills and len(provided_skills) > 0:
-            target_hackathon_skills = provided_skills
-            print(f"Using provided skills for hackathon {hidx}: {target_hackathon_skills}")
-        else:
-            print(f"Generating AI skills for hackathon {hidx}...")
-            out = generate_hackathon_skills(hidx)
-            target_hackathon_skills = out.get("target_skills")
-            print(f"Generated skills: {target_hackathon_skills}")
-        
-        # Create embedding and insert into Milvus
-        embedding = get_skill_embedding(target_hackathon_skills)
-        insert_hackathon(hid=str(hidx), embedding=embedding)
-        
+        changed = await run_milvus(membership.refresh, str(hidx))
+        members = await run_milvus(membership.members, str(hidx))
         return {
             "status": "success",
             "hackathonId": hidx,
-            "skills": target_hackathon_skills,
-            "message": f"Hackathon {hidx} synced successfully to AI database"
+            "changed": changed,
+            "participants": len(members) if members is not None else None,
         }
-    except HTTPException:
-        raise
     except Exception as e:
-        print(f"❌ Error syncing hackathon {payload.get('hackathonId')}: {str(e)}")
+        print(f"❌ Error syncing membership for hackathon {hidx}: {str(e)}")
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to sync hackathon: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to sync membership: {str(e)}")
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_to_response(job)
+
+@app.post("/bulkUpdateSkills")
+async def bulk_update_skills(request: Request):
+    """
+    Bulk version of /updateSkills for backfills and re-indexing.
+    Body: a JSON array (or {"items": [...]}) of {"pidx", "skills"} objects,
+    or the same objects streamed as NDJSON with Content-Type: application/x-ndjson.
+    """
+    try:
+        return await run_bulk_sync(request, sync_participant_chunk, "participants")
+    except Exception as e:
+        print(f"❌ Error in bulk skills update: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to bulk update skills: {str(e)}")
+
+@app.post("/bulkUpdateHackathonSkills")
+async def bulk_update_hackathon_skills(request: Request):
+    """
+    Bulk version of /updateHackathonSkills.
+    Body: a JSON array (or {"items": [...]}) of {"hackathonId", "skills" (optional)} objects,
+    or the same objects streamed as NDJSON with Content-Type: application/x-ndjson.
+    """
+    try:
+        return await run_bulk_sync(request, sync_hackathon_chunk, "hackathons")
+    except Exception as e:
+        print(f"❌ Error in bulk hackathon sync: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to bulk sync hackathons: {str(e)}")
+
+@app.post("/materializeRecommendations", status_code=202)
+async def materialize_recommendations(payload: MaterializeRecommendationsRequest):
+    """
+    Precompute the teammate recommendations of every participant of a hackathon
+    as a background job, e.g. when registration closes.
+    Expected payload: {"hackathonId": "<mongo_id>", "top_k": 50 (optional, 1-200)}
+    """
+    hidx = payload.hackathonId
+    if not hidx:
+        raise HTTPException(status_code=400, detail="hackathonId is required")
+
+    try:
+        job = await job_queue.enqueue(MATERIALIZE_RECOMMENDATIONS, hidx, {"hackathonId": hidx, "topK": payload.top_k})
+        return {
+            "status": "queued",
+            "hackathonId": hidx,
+            "jobId": str(job["_id"]),
+            "message": f"Recommendations for hackathon {hidx} queued for materialization"
+        }
+    except Exception as e:
+        print(f"❌ Error queueing materialization for hackathon {hidx}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to queue materialization: {str(e)}")
 
 @app.get("/getRecommendations")
-def get_recommendations(hidx:str,uidx:str, top_k: int = 10):
-    top_k_recommendations = recommend_teammates(hidx=hidx,pidx=uidx,top_k=top_k)
+async def get_recommendations(hidx:str,uidx:str, top_k: int = Query(10, ge=1, le=200),
+                              ef: Optional[int] = Query(None, ge=1, le=32768), nprobe: Optional[int] = Query(None, ge=1, le=65536)):
+    """
+    ef (HNSW) / nprobe (IVF) optionally widen or narrow the vector search: more recall vs. lower latency.
+    Without them, precomputed results from /materializeRecommendations are served while still current.
+    """
+    if SERVE_MATERIALIZED and ef is None and nprobe is None:
+        try:
+            materialized = await get_materialized_recommendations(pidx=uidx, hidx=hidx, top_k=top_k)
+            if materialized is not None:
+                return materialized
+        except Exception as e:
+            print(f"❌ Error reading materialized recommendations for {uidx} in {hidx}: {str(e)}")
+    top_k_recommendations = await recommend_teammates_async(hidx=hidx,pidx=uidx,top_k=top_k,ef=ef,nprobe=nprobe)
     return top_k_recommendations
 
+@app.post("/getBatchRecommendations")
+async def get_batch_recommendations(payload: BatchRecommendationsRequest):
+    """
+    Recommendations for many (uidx, hidx) pairs in one call, e.g. a whole team
+    or every hackathon a user has joined.
+    Expected payload: {"pairs": [{"uidx": "...", "hidx": "..."}, ...], "top_k": 10}
+    """
+    try:
+        pairs = [(pair.uidx, pair.hidx) for pair in payload.pairs]
+        return {"results": await recommend_teammates_batch_async(
+            pairs=pairs, top_k=payload.top_k, ef=payload.ef, nprobe=payload.nprobe,
+        )}
+    except Exception as e:
+        print(f"❌ Error getting batch recommendations: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to get batch recommendations: {str(e)}")
+
+@app.post("/getTeamRecommendations")
+async def get_team_recommendations(payload: TeamRecommendationRequest):
+    """
+    Suggest full teams: fills the open slots of a partial team for a hackathon.
+    Expected payload: {"hidx": "...", "member_pids": ["..."], "team_size": 4, "beam_width": 3, "pool_size": 50}
+    """
+    try:
+        teams = await recommend_team_async(
+            member_pids=payload.member_pids,
+            hidx=payload.hidx,
+            team_size=payload.team_size,
+            beam_width=payload.beam_width,
+            pool_size=payload.pool_size,
+            ef=payload.ef,
+            nprobe=payload.nprobe,
+        )
+        return {"hidx": payload.hidx, "member_pids": payload.member_pids, "teams": teams}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Error getting team recommendations: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to get team recommendations: {str(e)}")
+
 @app.get("/getTeammateRecommendations")
-def get_teammate_recommendations(uidx: str, top_k: int = 50):
+async def get_teammate_recommendations(uidx: str, top_k: int = Query(50, ge=1, le=200),
+                                       ef: Optional[int] = Query(None, ge=1, le=32768), nprobe: Optional[int] = Query(None, ge=1, le=65536)):
     """
     Pure AI-based teammate recommendations without hackathon context.
     Finds users with complementary skills using vector similarity.
     """
     try:
-        from pymilvus import Collection
-        from .db.milvus_client import get_participant_collection, ensure_milvus_connected
-        
-        ensure_milvus_connected()
-        participants = get_participant_collection()
-        participants.load()
-        
-        # Get user's skill embedding
-        participant_data = participants.query(
-            expr=f'pid == "{uidx}"',
-            output_fields=["embedding"]
-        )
-        
-        if not participant_data:
-            raise HTTPException(status_code=404, detail=f"User {uidx} not found in AI database. Please sync their skills first.")
-        
-        user_embedding = participant_data[0]["embedding"]
-        
-        # Search for similar users (complementary skills)
-        # Using COSINE similarity to find users with related but different skill sets
-        search_params = {
-            "metric_type": "COSINE",
-            "params": {"nprobe": 10}
-        }
-        
-        results = participants.search(
-            data=[user_embedding],
-            anns_field="embedding",
-            param=search_params,
-            limit=top_k + 1,  # Get extra to exclude self
-            expr=f'pid != "{uidx}"',  # Exclude current user
-            output_fields=["pid"]
-        )
-        
-        # Process results
-        recommendations = []
-        for hits in results:
-            for hit in hits:
-                if hit.entity.get("pid") != uidx:
-                    recommendations.append({
-                        "pid": hit.entity.get("pid"),
-                        "ai_score": float(hit.score),  # Similarity score
-                        "distance": float(hit.distance)
-                    })
-        
-        return recommendations[:top_k]
-        
+        return await recommend_similar_participants_async(pidx=uidx, top_k=top_k, ef=ef, nprobe=nprobe)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         print(f"❌ Error getting AI recommendations: {str(e)}")
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to get AI recommendations: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get AI recommendations: {str(e)}")
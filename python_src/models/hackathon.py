@@ -1,6 +1,10 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class HackathonDreamTeam(BaseModel):
     hackathon_name: str
-    required_skills: List[str]
\ No newline at end of file
+    required_skills: List[str]
+
+class UpdateHackathonSkillsRequest(BaseModel):
+    hackathonId: str
+    skills: Optional[List[str]] = None
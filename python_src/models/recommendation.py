@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class RecommendationPair(BaseModel):
+    uidx: str
+    hidx: str
+
+class BatchRecommendationsRequest(BaseModel):
+    pairs: List[RecommendationPair] = Field(..., max_length=1000)
+    top_k: int = Field(10, ge=1, le=200)
+    ef: Optional[int] = Field(None, ge=1, le=32768)
+    nprobe: Optional[int] = Field(None, ge=1, le=65536)
+
+class TeamRecommendationRequest(BaseModel):
+    hidx: str
+    member_pids: List[str] = Field(..., max_length=20)
+    # The beam search scores beam_width x pool_size extensions per open slot
+    team_size: int = Field(4, ge=2, le=20)
+    beam_width: int = Field(3, ge=1, le=20)
+    pool_size: int = Field(50, ge=1, le=500)
+    ef: Optional[int] = Field(None, ge=1, le=32768)
+    nprobe: Optional[int] = Field(None, ge=1, le=65536)
+
+class MaterializeRecommendationsRequest(BaseModel):
+    hackathonId: str
+    top_k: Optional[int] = Field(None, ge=1, le=200)
@@ -0,0 +1,260 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from python_src.utils import change_sync
+from python_src.utils.change_sync import CollectionSync, Debouncer
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeStateCollection:
+    """The handful of motor calls change sync makes on the sync_state collection."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find(self, query, projection=None):
+        return FakeCursor([self.docs[key] for key in query["_id"]["$in"] if key in self.docs])
+
+    async def find_one(self, query):
+        return self.docs.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs.setdefault(query["_id"], {"_id": query["_id"]}).update(update["$set"])
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            await self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+    async def delete_many(self, query):
+        for key in query["_id"]["$in"]:
+            self.docs.pop(key, None)
+
+
+class FakeChangeStream:
+    """Yields scripted change events, then idles like a tailing cursor."""
+
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.alive = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def try_next(self):
+        if self.changes:
+            return self.changes.pop(0)
+        await asyncio.sleep(0.01)
+        return None
+
+
+class FakeWatchedCollection:
+    def __init__(self, changes):
+        self.stream = FakeChangeStream(changes)
+        self.resume_after = []
+
+    def watch(self, pipeline, full_document=None, resume_after=None, max_await_time_ms=None):
+        self.resume_after.append(resume_after)
+        return self.stream
+
+
+def change(key, token, doc=None, operation="update"):
+    return {"_id": token, "operationType": operation, "documentKey": {"_id": key}, "fullDocument": doc}
+
+
+class DebouncerTest(unittest.TestCase):
+    def test_coalesces_events_per_document(self):
+        debouncer = Debouncer(debounce=1.0, max_delay=10.0)
+        debouncer.add("a", {"v": 1}, False, "t1", now=0.0)
+        debouncer.add("a", {"v": 2}, False, "t2", now=0.5)
+
+        self.assertEqual(debouncer.due(10, now=1.0), [])
+        [(key, entry)] = debouncer.due(10, now=1.5)
+        self.assertEqual((key, entry["doc"]), ("a", {"v": 2}))
+
+    def test_busy_document_is_due_after_max_delay(self):
+        debouncer = Debouncer(debounce=1.0, max_delay=3.0)
+        for i in range(7):
+            debouncer.add("a", {"v": i}, False, f"t{i}", now=i * 0.5)
+        self.assertEqual([key for key, _ in debouncer.due(10, now=3.0)], ["a"])
+
+    def test_safe_token_waits_for_the_oldest_pending_event(self):
+        debouncer = Debouncer(debounce=0.0)
+        debouncer.add("a", {}, False, "t1", now=0.0)
+        debouncer.add("b", {}, False, "t2", now=0.0)
+        debouncer.add("a", {}, False, "t3", now=0.0)
+
+        batch = debouncer.due(10, now=1.0)
+        # "b" was processed, "a" failed
+        debouncer.requeue([entry for entry in batch if entry[0] == "a"], now=1.0)
+        # "a" still holds event 1 back, so nothing after it may be acknowledged
+        self.assertIsNone(debouncer.safe_token())
+
+        self.assertEqual([key for key, _ in debouncer.due(10, now=2.0)], ["a"])
+        self.assertEqual(debouncer.safe_token(), "t3")
+        self.assertIsNone(debouncer.safe_token())
+
+    def test_requeue_keeps_the_older_position(self):
+        debouncer = Debouncer(debounce=0.0)
+        debouncer.add("a", {"v": 1}, False, "t1", now=0.0)
+        batch = debouncer.due(10, now=1.0)
+        debouncer.add("a", {"v": 2}, False, "t2", now=1.0)
+        debouncer.requeue(batch, now=1.0)
+
+        # The newer document wins, but the token cannot move past the failed event
+        self.assertIsNone(debouncer.safe_token())
+        [(_, entry)] = debouncer.due(10, now=2.0)
+        self.assertEqual(entry["doc"], {"v": 2})
+        self.assertEqual(debouncer.safe_token(), "t2")
+
+
+class CollectionSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.state = FakeStateCollection()
+        patcher = mock.patch.object(change_sync, "get_async_sync_state_collection", lambda: self.state)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_stream(self, sync, collection, until):
+        async def scenario():
+            task = asyncio.create_task(sync.run())
+            for _ in range(500):
+                if until():
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        asyncio.run(scenario())
+
+    def test_processes_coalesced_batches_and_stores_the_resume_token(self):
+        batches = []
+
+        async def process(batch):
+            batches.append({key: entry["doc"] for key, entry in batch})
+            return len(batch)
+
+        collection = FakeWatchedCollection([
+            change("a", "t1", {"v": 1}),
+            change("b", "t2", {"v": 1}),
+            change("a", "t3", {"v": 2}),
+        ])
+        sync = CollectionSync("users", lambda: collection, process, debouncer=Debouncer(debounce=0.05))
+        self.run_stream(sync, collection, lambda: "stream:users" in self.state.docs)
+
+        self.assertEqual(batches, [{"a": {"v": 2}, "b": {"v": 1}}])
+        self.assertEqual(self.state.docs["stream:users"]["resumeToken"], "t3")
+        self.assertEqual(collection.resume_after, [None])
+
+    def test_failed_batch_does_not_advance_the_token(self):
+        async def fail(batch):
+            raise RuntimeError("milvus down")
+
+        collection = FakeWatchedCollection([change("a", "t1", {"v": 1})])
+        sync = CollectionSync("users", lambda: collection, fail, debouncer=Debouncer(debounce=0.0))
+        self.run_stream(sync, collection, lambda: sync.stats["errors"] >= 2)
+
+        self.assertNotIn("stream:users", self.state.docs)
+        self.assertEqual(len(sync.debouncer), 1)
+
+    def test_resumes_from_the_stored_token(self):
+        self.state.docs["stream:users"] = {"_id": "stream:users", "resumeToken": "t9"}
+        collection = FakeWatchedCollection([])
+        sync = CollectionSync("users", lambda: collection, None)
+        self.run_stream(sync, collection, lambda: collection.resume_after)
+
+        self.assertEqual(collection.resume_after, ["t9"])
+
+
+class SyncBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.state = FakeStateCollection()
+        self.milvus = mock.Mock()
+        self.jobs = []
+
+        async def run_milvus(fn, *args, **kwargs):
+            return fn(*args, **kwargs)
+
+        async def embed(skill_lists):
+            return [[float(len(skills))] for skills in skill_lists]
+
+        async def enqueue_job(job_type, key, payload):
+            self.jobs.append((key, payload))
+
+        async def active_job(job_type, key):
+            return None
+
+        patches = [
+            mock.patch.object(change_sync, "get_async_sync_state_collection", lambda: self.state),
+            mock.patch.object(change_sync, "run_milvus", run_milvus),
+            mock.patch.object(change_sync, "get_skill_embeddings_async", embed),
+            mock.patch.object(change_sync, "batch_upsert_participants", self.milvus.upsert),
+            mock.patch.object(change_sync, "batch_delete_participants", self.milvus.delete),
+            mock.patch.object(change_sync, "batch_delete_hackathons", self.milvus.delete_hackathons),
+            mock.patch.object(change_sync, "flush_collection", self.milvus.flush),
+            mock.patch.object(change_sync.job_store, "enqueue_job", enqueue_job),
+            mock.patch.object(change_sync.job_store, "active_job", active_job),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def user_batch(self, **docs):
+        field = change_sync.USER_SKILLS_FIELD
+        return [(key, {"doc": {field: skills, "name": key}, "deleted": False}) for key, skills in docs.items()]
+
+    def test_unchanged_skills_are_not_re_embedded(self):
+        self.assertEqual(asyncio.run(change_sync.sync_user_batch(self.user_batch(a=["Python", "React"]))), 1)
+        self.milvus.upsert.reset_mock()
+
+        # Same skills in another order and case, plus an unrelated field change
+        self.assertEqual(asyncio.run(change_sync.sync_user_batch(self.user_batch(a=["react", "python "]))), 0)
+        self.milvus.upsert.assert_not_called()
+
+    def test_cleared_skills_remove_the_vector(self):
+        asyncio.run(change_sync.sync_user_batch(self.user_batch(a=["Python"])))
+        self.assertEqual(asyncio.run(change_sync.sync_user_batch(self.user_batch(a=[]))), 1)
+        self.milvus.delete.assert_called_once_with(["a"])
+
+        # Still empty on the next edit: nothing left to delete
+        self.assertEqual(asyncio.run(change_sync.sync_user_batch(self.user_batch(a=[]))), 0)
+        self.milvus.delete.assert_called_once()
+
+    def test_membership_changes_do_not_queue_hackathon_syncs(self):
+        doc = {"name": "Hack", "description": "AI for climate", "participants": ["u1"]}
+        batch = [("h", {"doc": doc, "deleted": False})]
+        asyncio.run(change_sync.sync_hackathon_batch(batch))
+        self.assertEqual(len(self.jobs), 1)
+        # The job has not succeeded yet, so nothing is recorded as synced
+        self.assertNotIn("hackathon:h", self.state.docs)
+
+        asyncio.run(change_sync.record_hashes("hackathon", {"h": self.jobs[0][1]["contextHash"]}))
+        doc = {**doc, "participants": ["u1", "u2"]}
+        self.assertEqual(asyncio.run(change_sync.sync_hackathon_batch([("h", {"doc": doc, "deleted": False})])), 0)
+        self.assertEqual(len(self.jobs), 1)
+
+    def test_context_change_is_retried_until_a_sync_succeeds(self):
+        batch = [("h", {"doc": {"name": "Hack", "description": "v1"}, "deleted": False})]
+        asyncio.run(change_sync.sync_hackathon_batch(batch))
+        # The first job failed: the next event for the same content queues it again
+        asyncio.run(change_sync.sync_hackathon_batch(batch))
+        self.assertEqual(len(self.jobs), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
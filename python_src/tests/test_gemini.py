@@ -0,0 +1,135 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from python_src.db.recommendation_cache import LocalCacheBackend
+from python_src.models.hackathon import HackathonDreamTeam
+from python_src.utils import gemini
+from python_src.utils.gemini import GeminiScheduler, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("python_src.utils.gemini.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_queued_reservations(self):
+        bucket = TokenBucket(rate_per_second=2.0, capacity=3)
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        # Each further caller waits for its own share of the refill
+        self.assertEqual([bucket.reserve() for _ in range(2)], [0.5, 1.0])
+
+    def test_refills_up_to_capacity(self):
+        bucket = TokenBucket(rate_per_second=1.0, capacity=2)
+        bucket.reserve()
+        bucket.reserve()
+        self.clock.now += 100
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 1.0])
+
+    def test_zero_rate_never_waits(self):
+        bucket = TokenBucket(rate_per_second=0, capacity=1)
+        self.assertEqual([bucket.reserve() for _ in range(5)], [0.0] * 5)
+
+
+class GeminiSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(gemini, "_backoff", lambda attempt: 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = GeminiScheduler(LocalCacheBackend(), requests_per_minute=0, max_retries=2)
+        self.prompts = []
+
+    def model(self, failures=()):
+        failures = list(failures)
+
+        async def generate(prompt):
+            self.prompts.append(prompt)
+            await asyncio.sleep(0.01)
+            if failures:
+                raise failures.pop(0)
+            return {"hackathon_name": prompt, "required_skills": ["Python"]}
+        return generate
+
+    def generate(self, prompt, generate_fn):
+        return self.scheduler.generate_async(prompt, HackathonDreamTeam, generate_fn)
+
+    def test_memoizes_by_prompt(self):
+        async def scenario():
+            first = await self.generate("a", self.model())
+            self.assertEqual(await self.generate("a", self.model()), first)
+            await self.generate("b", self.model())
+        asyncio.run(scenario())
+
+        self.assertEqual(self.prompts, ["a", "b"])
+        self.assertEqual(self.scheduler.get_stats()["hits"], 1)
+
+    def test_concurrent_identical_requests_share_one_call(self):
+        async def scenario():
+            model = self.model()
+            return await asyncio.gather(*(self.generate("a", model) for _ in range(5)))
+        results = asyncio.run(scenario())
+
+        self.assertEqual(self.prompts, ["a"])
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_retries_retryable_errors(self):
+        result = asyncio.run(self.generate("a", self.model([RateLimited(), ConnectionError()])))
+
+        self.assertEqual(result["hackathon_name"], "a")
+        self.assertEqual(len(self.prompts), 3)
+        self.assertEqual(self.scheduler.get_stats()["retries"], 2)
+
+    def test_gives_up_after_max_retries_and_caches_nothing(self):
+        with self.assertRaises(RateLimited):
+            asyncio.run(self.generate("a", self.model([RateLimited()] * 3)))
+        self.assertEqual(len(self.prompts), 3)
+        self.assertEqual(self.scheduler.get_stats()["failures"], 1)
+
+        asyncio.run(self.generate("a", self.model()))
+        self.assertEqual(len(self.prompts), 4)
+
+    def test_other_errors_are_not_retried(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(self.generate("a", self.model([ValueError("bad schema")])))
+        self.assertEqual(len(self.prompts), 1)
+
+    def test_shared_failure_reaches_every_waiter(self):
+        async def scenario():
+            model = self.model([ValueError("bad schema")])
+            return await asyncio.gather(*(self.generate("a", model) for _ in range(3)), return_exceptions=True)
+        results = asyncio.run(scenario())
+
+        self.assertEqual(len(self.prompts), 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+
+class FakeModelTest(unittest.TestCase):
+    def test_fake_model_is_deterministic_and_schema_shaped(self):
+        prompt = "name: Climate Hack\ndescription: AI for climate"
+        with mock.patch.object(gemini, "GEMINI_FAKE", True), \
+                mock.patch.object(gemini, "get_client", side_effect=AssertionError("network used")):
+            first = asyncio.run(gemini.call_structured_async(prompt, HackathonDreamTeam))
+            second = asyncio.run(gemini.call_structured_async(prompt, HackathonDreamTeam))
+
+        self.assertEqual(first, second)
+        self.assertEqual(first["hackathon_name"], "Climate Hack")
+        self.assertTrue(first["required_skills"])
+        self.assertNotEqual(gemini.fake_structured("name: Other", HackathonDreamTeam), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from python_src.db import local_search
+from python_src.db.local_search import ExactIndex, IVFIndex
+
+
+def random_vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def ids_of(hits):
+    return [key for key, _ in hits]
+
+
+class ExactIndexTest(unittest.TestCase):
+    index_class = ExactIndex
+
+    def make_index(self, n=50):
+        index = self.index_class()
+        self.vectors = random_vectors(n)
+        self.ids = [f"p{i}" for i in range(n)]
+        index.add(self.ids, self.vectors)
+        return index
+
+    def test_nearest_vector_is_itself(self):
+        index = self.make_index()
+        [hits] = index.search(self.vectors[7], top_k=3)
+        self.assertEqual(hits[0][0], "p7")
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+        self.assertEqual(len(hits), 3)
+
+    def test_add_replaces_and_remove_drops(self):
+        index = self.make_index()
+        index.add(["p7"], [self.vectors[3]])
+        self.assertEqual(len(index), 50)
+        [hits] = index.search(self.vectors[3], top_k=2)
+        self.assertEqual(sorted(ids_of(hits)), ["p3", "p7"])
+
+        index.remove(["p3", "missing"])
+        self.assertNotIn("p3", index)
+        self.assertIsNone(index.get("p3"))
+        [hits] = index.search(self.vectors[3], top_k=50)
+        self.assertNotIn("p3", ids_of(hits))
+        self.assertEqual(len(hits), 49)
+
+    def test_removed_rows_are_reused(self):
+        index = self.make_index()
+        index.remove(["p0"])
+        index.add(["new"], [self.vectors[0]])
+        self.assertEqual(index._size, 50)
+        [hits] = index.search(self.vectors[0], top_k=1)
+        self.assertEqual(ids_of(hits), ["new"])
+
+    def test_exclude_is_per_query(self):
+        index = self.make_index()
+        hits = index.search(self.vectors[[1, 2]], top_k=1, exclude=[["p1"], []])
+        self.assertNotEqual(ids_of(hits[0]), ["p1"])
+        self.assertEqual(ids_of(hits[1]), ["p2"])
+
+    def test_include_restricts_candidates(self):
+        index = self.make_index()
+        [hits] = index.search(self.vectors[1], top_k=10, include=["p4", "p5", "missing"], exclude=[["p5"]])
+        self.assertEqual(ids_of(hits), ["p4"])
+
+    def test_snapshot_round_trip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "participants")
+        index = self.make_index()
+        index.remove(["p9"])
+        query = random_vectors(3, seed=1)
+
+        self.assertTrue(index.save(path))
+        self.assertFalse(index.save(path))
+        restored = self.index_class().restore(path)
+        self.assertEqual(len(restored), 49)
+        self.assertNotIn("p9", restored)
+        self.assertEqual(ids_of(restored.search(query, top_k=5)[0]), ids_of(index.search(query, top_k=5)[0]))
+
+        # The memory-mapped snapshot is copied on the first write, not modified in place
+        restored.add(["p9"], [self.vectors[9]])
+        self.assertNotIn("p9", self.index_class().restore(path))
+
+
+class IVFIndexTest(ExactIndexTest):
+    index_class = IVFIndex
+
+    def make_index(self, n=50):
+        index = super().make_index(n)
+        index.nlist = 4
+        index.train()
+        return index
+
+    def test_probing_every_list_matches_exact_search(self):
+        index = self.make_index(200)
+        exact = ExactIndex()
+        exact.add(self.ids, self.vectors)
+        query = random_vectors(5, seed=2)
+        for ivf_hits, exact_hits in zip(index.search(query, top_k=10, nprobe=4), exact.search(query, top_k=10)):
+            self.assertEqual(ids_of(ivf_hits), ids_of(exact_hits))
+
+    def test_writes_after_training_are_searchable(self):
+        index = self.make_index()
+        vector = random_vectors(1, seed=3)
+        index.add(["late"], vector)
+        [hits] = index.search(vector, top_k=1, nprobe=1)
+        self.assertEqual(ids_of(hits), ["late"])
+
+
+class RebuildTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(local_search, "_participant_index", None),
+            mock.patch.object(local_search, "_journal", None),
+            mock.patch.object(local_search, "_snapshot_lock", None),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_writes_during_the_stream_are_replayed(self):
+        def stream(index):
+            index.add(["a", "b"], random_vectors(2))
+            # Another request in this process writes while Milvus is streaming
+            local_search.on_participants_upserted(["c"], random_vectors(1, seed=1))
+            local_search.on_participants_removed(["a"])
+
+        with mock.patch.object(local_search, "load_participants_from_milvus", stream):
+            local_search.rebuild_participant_index()
+
+        index = local_search._participant_index
+        self.assertEqual(sorted(index._rows), ["b", "c"])
+        self.assertIsNone(local_search._journal)
+
+    def test_failed_stream_keeps_the_old_index(self):
+        old = ExactIndex()
+        local_search._participant_index = old
+
+        def stream(index):
+            raise RuntimeError("milvus down")
+
+        with mock.patch.object(local_search, "load_participants_from_milvus", stream):
+            with self.assertRaises(RuntimeError):
+                local_search.rebuild_participant_index()
+        self.assertIs(local_search._participant_index, old)
+        self.assertIsNone(local_search._journal)
+
+
+if __name__ == "__main__":
+    unittest.main()
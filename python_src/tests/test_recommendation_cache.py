@@ -0,0 +1,92 @@
+import unittest
+from unittest import mock
+
+from python_src.db.recommendation_cache import LocalCacheBackend, RecommendationCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecommendationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("python_src.db.recommendation_cache.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = LocalCacheBackend(max_size=100)
+        self.cache = RecommendationCache(self.backend, ttl=60)
+        self.computed = 0
+
+    def recommend(self, uidx="u1", hidx="h1", top_k=5, kind="teammates"):
+        def compute():
+            self.computed += 1
+            return [f"result-{self.computed}"]
+        return self.cache.get_or_compute(kind, uidx, hidx, top_k, compute)
+
+    def test_hit_until_the_ttl_runs_out(self):
+        first = self.recommend()
+        self.clock.now += 59
+        self.assertEqual(self.recommend(), first)
+        self.clock.now += 2
+        self.assertNotEqual(self.recommend(), first)
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    def test_invalidation_only_drops_affected_entries(self):
+        self.recommend("u1", "h1")
+        self.recommend("u2", "h2")
+
+        self.cache.invalidate_participant("u1")
+        self.recommend("u1", "h1")
+        self.recommend("u2", "h2")
+        self.assertEqual(self.computed, 3)
+
+        self.cache.invalidate_hackathon("h2")
+        self.recommend("u1", "h1")
+        self.recommend("u2", "h2")
+        self.assertEqual(self.computed, 4)
+
+    def test_invalidate_all(self):
+        self.recommend("u1", "h1")
+        self.recommend("u2", None)
+        self.cache.invalidate_all()
+        self.recommend("u1", "h1")
+        self.recommend("u2", None)
+        self.assertEqual(self.computed, 4)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        backend = LocalCacheBackend(max_size=2)
+        backend.set("a", 1, 60)
+        backend.set("b", 2, 60)
+        backend.get("a")
+        backend.set("c", 3, 60)
+        self.assertEqual((backend.get("a"), backend.get("b"), backend.get("c")), (1, None, 3))
+
+    def test_counters_expire_with_the_entries_they_guard(self):
+        for i in range(50):
+            self.recommend(f"u{i}")
+            self.cache.invalidate_participant(f"u{i}")
+        self.assertEqual(len(self.backend._counters), 50)
+
+        self.clock.now += 61
+        self.cache.invalidate_participant("u0")
+        self.assertEqual(len(self.backend._counters), 1)
+
+    def test_expired_counter_never_reuses_a_version(self):
+        self.recommend("u2")
+        self.cache.invalidate_participant("u1")
+        self.clock.now += 59
+        stale = self.recommend("u1")
+        # The counter expires while the entry keyed with its value is still live
+        self.clock.now += 2
+        self.cache.invalidate_participant("u1")
+        self.assertNotEqual(self.recommend("u1"), stale)
+        self.assertEqual(self.computed, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
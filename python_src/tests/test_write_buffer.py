@@ -0,0 +1,151 @@
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from python_src.db.write_buffer import WriteBehindBuffer
+
+
+class RecordingFlush:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ids, embeddings):
+        self.calls.append(dict(zip(ids, (list(embedding) for embedding in embeddings))))
+
+
+class WriteBehindBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.wal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.wal_dir, ignore_errors=True)
+
+    def make_buffer(self, flush_fn=None):
+        # No size or timer flushes: the tests call flush() themselves
+        return WriteBehindBuffer("participants", flush_fn or RecordingFlush(), max_size=10_000,
+                                 flush_interval=3600, wal_dir=self.wal_dir)
+
+    def crash(self, buffer):
+        # Closing the log and releasing the directory lock is all a dead process leaves behind
+        buffer._wal.close()
+        buffer._dir_lock.close()
+
+    def test_coalesces_writes_per_id(self):
+        flush = RecordingFlush()
+        buffer = self.make_buffer(flush)
+        buffer.put("a", [1.0, 1.0])
+        buffer.put("b", [2.0, 2.0])
+        buffer.put("a", [3.0, 3.0])
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(flush.calls, [{"a": [3.0, 3.0], "b": [2.0, 2.0]}])
+        self.assertIsNone(buffer.get("a"))
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_replays_unflushed_writes_after_crash(self):
+        buffer = self.make_buffer()
+        buffer.put("a", [1.0, 1.0])
+        buffer.put("a", [4.0, 4.0])
+        buffer.put("b", [2.0, 2.0])
+        self.crash(buffer)
+
+        flush = RecordingFlush()
+        recovered = self.make_buffer(flush)
+        np.testing.assert_array_equal(recovered.get("a"), [4.0, 4.0])
+        self.assertEqual(recovered.flush(), 2)
+        self.assertEqual(flush.calls, [{"a": [4.0, 4.0], "b": [2.0, 2.0]}])
+
+    def test_replays_batch_of_failed_flush(self):
+        def failing(ids, embeddings):
+            raise RuntimeError("milvus down")
+
+        buffer = self.make_buffer(failing)
+        buffer.put("a", [1.0, 1.0])
+        self.assertEqual(buffer.flush(), 0)
+        buffer.put("b", [2.0, 2.0])
+        self.crash(buffer)
+
+        flush = RecordingFlush()
+        self.make_buffer(flush).flush()
+        self.assertEqual(flush.calls, [{"a": [1.0, 1.0], "b": [2.0, 2.0]}])
+
+    def test_flushed_writes_are_not_replayed(self):
+        buffer = self.make_buffer()
+        buffer.put("a", [1.0, 1.0])
+        buffer.flush()
+        self.crash(buffer)
+
+        self.assertIsNone(self.make_buffer().get("a"))
+
+    def test_recovery_syncs_the_log_once(self):
+        buffer = self.make_buffer()
+        for i in range(50):
+            buffer.put(f"p{i}", [float(i)])
+        self.crash(buffer)
+
+        with mock.patch("python_src.db.write_buffer.os.fsync") as fsync:
+            recovered = self.make_buffer()
+        self.assertEqual(fsync.call_count, 1)
+        self.assertEqual(len(recovered._pending), 50)
+
+    def test_discarded_writes_are_not_replayed(self):
+        buffer = self.make_buffer()
+        buffer.put("a", [1.0, 1.0])
+        buffer.put("b", [2.0, 2.0])
+        # A batch upsert wrote a newer value for "a" straight to Milvus
+        buffer.discard(["a"])
+        self.crash(buffer)
+
+        recovered = self.make_buffer()
+        self.assertIsNone(recovered.get("a"))
+        np.testing.assert_array_equal(recovered.get("b"), [2.0, 2.0])
+
+    def test_discard_keeps_later_writes(self):
+        buffer = self.make_buffer()
+        buffer.put("a", [1.0, 1.0])
+        buffer.discard(["a"])
+        buffer.put("a", [5.0, 5.0])
+        self.crash(buffer)
+
+        np.testing.assert_array_equal(self.make_buffer().get("a"), [5.0, 5.0])
+
+    def test_discard_all_is_not_replayed(self):
+        buffer = self.make_buffer()
+        buffer.put("a", [1.0, 1.0])
+        buffer.discard_all()
+        buffer.put("b", [2.0, 2.0])
+        self.crash(buffer)
+
+        recovered = self.make_buffer()
+        self.assertIsNone(recovered.get("a"))
+        np.testing.assert_array_equal(recovered.get("b"), [2.0, 2.0])
+
+    def test_discard_waits_for_inflight_flush(self):
+        started, release = threading.Event(), threading.Event()
+        order = []
+
+        def slow_flush(ids, embeddings):
+            started.set()
+            release.wait(5)
+            order.append("flushed")
+
+        buffer = self.make_buffer(slow_flush)
+        buffer.put("a", [1.0, 1.0])
+        flusher = threading.Thread(target=buffer.flush)
+        flusher.start()
+        started.wait(5)
+
+        discarder = threading.Thread(target=lambda: (buffer.discard(["a"]), order.append("discarded")))
+        discarder.start()
+        discarder.join(0.2)
+        self.assertTrue(discarder.is_alive())
+        release.set()
+        flusher.join(5)
+        discarder.join(5)
+        self.assertEqual(order, ["flushed", "discarded"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import time
+
+from ..db.milvus_client import batch_upsert_participants, batch_upsert_hackathons, flush_collection, run_milvus
+from ..models.participants import UpdateSkillsRequest
+from ..models.hackathon import UpdateHackathonSkillsRequest
+from .embedder import get_skill_embeddings_async
+from .hackathon_context import generate_hackathon_contexts_async, generate_dream_team_skills_async
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "256"))
+
+
+async def iter_bulk_items(request):
+    """
+    Yield (index, item, error) for every entry of a bulk request body.
+    NDJSON bodies (application/x-ndjson) are parsed line by line as they stream
+    in; anything else is read as a JSON array or {"items": [...]}.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        index = 0
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(index, line)
+                    index += 1
+        if pending.strip():
+            yield _parse_line(index, pending)
+        return
+
+    body = await request.json()
+    items = body.get("items", []) if isinstance(body, dict) else body
+    for index, item in enumerate(items):
+        yield index, item, None
+
+
+def _parse_line(index, line):
+    try:
+        return index, json.loads(line), None
+    except ValueError as e:
+        return index, None, f"Invalid JSON: {str(e)}"
+
+
+def _failure(index, item_id, error):
+    return {"index": index, "id": item_id, "error": error}
+
+
+def _validate(chunk, model, id_field):
+    """
+    Split a chunk into valid requests (latest entry per id wins), failures and
+    the number of earlier entries superseded by a later one for the same id.
+    """
+    latest = {}
+    failures = []
+    duplicates = 0
+    for index, item, error in chunk:
+        item_id = item.get(id_field) if isinstance(item, dict) else None
+        if error is None:
+            try:
+                req = model(**item)
+                key = str(getattr(req, id_field))
+                duplicates += key in latest
+                latest[key] = (index, req)
+                continue
+            except Exception as e:
+                error = str(e)
+        failures.append(_failure(index, item_id, error))
+    return list(latest.values()), failures, duplicates
+
+
+async def sync_participant_chunk(chunk):
+    """Embed and upsert one chunk of participant skill updates; returns (processed, failures, duplicates)."""
+    valid, failures, duplicates = _validate(chunk, UpdateSkillsRequest, "pidx")
+    if not valid:
+        return 0, failures, duplicates
+
+    try:
+        embeddings = await get_skill_embeddings_async([req.skills for _, req in valid])
+        await run_milvus(batch_upsert_participants, [str(req.pidx) for _, req in valid], list(embeddings))
+    except Exception as e:
+        failures.extend(_failure(index, req.pidx, str(e)) for index, req in valid)
+        return 0, failures, duplicates
+    return len(valid), failures, duplicates
+
+
+async def sync_hackathon_chunk(chunk):
+    """Embed and upsert one chunk of hackathon skill updates, generating skills where missing."""
+    valid, failures, duplicates = _validate(chunk, UpdateHackathonSkillsRequest, "hackathonId")
+
+    # Hackathons without explicit skills: fetch all their contexts in one Mongo
+    # query, then generate skills concurrently
+    needs_generation = [req.hackathonId for _, req in valid if not req.skills]
+    contexts = {}
+    if needs_generation:
+        try:
+            contexts = await generate_hackathon_contexts_async(needs_generation)
+        except Exception as e:
+            print(f"❌ Error fetching hackathon contexts: {str(e)}")
+    with_context = [hid for hid in needs_generation if hid in contexts]
+    generated = await asyncio.gather(
+        *(generate_dream_team_skills_async(contexts[hid]) for hid in with_context),
+        return_exceptions=True,
+    )
+    generated = dict(zip(with_context, generated))
+
+    ready = []
+    for index, req in valid:
+        if req.skills:
+            ready.append((index, req, req.skills))
+            continue
+        out = generated.get(req.hackathonId, ValueError(f"No hackathon found with _id {req.hackathonId}"))
+        if isinstance(out, Exception):
+            failures.append(_failure(index, req.hackathonId, f"Skill generation failed: {str(out)}"))
+        else:
+            ready.append((index, req, out.get("target_skills")))
+    if not ready:
+        return 0, failures, duplicates
+
+    try:
+        embeddings = await get_skill_embeddings_async([skills for _, _, skills in ready])
+        await run_milvus(batch_upsert_hackathons, [str(req.hackathonId) for _, req, _ in ready], list(embeddings))
+    except Exception as e:
+        failures.extend(_failure(index, req.hackathonId, str(e)) for index, req, _ in ready)
+        return 0, failures, duplicates
+    return len(ready), failures, duplicates
+
+
+async def run_bulk_sync(request, process_chunk, collection_name: str, chunk_size: int = BULK_CHUNK_SIZE):
+    """
+    Stream items from the request, process them chunk by chunk and flush the
+    collection once at the end. Returns a summary with per-item failures;
+    received = processed + failed + duplicates, where duplicates counts entries
+    superseded by a later entry for the same id in their chunk.
+    """
+    started = time.monotonic()
+    received = 0
+    processed = 0
+    duplicates = 0
+    chunks = 0
+    failures = []
+
+    async def handle(chunk):
+        nonlocal processed, duplicates, chunks
+        ok, failed, superseded = await process_chunk(chunk)
+        processed += ok
+        duplicates += superseded
+        chunks += 1
+        failures.extend(failed)
+        print(f"Bulk sync {collection_name}: chunk {chunks} done, {processed}/{received} processed, {len(failures)} failed")
+
+    chunk = []
+    async for entry in iter_bulk_items(request):
+        chunk.append(entry)
+        received += 1
+        if len(chunk) >= chunk_size:
+            await handle(chunk)
+            chunk = []
+    if chunk:
+        await handle(chunk)
+
+    if processed:
+        await run_milvus(flush_collection, collection_name)
+
+    return {
+        "status": "success" if not failures else "partial",
+        "received": received,
+        "processed": processed,
+        "failed": len(failures),
+        "duplicates": duplicates,
+        "failures": failures,
+        "chunks": chunks,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
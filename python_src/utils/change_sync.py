@@ -0,0 +1,282 @@
+"""
+Incremental sync of Mongo edits into the vector store via change streams.
+
+Tails the `users` and `hackathons` collections, coalesces bursts of edits to
+the same document, and only re-embeds documents whose skill-relevant fields
+actually changed (tracked by a content hash). Participants are embedded and
+upserted in batches; hackathons are queued as background sync jobs so skill
+generation stays on the job workers. Resume tokens are stored in Mongo after
+every processed batch, so a restarted worker continues where it stopped.
+Change streams need a replica set (a single-node one is enough locally):
+
+    python -m python_src.utils.change_sync
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from ..db import job_store
+from ..db.milvus_client import (
+    batch_upsert_participants, batch_delete_participants, batch_delete_hackathons, flush_collection, run_milvus,
+)
+from ..db.mongo_client import (
+    get_async_users_collection, get_async_hackathons_collection, get_async_sync_state_collection, USER_SKILLS_FIELD,
+)
+from .embedder import get_skill_embeddings_async
+from .embedding_cache import normalize_skills
+from .hackathon_context import hackathon_context_fields
+from .job_queue import HACKATHON_SYNC
+
+CHANGE_SYNC_DEBOUNCE = float(os.getenv("CHANGE_SYNC_DEBOUNCE", "2.0"))  # quiet period per document, seconds
+CHANGE_SYNC_MAX_DELAY = float(os.getenv("CHANGE_SYNC_MAX_DELAY", "30.0"))  # upper bound for a busy document
+CHANGE_SYNC_BATCH_SIZE = int(os.getenv("CHANGE_SYNC_BATCH_SIZE", "256"))
+
+# Resume token no longer in the oplog / invalid: the stream must restart from now
+_HISTORY_LOST_CODES = {260, 280, 286}
+
+
+def content_hash(value) -> str:
+    payload = json.dumps(value, sort_keys=True, default=str, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def user_skills_hash(doc) -> str:
+    return content_hash(normalize_skills(doc.get(USER_SKILLS_FIELD) or []))
+
+
+def hackathon_context_hash(doc) -> str:
+    return content_hash(hackathon_context_fields(doc))
+
+
+class Debouncer:
+    """
+    Coalesces change events per document and tracks which resume token is
+    safe to persist: the token of the newest event such that every event up
+    to it has been processed.
+    """
+
+    def __init__(self, debounce: float = CHANGE_SYNC_DEBOUNCE, max_delay: float = CHANGE_SYNC_MAX_DELAY):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._pending = {}  # key -> {"doc", "deleted", "first_seq", "first_seen", "last_seen"}
+        self._tokens = {}  # seq -> resume token of that event
+        self._seq = 0
+        self._done_seq = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, key, doc, deleted: bool, token, now: float = None):
+        now = time.monotonic() if now is None else now
+        self._seq += 1
+        self._tokens[self._seq] = token
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = {"doc": doc, "deleted": deleted, "first_seq": self._seq, "first_seen": now, "last_seen": now}
+        else:
+            entry.update(doc=doc, deleted=deleted, last_seen=now)
+
+    def due(self, limit: int, now: float = None, flush_all: bool = False):
+        """Pop up to limit entries that have been quiet for the debounce period (or waited max_delay)."""
+        now = time.monotonic() if now is None else now
+        keys = [
+            key for key, entry in self._pending.items()
+            if flush_all or now - entry["last_seen"] >= self.debounce or now - entry["first_seen"] >= self.max_delay
+        ][:limit]
+        return [(key, self._pending.pop(key)) for key in keys]
+
+    def requeue(self, batch, now: float = None):
+        """Return entries whose processing failed; they become due again after the debounce period."""
+        now = time.monotonic() if now is None else now
+        for key, entry in batch:
+            newer = self._pending.get(key)
+            if newer is None:
+                self._pending[key] = {**entry, "last_seen": now}
+            else:
+                # A newer event for the document arrived meanwhile: keep its state, but not past the older event
+                newer["first_seq"] = min(newer["first_seq"], entry["first_seq"])
+                newer["first_seen"] = min(newer["first_seen"], entry["first_seen"])
+
+    def safe_token(self):
+        """Resume token covering every processed event, or None if nothing new is safe to store."""
+        oldest_pending = min((entry["first_seq"] for entry in self._pending.values()), default=self._seq + 1)
+        safe = oldest_pending - 1
+        if safe <= self._done_seq:
+            return None
+        token = self._tokens[safe]
+        for seq in range(self._done_seq + 1, safe + 1):
+            self._tokens.pop(seq, None)
+        self._done_seq = safe
+        return token
+
+
+class CollectionSync:
+    """One change stream plus the handler that applies a batch of coalesced documents."""
+
+    def __init__(self, name: str, get_collection, process_batch, batch_size: int = CHANGE_SYNC_BATCH_SIZE,
+                 debouncer: Debouncer = None):
+        self.name = name
+        self.get_collection = get_collection
+        self.process_batch = process_batch
+        self.batch_size = batch_size
+        # An empty Debouncer is falsy (it has __len__)
+        self.debouncer = debouncer if debouncer is not None else Debouncer()
+        self.stats = {"events": 0, "processed": 0, "changed": 0, "errors": 0}
+
+    async def load_token(self):
+        state = await get_async_sync_state_collection().find_one({"_id": f"stream:{self.name}"})
+        return state.get("resumeToken") if state else None
+
+    async def save_token(self, token):
+        await get_async_sync_state_collection().update_one(
+            {"_id": f"stream:{self.name}"},
+            {"$set": {"resumeToken": token, "updatedAt": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    async def run(self):
+        while True:
+            token = await self.load_token()
+            try:
+                async with self.get_collection().watch(
+                    [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}],
+                    full_document="updateLookup",
+                    resume_after=token,
+                    max_await_time_ms=int(max(0.1, self.debouncer.debounce / 2) * 1000),
+                ) as stream:
+                    print(f"✅ Watching {self.name} changes ({'resumed' if token else 'from now'})")
+                    while stream.alive:
+                        change = await stream.try_next()
+                        if change is not None:
+                            self.handle_event(change)
+                        await self.flush()
+            except OperationFailure as e:
+                if e.code not in _HISTORY_LOST_CODES:
+                    raise
+                # Edits made while the token aged out of the oplog are missed; a bulk backfill covers them
+                print(f"❌ Resume token for {self.name} is no longer valid, restarting from now: {str(e)}")
+                await self.save_token(None)
+            except Exception as e:
+                # Connection trouble: reopen from the stored token; pending documents stay queued
+                print(f"❌ {self.name} change stream failed, reconnecting: {str(e)}")
+                await asyncio.sleep(5)
+
+    def handle_event(self, change):
+        self.stats["events"] += 1
+        key = str(change["documentKey"]["_id"])
+        deleted = change["operationType"] == "delete"
+        # updateLookup can return None when the document was deleted right after the update
+        doc = change.get("fullDocument")
+        self.debouncer.add(key, doc, deleted or doc is None, change["_id"])
+
+    async def flush(self, flush_all: bool = False):
+        while True:
+            batch = self.debouncer.due(self.batch_size, flush_all=flush_all)
+            if not batch:
+                break
+            try:
+                self.stats["changed"] += await self.process_batch(batch)
+                self.stats["processed"] += len(batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"❌ Error syncing {len(batch)} {self.name} changes: {str(e)}")
+                self.debouncer.requeue(batch)
+                return
+        token = self.debouncer.safe_token()
+        if token is not None:
+            await self.save_token(token)
+
+
+async def _changed_keys(kind: str, hashes: dict):
+    """Keys whose content hash differs from the last synced one."""
+    state = get_async_sync_state_collection()
+    ids = [f"{kind}:{key}" for key in hashes]
+    stored = {doc["_id"]: doc.get("hash") async for doc in state.find({"_id": {"$in": ids}}, {"hash": 1})}
+    return [key for key in hashes if stored.get(f"{kind}:{key}") != hashes[key]]
+
+
+async def record_hashes(kind: str, hashes: dict):
+    if hashes:
+        now = datetime.now(timezone.utc)
+        await get_async_sync_state_collection().bulk_write([
+            UpdateOne({"_id": f"{kind}:{key}"}, {"$set": {"hash": value, "syncedAt": now}}, upsert=True)
+            for key, value in hashes.items()
+        ], ordered=False)
+
+
+async def _forget_hashes(kind: str, keys):
+    if keys:
+        await get_async_sync_state_collection().delete_many({"_id": {"$in": [f"{kind}:{key}" for key in keys]}})
+
+
+async def sync_user_batch(batch) -> int:
+    """Re-embed and upsert users whose skills changed; delete removed users. Returns the number applied."""
+    deleted = [key for key, entry in batch if entry["deleted"]]
+    docs = {key: entry["doc"] for key, entry in batch if not entry["deleted"]}
+    hashes = {key: user_skills_hash(doc) for key, doc in docs.items()}
+    changed = await _changed_keys("user", hashes)
+    # Users without skills have no meaningful vector: one whose skills were cleared is removed
+    to_embed = [key for key in changed if normalize_skills(docs[key].get(USER_SKILLS_FIELD) or [])]
+    removed = deleted + [key for key in changed if key not in to_embed]
+
+    if to_embed:
+        embeddings = await get_skill_embeddings_async([docs[key].get(USER_SKILLS_FIELD) for key in to_embed])
+        await run_milvus(batch_upsert_participants, to_embed, list(embeddings))
+    if removed:
+        await run_milvus(batch_delete_participants, removed)
+    if to_embed or removed:
+        await run_milvus(flush_collection, "participants")
+    await record_hashes("user", {key: hashes[key] for key in changed})
+    await _forget_hashes("user", deleted)
+    return len(to_embed) + len(removed)
+
+
+async def sync_hackathon_batch(batch) -> int:
+    """Queue a sync job for hackathons whose context changed; delete removed hackathons."""
+    deleted = [key for key, entry in batch if entry["deleted"]]
+    docs = {key: entry["doc"] for key, entry in batch if not entry["deleted"]}
+    hashes = {key: hackathon_context_hash(doc) for key, doc in docs.items()}
+    changed = await _changed_keys("hackathon", hashes)
+
+    queued = []
+    for key in changed:
+        active = await job_store.active_job(HACKATHON_SYNC, key)
+        if active is not None and active["payload"].get("contextHash") == hashes[key]:
+            continue  # already being synced; superseding it would only restart the work
+        # Jobs dedupe per hackathon, so a later edit supersedes a queued one. The job records
+        # the hash when it succeeds, so a failed or superseded sync is retried on the next event
+        await job_store.enqueue_job(HACKATHON_SYNC, key, {"hackathonId": key, "skills": None, "contextHash": hashes[key]})
+        queued.append(key)
+    if deleted:
+        await run_milvus(batch_delete_hackathons, deleted)
+        await run_milvus(flush_collection, "hackathons")
+    await _forget_hashes("hackathon", deleted)
+    return len(queued) + len(deleted)
+
+
+def create_syncs():
+    return [
+        CollectionSync("users", get_async_users_collection, sync_user_batch),
+        CollectionSync("hackathons", get_async_hackathons_collection, sync_hackathon_batch),
+    ]
+
+
+async def run_change_sync():
+    from .embedder import load_model
+    load_model()
+    syncs = create_syncs()
+    try:
+        await asyncio.gather(*(sync.run() for sync in syncs))
+    finally:
+        for sync in syncs:
+            await sync.flush(flush_all=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_change_sync())
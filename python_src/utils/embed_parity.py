@@ -0,0 +1,96 @@
+"""
+Parity check for embedding backends.
+
+Samples users from Mongo, re-embeds their skills with the fp32 torch model and
+with the selected backend, and reports cosine drift against the vectors
+already stored in Milvus plus CPU time per embedding:
+
+    python -m python_src.utils.embed_parity --backend torch_int8 --sample 500
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ..db.mongo_client import get_users_collection, USER_SKILLS_FIELD
+from ..db.milvus_client import get_participant_embeddings
+from . import embedder
+from .inference_backends import BACKENDS, create_runner
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _cosine_stats(a, b):
+    cosines = np.sum(_normalize(a) * _normalize(b), axis=1)
+    if len(cosines) == 0:
+        return {}
+    return {
+        "mean": float(np.mean(cosines)),
+        "min": float(np.min(cosines)),
+        "p1": float(np.percentile(cosines, 1)),
+        "p5": float(np.percentile(cosines, 5)),
+        "p50": float(np.percentile(cosines, 50)),
+    }
+
+
+def _embed_timed(runner, texts, batch_size):
+    started = time.process_time()
+    rows = [runner(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    cpu_seconds = time.process_time() - started
+    matrix = np.concatenate(rows) if rows else np.empty((0, embedder.EMB_DIM), dtype=np.float32)
+    return matrix, 1000.0 * cpu_seconds / max(1, len(texts))
+
+
+def run_parity(backend: str, sample_size: int = 200, batch_size: int = 32):
+    embedder.load_model()
+    runner_args = dict(
+        onnx_path=embedder.EMBED_ONNX_PATH,
+        intra_op_threads=embedder.EMBED_INTRA_OP_THREADS,
+        inter_op_threads=embedder.EMBED_INTER_OP_THREADS,
+    )
+    reference = create_runner("torch", embedder.model, embedder.tokenizer, embedder.MAX_LENGTH, **runner_args)
+    candidate = create_runner(backend, embedder.model, embedder.tokenizer, embedder.MAX_LENGTH, **runner_args)
+
+    users = list(get_users_collection().aggregate([
+        {"$match": {USER_SKILLS_FIELD: {"$exists": True, "$ne": []}}},
+        {"$sample": {"size": sample_size}},
+        {"$project": {USER_SKILLS_FIELD: 1}},
+    ]))
+    stored = get_participant_embeddings([str(user["_id"]) for user in users])
+    users = [user for user in users if str(user["_id"]) in stored]
+    texts = [", ".join(user[USER_SKILLS_FIELD]) for user in users]
+    stored_matrix = np.array([stored[str(user["_id"])] for user in users], dtype=np.float32).reshape(len(users), -1)
+
+    fp32, fp32_ms = _embed_timed(reference, texts, batch_size)
+    candidate_matrix, candidate_ms = _embed_timed(candidate, texts, batch_size)
+
+    return {
+        "backend": backend,
+        "sampled": sample_size,
+        "compared": len(users),
+        # Drift of the backend against what is in Milvus right now
+        "vs_stored": _cosine_stats(candidate_matrix, stored_matrix),
+        # Drift caused by the backend alone
+        "vs_fp32": _cosine_stats(candidate_matrix, fp32),
+        # Baseline: fresh fp32 against stored (non-zero drift means stored vectors predate current preprocessing)
+        "fp32_vs_stored": _cosine_stats(fp32, stored_matrix),
+        "cpu_ms_per_embedding": {"torch": fp32_ms, backend: candidate_ms},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cosine drift of an embedding backend against stored fp32 vectors")
+    parser.add_argument("--backend", choices=BACKENDS, default=embedder.EMBED_BACKEND)
+    parser.add_argument("--sample", type=int, default=200, help="number of users to sample")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+    print(json.dumps(run_parity(args.backend, args.sample, args.batch_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,273 @@
-from transformers import RobertaTokenizer, RobertaModel
-import torch
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from .embedding_cache import EmbeddingCache, normalize_skills, skill_cache_key
+from .inference_backends import configure_torch_threads, create_runner
+from .metrics import collect_timings, request_timings
+from .skill_vocabulary import SkillVocabulary
+
+MODEL_NAME = "microsoft/codebert-base"
+# Optional local directory holding the same weights (ideally as model.safetensors,
+# which is memory-mapped instead of copied into each process)
+EMBED_MODEL_PATH = os.getenv("EMBED_MODEL_PATH") or MODEL_NAME
+MAX_LENGTH = 128
+EMB_DIM = int(os.getenv("EMB_DIM", "768"))
+
+# Inference backend: torch (fp32) | torch_int8 (dynamic quantization) | onnx (ONNX Runtime)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_PATH = os.getenv("EMBED_ONNX_PATH", ".onnx_cache/codebert-cls.onnx")
+EMBED_INTRA_OP_THREADS = int(os.getenv("EMBED_INTRA_OP_THREADS", "0"))  # 0 = library default
+EMBED_INTER_OP_THREADS = int(os.getenv("EMBED_INTER_OP_THREADS", "0"))
+# How a skill list becomes one vector: "joint" runs the model over the joined list
+# (truncated at MAX_LENGTH tokens); "composed" pools per-skill vectors from the
+# skill vocabulary, so only never-seen skills cost a forward pass. The two modes
+# produce different vector spaces: re-sync stored embeddings after switching.
+EMBED_MODE = os.getenv("EMBED_MODE", "joint")
+# Non-default backends get their own cache namespace; fp32 keeps the original keys
+CACHE_MODEL_KEY = MODEL_NAME if EMBED_BACKEND == "torch" else f"{MODEL_NAME}+{EMBED_BACKEND}"
+
+# torch/transformers are imported and the weights loaded by load_model(), not at
+# import time, so workers come up (and answer /health) before the model is ready
+tokenizer = None
+model = None
+_runner = None
+_model_lock = threading.Lock()
+_model_ready = threading.Event()
+_model_error = None
+
+# Micro-batching knobs: a batch is run as soon as it holds EMBED_MAX_BATCH_SIZE
+# skill lists or the oldest request has waited EMBED_MAX_WAIT_MS.
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+
+def load_model():
+    """
+    Load the tokenizer and model once per process (idempotent, thread-safe).
+    When called in a pre-fork parent (see gunicorn_conf.py), forked workers
+    share the weight pages copy-on-write instead of each loading a copy.
+    """
+    global tokenizer, model, _runner, _model_error
+    with _model_lock:
+        if _model_ready.is_set():
+            return
+        try:
+            started = time.monotonic()
+            import torch
+            from transformers import RobertaTokenizerFast, RobertaModel
+
+            tokenizer = RobertaTokenizerFast.from_pretrained(EMBED_MODEL_PATH)
+            configure_torch_threads(torch, EMBED_INTRA_OP_THREADS, EMBED_INTER_OP_THREADS)
+            loaded = RobertaModel.from_pretrained(EMBED_MODEL_PATH, low_cpu_mem_usage=True)
+            loaded.eval()
+            _runner = create_runner(
+                EMBED_BACKEND, loaded, tokenizer, MAX_LENGTH, onnx_path=EMBED_ONNX_PATH,
+                intra_op_threads=EMBED_INTRA_OP_THREADS, inter_op_threads=EMBED_INTER_OP_THREADS,
+            )
+            model = loaded
+            _model_error = None
+            _model_ready.set()
+            print(f"✅ Embedding model loaded ({EMBED_BACKEND} backend) in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            _model_error = e
+            print(f"❌ Failed to load embedding model: {str(e)}")
+            raise
+
+
+def start_background_load():
+    """Kick off load_model() on a background thread; returns immediately."""
+    if not _model_ready.is_set():
+        threading.Thread(target=load_model, name="embedding-model-loader", daemon=True).start()
+
+
+def is_model_ready() -> bool:
+    return _model_ready.is_set()
+
+
+def model_status():
+    if _model_ready.is_set():
+        return "ready"
+    return "failed" if _model_error is not None else "loading"
+
+
+def _embed_batch(skill_lists):
+    """
+    Given many lists of skills, return one normalized embedding per list.
+    All lists go through a single padded forward pass; shape: (n, hidden_size).
+    """
+    load_model()
+    input_texts = [", ".join(skills) for skills in skill_lists]
+
+    # Use the [CLS] token representation of every sequence
+    cls_embeddings = _runner(input_texts)  # shape: (n, hidden_size)
+
+    # Normalize each embedding (L2 norm), leaving all-zero rows untouched
+    norms = np.linalg.norm(cls_embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return cls_embeddings / norms
+
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent embedding requests into micro-batches.
+
+    Callers submit a skill list and get a Future back; a single worker thread
+    drains the queue, runs one forward pass per batch and resolves every
+    caller's future with its own row. The stages timed during a forward pass
+    are added to every caller's Server-Timing entries.
+    """
+
+    def __init__(self, embed_fn=_embed_batch, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, skills) -> Future:
+        self.start()
+        future = Future()
+        self._queue.put((list(skills), future, request_timings()))
+        return future
+
+    def embed(self, skills, timeout=None):
+        return self.submit(skills).result(timeout=timeout)
+
+    def reset_after_fork(self):
+        # The worker thread does not exist in a forked child; start fresh there
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Skip requests whose callers have already given up
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                embeddings, timings = collect_timings(self.embed_fn, [skills for skills, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, caller_timings), embedding in zip(batch, embeddings):
+                if caller_timings is not None:
+                    caller_timings.extend(timings)
+                future.set_result(embedding)
+
+
+_batcher = EmbeddingBatcher()
+_cache = EmbeddingCache(dim=EMB_DIM)
+# A skill's vocabulary row is the embedding of the one-skill list, under the same cache key
+_vocabulary = SkillVocabulary(EMB_DIM, _cache, lambda skill: skill_cache_key([skill], CACHE_MODEL_KEY, MAX_LENGTH))
+os.register_at_fork(after_in_child=_batcher.reset_after_fork)
+
+
+def _compose(skill_lists, embed_missing):
+    """Composed-mode vectors for normalized skill lists; embed_missing(skills) embeds unseen skills."""
+    missing = _vocabulary.missing(skill for skills in skill_lists for skill in skills)
+    if missing:
+        _vocabulary.add(missing, embed_missing(missing))
+    return _vocabulary.compose(skill_lists)
+
+
+def _embed_skills_batched(skills):
+    # One request per skill so concurrent callers' new skills share forward passes
+    futures = [_batcher.submit([skill]) for skill in skills]
+    return [future.result() for future in futures]
+
+
+async def _off_loop(fn, *args):
+    # The cache's disk tier reads, appends and takes a file lock; keep that off the event loop
+    if _cache.directory:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def _cache_get_async(key):
+    embedding = _cache.get_memory(key)
+    if embedding is None:
+        embedding = await _off_loop(_cache.get, key)
+    return embedding
+
+
+async def _compose_async(skill_lists):
+    missing = await _off_loop(_vocabulary.missing, [skill for skills in skill_lists for skill in skills])
+    if missing:
+        embeddings = await asyncio.gather(*(asyncio.wrap_future(_batcher.submit([skill])) for skill in missing))
+        await _off_loop(_vocabulary.add, missing, embeddings)
+    return _vocabulary.compose(skill_lists)
 
-tokenizer = RobertaTokenizer.from_pretrained("microsoft/codebert-base")
-model = RobertaModel.from_pretrained("microsoft/codebert-base")
 
 def get_skill_embedding(skills):
     """
     Given a list of skills, return a single aggregated embedding vector.
+    The model sees the skills as given; the embedding cache is keyed on their
+    normalized form, and misses from concurrent calls are transparently
+    batched into one forward pass.
     """
-    input_text = ", ".join(skills)  # e.g., "Python, PyTorch, FastAPI"
-    inputs = tokenizer(input_text, return_tensors="pt", truncation=True, max_length=128)
-    
-    with torch.no_grad():
-        outputs = model(**inputs)
-    
-    # Use the [CLS] token representation
-    cls_embedding = outputs.last_hidden_state[:, 0, :]  # shape: (1, hidden_size)
-    embedding = cls_embedding.squeeze().numpy()  # shape: (hidden_size,)
-
-    # Normalize the embedding (L2 norm)
-    norm = np.linalg.norm(embedding)
-    if norm == 0:
-        normalized_embedding = embedding
-    else:
-        normalized_embedding = embedding / norm
-
-    return normalized_embedding
\ No newline at end of file
+    skills = list(skills)
+    if EMBED_MODE == "composed":
+        return _compose([normalize_skills(skills)], _embed_skills_batched)[0]
+    key = skill_cache_key(normalize_skills(skills), CACHE_MODEL_KEY, MAX_LENGTH)
+    embedding = _cache.get(key)
+    if embedding is None:
+        embedding = _batcher.embed(skills)
+        _cache.put(key, embedding)
+    return embedding
+
+
+async def get_skill_embedding_async(skills):
+    """
+    Async version of get_skill_embedding. Inference runs on the batcher's
+    dedicated worker thread and disk cache I/O on a thread; the event loop
+    only serves memory-tier hits and awaits the rest.
+    """
+    skills = list(skills)
+    if EMBED_MODE == "composed":
+        return (await _compose_async([normalize_skills(skills)]))[0]
+    key = skill_cache_key(normalize_skills(skills), CACHE_MODEL_KEY, MAX_LENGTH)
+    embedding = await _cache_get_async(key)
+    if embedding is None:
+        embedding = await asyncio.wrap_future(_batcher.submit(skills))
+        await _off_loop(_cache.put, key, embedding)
+    return embedding
+
+
+async def get_skill_embeddings_async(skill_lists):
+    """Embeddings for many skill lists at once; cache misses are fed through the batcher together."""
+    if EMBED_MODE == "composed":
+        return await _compose_async([normalize_skills(skills) for skills in skill_lists])
+    embeddings = await asyncio.gather(*(get_skill_embedding_async(skills) for skills in skill_lists))
+    return np.stack(embeddings) if embeddings else np.empty((0, EMB_DIM), dtype=np.float32)
+
+
+def embedding_cache_stats():
+    return {**_cache.stats, "vocabulary_size": len(_vocabulary)}
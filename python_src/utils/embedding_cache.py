@@ -0,0 +1,200 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", ".embedding_cache")  # empty string disables the disk tier
+EMBED_CACHE_MEMORY_SIZE = int(os.getenv("EMBED_CACHE_MEMORY_SIZE", "10000"))
+# Rows kept on disk (and keys held in each process's index) before the disk tier starts over
+EMBED_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_DISK_MAX_ENTRIES", "500000"))
+
+
+def normalize_skills(skills):
+    """
+    Canonical form of a skill list: trimmed, whitespace-collapsed, case-folded,
+    de-duplicated and sorted, so "React, python" and "Python,  react" share an entry.
+    """
+    normalized = {" ".join(str(skill).split()).casefold() for skill in skills}
+    normalized.discard("")
+    return sorted(normalized)
+
+
+def skill_cache_key(skills, model_name: str, max_length: int) -> str:
+    """Content hash of an already-normalized skill list plus the model settings."""
+    payload = json.dumps([model_name, max_length, skills], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache.
+
+    The memory tier is a per-process LRU. The disk tier is an append-only
+    float32 matrix (memory-mapped for reads) plus a "key<TAB>row" index file;
+    appends are serialized with a file lock so every uvicorn worker can share
+    the same directory, and entries survive restarts. The two tiers have
+    separate locks, so memory lookups never wait behind disk I/O.
+
+    Once the disk tier holds disk_max_entries rows, the next writer unlinks
+    both files and starts a new generation, which bounds the disk and the
+    in-memory index; other processes notice the new index file and drop
+    theirs. Cached arrays are read-only, since every caller shares them.
+    """
+
+    def __init__(self, dim: int, directory: str = EMBED_CACHE_DIR, memory_size: int = EMBED_CACHE_MEMORY_SIZE,
+                 disk_max_entries: int = EMBED_CACHE_DISK_MAX_ENTRIES):
+        self.dim = dim
+        self.memory_size = memory_size
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+        self.directory = directory
+        self._row_bytes = dim * 4
+        self._reset_index()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._data_path = os.path.join(directory, f"embeddings-{dim}.f32")
+            self._index_path = os.path.join(directory, f"index-{dim}.tsv")
+            self._lock_path = os.path.join(directory, f"cache-{dim}.lock")
+            with self._file_lock():
+                self._rows_on_disk()
+
+    def get_memory(self, key: str):
+        """Memory tier only: never touches the disk, so it is safe on an event loop."""
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            return embedding
+
+    def get(self, key: str):
+        embedding = self.get_memory(key)
+        if embedding is not None:
+            return embedding
+
+        if self.directory:
+            with self._disk_lock:
+                embedding = self._disk_get(key)
+        with self._lock:
+            if embedding is not None:
+                self._remember(key, embedding)
+                self.stats["disk_hits"] += 1
+                return embedding
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, embedding):
+        embedding = _frozen(embedding)
+        with self._lock:
+            self._remember(key, embedding)
+            self.stats["writes"] += 1
+        if self.directory:
+            with self._disk_lock:
+                self._disk_put(key, embedding)
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _reset_index(self):
+        self._index = {}
+        self._index_offset = 0
+        self._index_inode = None
+        self._matrix = None
+
+    @contextmanager
+    def _file_lock(self, mode=fcntl.LOCK_EX):
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rows_on_disk(self) -> int:
+        """Whole rows in the data file; the caller holds the exclusive file lock."""
+        if not os.path.exists(self._data_path):
+            return 0
+        rows, torn = divmod(os.path.getsize(self._data_path), self._row_bytes)
+        if torn:
+            # A writer died mid-append; appending after the partial row would shift every later row
+            os.truncate(self._data_path, rows * self._row_bytes)
+        return rows
+
+    def _refresh_index(self):
+        """Pick up index lines appended by this or other processes since the last read."""
+        try:
+            inode = os.stat(self._index_path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._index_inode:
+            # Another writer started a new generation: rows of the old index point into the old file
+            self._reset_index()
+            self._index_inode = inode
+        if inode is None:
+            return
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_offset)
+            chunk = f.read()
+        # Only consume complete lines; a concurrent writer may be mid-append
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].decode("utf-8").splitlines():
+            key, _, row = line.partition("\t")
+            if row:
+                self._index[key] = int(row)
+        self._index_offset += end
+
+    def _disk_get(self, key):
+        row = self._index.get(key)
+        if row is None or self._matrix is None or row >= self._matrix.shape[0]:
+            # Re-read the index and map the data file together, so both come from the same generation
+            with self._file_lock(fcntl.LOCK_SH):
+                self._refresh_index()
+                row = self._index.get(key)
+                if row is None:
+                    return None
+                if self._matrix is None or row >= self._matrix.shape[0]:
+                    rows = os.path.getsize(self._data_path) // self._row_bytes
+                    self._matrix = np.memmap(self._data_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return _frozen(self._matrix[row])
+
+    def _disk_put(self, key, embedding):
+        with self._file_lock():
+            self._refresh_index()
+            if key in self._index:
+                return
+            row = self._rows_on_disk()
+            if row >= self.disk_max_entries:
+                # Unlink rather than truncate: other processes' maps of the old file stay valid
+                for path in (self._index_path, self._data_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._refresh_index()
+                row = 0
+            # Data goes first so any row referenced by the index is fully written
+            with open(self._data_path, "ab") as f:
+                f.write(embedding.reshape(self.dim).tobytes())
+            with open(self._index_path, "ab") as f:
+                f.write(f"{key}\t{row}\n".encode("utf-8"))
+            self._index[key] = row
+            if self._index_inode is None:
+                self._index_inode = os.stat(self._index_path).st_ino
+                self._index_offset = os.path.getsize(self._index_path)
+
+
+def _frozen(embedding):
+    """A private read-only float32 copy, safe to hand to every caller."""
+    embedding = np.array(embedding, dtype=np.float32)
+    embedding.flags.writeable = False
+    return embedding
@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import weakref
+
+from dotenv import load_dotenv
+
+from ..db.recommendation_cache import LocalCacheBackend, RedisCacheBackend, REDIS_URL
+from .metrics import timed
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Deterministic offline stand-in for Gemini (tests, benchmarks, local development)
+GEMINI_FAKE = os.getenv("GEMINI_FAKE", "0") == "1"
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))  # seconds
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "30.0"))
+GEMINI_CACHE_TTL = float(os.getenv("GEMINI_CACHE_TTL", str(7 * 24 * 3600)))
+GEMINI_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "5000"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Shared genai client (one HTTP connection pool per process)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return _client
+
+
+def reset_after_fork():
+    # Connection pools must not be shared with the parent process
+    global _client
+    _client = None
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. reserve() takes a token and returns how long the
+    caller must wait before using it, so one bucket is shared by every event
+    loop in the process.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is a queue of reservations; each waits for its share of refill
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+def _is_retryable(error: Exception) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in RETRYABLE_STATUS:
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError))
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter keeps a burst of failed calls from retrying in lockstep
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2 ** attempt))
+
+
+def context_key(prompt: str, schema) -> str:
+    digest = hashlib.sha256(f"{GEMINI_MODEL}\0{schema.__name__}\0{prompt}".encode("utf-8")).hexdigest()
+    return f"gemini:{digest}"
+
+
+class GeminiScheduler:
+    """
+    Structured-output Gemini calls with memoization, bounded concurrency,
+    token-bucket rate limiting and retries with exponential backoff.
+
+    Results are cached by a hash of (model, schema, prompt), so re-syncing an
+    unchanged hackathon costs no Gemini call. Concurrent identical requests
+    share one in-flight call.
+    """
+
+    def __init__(self, backend, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE, burst: int = GEMINI_BURST,
+                 max_retries: int = GEMINI_MAX_RETRIES, cache_ttl: float = GEMINI_CACHE_TTL):
+        self.backend = backend
+        self.max_concurrency = max(1, max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.max_retries = max_retries
+        self.cache_ttl = cache_ttl
+        # asyncio primitives are bound to a loop; keep one set per running loop
+        self._loop_state = weakref.WeakKeyDictionary()
+        self.stats = {"hits": 0, "misses": 0, "calls": 0, "retries": 0, "failures": 0}
+
+    def _async_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None:
+            state = self._loop_state[loop] = (asyncio.Semaphore(self.max_concurrency), {})
+        return state
+
+    async def _backend_call(self, fn, *args):
+        # A Redis backend does blocking network I/O; keep it off the event loop
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def generate_async(self, prompt: str, schema, generate_fn):
+        """generate_fn(prompt) is a coroutine function returning a dict; called at most once per uncached prompt."""
+        key = context_key(prompt, schema)
+        cached = await self._backend_call(self.backend.get, key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        semaphore, inflight = self._async_state()
+        pending = inflight.get(key)
+        if pending is not None:
+            self.stats["hits"] += 1
+            return await asyncio.shield(pending)
+        self.stats["misses"] += 1
+
+        future = asyncio.get_running_loop().create_future()
+        inflight[key] = future
+        try:
+            async with semaphore:
+                result = await self._call_with_retries(prompt, generate_fn)
+            await self._backend_call(self.backend.set, key, result, self.cache_ttl)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting on the shared future; mark its exception as retrieved
+            future.exception()
+            raise
+        finally:
+            inflight.pop(key, None)
+
+    async def _call_with_retries(self, prompt, generate_fn):
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self.bucket.reserve())
+            try:
+                self.stats["calls"] += 1
+                return await generate_fn(prompt)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(_backoff(attempt))
+
+    def get_stats(self):
+        return dict(self.stats)
+
+
+def _parsed_to_dict(response) -> dict:
+    return response.parsed.model_dump()
+
+
+async def call_structured_async(prompt: str, schema) -> dict:
+    """One Gemini call on the async (aio) client returning the parsed schema as a dict."""
+    if GEMINI_FAKE:
+        return fake_structured(prompt, schema)
+    with timed("gemini"):
+        response = await get_client().aio.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=prompt,
+            config={"response_mime_type": "application/json", "response_schema": schema},
+        )
+    return _parsed_to_dict(response)
+
+
+_FAKE_SKILLS = [
+    "Python", "JavaScript", "TypeScript", "React", "Node.js", "FastAPI", "PyTorch", "TensorFlow",
+    "Machine Learning", "Data Analysis", "SQL", "MongoDB", "Docker", "Kubernetes", "AWS", "UI/UX Design",
+    "Solidity", "Rust", "Go", "Computer Vision", "NLP", "Flutter", "Swift", "Cybersecurity",
+]
+
+
+def fake_structured(prompt: str, schema) -> dict:
+    """Deterministic schema-shaped answer derived from the prompt; never touches the network."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    name = re.search(r"^\s*(?:name|title): (.+)$", prompt, re.MULTILINE)
+    skills = [_FAKE_SKILLS[b % len(_FAKE_SKILLS)] for b in digest[:12]]
+    values = {}
+    for field, info in schema.model_fields.items():
+        if info.annotation is str:
+            values[field] = name.group(1).strip() if name else "Hackathon"
+        else:
+            values[field] = list(dict.fromkeys(skills))
+    return schema(**values).model_dump()
+
+
+scheduler = GeminiScheduler(
+    RedisCacheBackend(REDIS_URL) if REDIS_URL else LocalCacheBackend(max_size=GEMINI_CACHE_SIZE),
+    # The fake model has no quota to protect
+    requests_per_minute=0 if GEMINI_FAKE else GEMINI_REQUESTS_PER_MINUTE,
+)
@@ -1,10 +1,13 @@
 from bson import ObjectId
-from ..db.mongo_client import get_hackathons_collection
+from ..db.membership import HACKATHON_PARTICIPANTS_FIELD
+from ..db.mongo_client import get_async_hackathons_collection
 from ..models.hackathon import HackathonDreamTeam
-import json
+from .metrics import timed
+import threading
+import time
+from collections import OrderedDict
 
-from google import genai
-# import google.generativeai as genai
+from . import gemini
 
 import os
 from dotenv import load_dotenv
@@ -32,50 +35,198 @@ def flatten_document(doc, parent_key="", sep="."):
             items.append(f"{new_key}: {v}")
     return "\n".join(items)
 
-def generate_hackathon_context(hackathon_id: str) -> str:
+# Only the fields that describe what is being built are read and sent to Gemini;
+# "*" reads the whole document minus the excluded fields
+HACKATHON_CONTEXT_FIELDS = [
+    field.strip()
+    for field in os.getenv(
+        "HACKATHON_CONTEXT_FIELDS",
+        "name,title,tagline,description,theme,themes,tracks,problemStatements,"
+        "tags,technologies,techStack,skills,category",
+    ).split(",")
+    if field.strip()
+]
+# Never context: registrations and media are bulky and say nothing about the skills needed
+HACKATHON_CONTEXT_EXCLUDE = {
+    field.strip()
+    for field in os.getenv(
+        "HACKATHON_CONTEXT_EXCLUDE",
+        "participants,registrations,images,image,logo,banner,coverImage,media,gallery",
+    ).split(",")
+    if field.strip()
+} | {HACKATHON_PARTICIPANTS_FIELD}
+HACKATHON_CONTEXT_TTL = float(os.getenv("HACKATHON_CONTEXT_TTL", "600"))  # seconds
+HACKATHON_CONTEXT_CACHE_SIZE = int(os.getenv("HACKATHON_CONTEXT_CACHE_SIZE", "1024"))
+
+_ALL_FIELDS = HACKATHON_CONTEXT_FIELDS == ["*"]
+_CONTEXT_PROJECTION = (
+    {field: 0 for field in HACKATHON_CONTEXT_EXCLUDE} if _ALL_FIELDS
+    else {field: 1 for field in HACKATHON_CONTEXT_FIELDS + ["updatedAt"] if field not in HACKATHON_CONTEXT_EXCLUDE}
+)
+_VERSION_PROJECTION = {"updatedAt": 1}
+
+
+class HackathonContextCache:
+    """
+    TTL + LRU cache of flattened hackathon contexts keyed by hackathon id.
+
+    Each entry remembers the document's updatedAt; callers re-read only that
+    field (a cheap projected query) and drop entries whose document has changed
+    since. Documents without updatedAt are served on the TTL alone.
+    """
+
+    def __init__(self, ttl: float = HACKATHON_CONTEXT_TTL, max_size: int = HACKATHON_CONTEXT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0}
+
+    def candidates(self, hackathon_ids):
+        """Return {id: (updatedAt, context)} for unexpired entries; still to be validated."""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for hid in hackathon_ids:
+                entry = self._entries.get(hid)
+                if entry is None:
+                    continue
+                expires_at, updated_at, context = entry
+                if expires_at < now:
+                    del self._entries[hid]
+                    continue
+                self._entries.move_to_end(hid)
+                found[hid] = (updated_at, context)
+        return found
+
+    def validate(self, candidates, current_versions):
+        """Keep candidates whose updatedAt still matches current_versions ({id: updatedAt})."""
+        valid = {}
+        with self._lock:
+            for hid, (updated_at, context) in candidates.items():
+                if hid in current_versions and current_versions[hid] == updated_at:
+                    valid[hid] = context
+                else:
+                    self._entries.pop(hid, None)
+                    self.stats["stale"] += 1
+        return valid
+
+    def put(self, hid: str, updated_at, context: str):
+        with self._lock:
+            self._entries[hid] = (time.monotonic() + self.ttl, updated_at, context)
+            self._entries.move_to_end(hid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, hid: str):
+        with self._lock:
+            self._entries.pop(hid, None)
+
+    def record(self, hits: int, misses: int):
+        with self._lock:
+            self.stats["hits"] += hits
+            self.stats["misses"] += misses
+
+
+_context_cache = HackathonContextCache()
+
+
+def _object_ids(hackathon_ids):
+    """Map ObjectId -> id string, skipping ids that are not valid ObjectIds."""
+    return {ObjectId(hid): hid for hid in hackathon_ids if ObjectId.is_valid(hid)}
+
+
+def _cache_fetched(docs, object_ids):
+    contexts = {}
+    for doc in docs:
+        hid = object_ids[doc["_id"]]
+        context = _flatten_hackathon_doc(doc)
+        if not context:
+            # Nothing to prompt with: leave it out rather than send Gemini an empty context
+            print(f" Hackathon {hid} produced an empty context (fields: {','.join(HACKATHON_CONTEXT_FIELDS)})")
+            continue
+        contexts[hid] = context
+        _context_cache.put(hid, doc.get("updatedAt"), context)
+    return contexts
+
+
+async def generate_hackathon_contexts_async(hackathon_ids) -> dict:
+    """
+    Flattened contexts for many hackathons with at most two Mongo round trips:
+    one updatedAt check for cached entries and one projected $in fetch for the
+    rest. Ids with no matching document are left out of the result.
+    """
+    hackathon_ids = list(dict.fromkeys(str(hid) for hid in hackathon_ids))
+    collection = get_async_hackathons_collection()
+
+    candidates = _context_cache.candidates(hackathon_ids)
+    contexts = {}
+    if candidates:
+        candidate_ids = _object_ids(candidates)
+        with timed("mongo_find", collection="hackathons"):
+            current = collection.find({"_id": {"$in": list(candidate_ids)}}, _VERSION_PROJECTION)
+            versions = {candidate_ids[doc["_id"]]: doc.get("updatedAt") async for doc in current}
+        contexts = _context_cache.validate(candidates, versions)
+
+    missing = _object_ids(hid for hid in hackathon_ids if hid not in contexts)
+    _context_cache.record(len(contexts), len(missing))
+    if missing:
+        with timed("mongo_find", collection="hackathons"):
+            docs = await collection.find({"_id": {"$in": list(missing)}}, _CONTEXT_PROJECTION).to_list(length=None)
+        contexts.update(_cache_fetched(docs, missing))
+    return contexts
+
+
+async def generate_hackathon_context_async(hackathon_id: str) -> str:
     try:
-        collection = get_hackathons_collection()
-        doc = collection.find_one({"_id": ObjectId(hackathon_id)})
-
-        if not doc:
-            print(f" No hackathon found with _id {hackathon_id} in MongoDB")
-            raise ValueError(f"No hackathon found with _id {hackathon_id}")
+        context = (await generate_hackathon_contexts_async([hackathon_id])).get(str(hackathon_id))
+        if context is None:
+            print(f" No hackathon context for _id {hackathon_id} in MongoDB")
+            raise ValueError(f"No hackathon context for _id {hackathon_id}")
     except Exception as e:
         print(f" Error fetching hackathon {hackathon_id} from MongoDB: {str(e)}")
         raise
 
-    # Convert ObjectId/Date types to JSON serializable
-    def bson_default(obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        return str(obj)
+    return context
+
+
+def hackathon_context_cache_stats():
+    return dict(_context_cache.stats)
+
 
-    clean_doc = json.loads(json.dumps(doc, default=bson_default))
+def hackathon_context_fields(doc) -> dict:
+    """The part of a hackathon document that goes into its context."""
+    # _id and updatedAt are bookkeeping, not context
+    return {k: v for k, v in doc.items() if k not in ("_id", "updatedAt") and k not in HACKATHON_CONTEXT_EXCLUDE
+            and (_ALL_FIELDS or k in HACKATHON_CONTEXT_FIELDS)}
 
-    return flatten_document(clean_doc)
 
+def _flatten_hackathon_doc(doc) -> str:
+    # Leaf values (ObjectId, datetime, ...) are stringified by flatten_document itself
+    return flatten_document(hackathon_context_fields(doc))
 
 
-def generate_dream_team_skills(hackathon_context: str) -> HackathonDreamTeam:
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-    
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=f"""
+
+def _dream_team_prompt(hackathon_context: str) -> str:
+    return f"""
         You are given details about a hackathon:
 
         {hackathon_context}
 
         Based on this, generate a list of 10-20 technical skills that the 'dream team' should have to maximize their chances of winning this hackathon. Return only the structured JSON.
-        """,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": HackathonDreamTeam,
-        },
-    )
+        """
 
-    return {'hackathon_name':response.parsed.hackathon_name, 'target_skills':response.parsed.required_skills}
+def _dream_team_result(parsed: dict):
+    return {'hackathon_name': parsed['hackathon_name'], 'target_skills': parsed['required_skills']}
+
+async def generate_dream_team_skills_async(hackathon_context: str) -> HackathonDreamTeam:
+    # Memoized by context hash, rate limited and retried by the shared scheduler
+    parsed = await gemini.scheduler.generate_async(
+        _dream_team_prompt(hackathon_context), HackathonDreamTeam,
+        lambda prompt: gemini.call_structured_async(prompt, HackathonDreamTeam),
+    )
+    return _dream_team_result(parsed)
 
-def generate_hackathon_skills(hidx):
-    context_string = generate_hackathon_context(hidx)
-    return generate_dream_team_skills(context_string)
\ No newline at end of file
+async def generate_hackathon_skills_async(hidx):
+    context_string = await generate_hackathon_context_async(hidx)
+    return await generate_dream_team_skills_async(context_string)
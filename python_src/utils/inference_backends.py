@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+
+from .metrics import timed
+
+BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+def configure_torch_threads(torch, intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """Apply thread counts (0 keeps the library default). Inter-op can only be set once per process."""
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            print(f"Note: could not set inter-op threads: {str(e)}")
+
+
+def create_runner(backend: str, model, tokenizer, max_length: int, onnx_path: str = None,
+                  intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """
+    Build a callable texts -> (n, hidden_size) float32 array of [CLS] vectors.
+
+    backend: "torch" (fp32 as loaded), "torch_int8" (dynamic int8 quantization
+    of every Linear layer) or "onnx" (ONNX Runtime on a graph exported from the
+    fp32 model to onnx_path, exported on first use).
+    """
+    import torch
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+    if backend == "onnx":
+        return _create_onnx_runner(model, tokenizer, max_length, onnx_path, intra_op_threads, inter_op_threads)
+
+    if backend == "torch_int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+
+    def run(texts):
+        with timed("tokenize", backend=backend):
+            inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=max_length)
+        with timed("forward", backend=backend), torch.no_grad():
+            outputs = model(**inputs)
+        return outputs.last_hidden_state[:, 0, :].numpy()
+
+    return run
+
+
+def _create_onnx_runner(model, tokenizer, max_length, onnx_path, intra_op_threads, inter_op_threads):
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise ImportError("EMBED_BACKEND=onnx requires the 'onnxruntime' package") from e
+
+    if not os.path.exists(onnx_path):
+        export_onnx(model, tokenizer, onnx_path, max_length)
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op_threads > 0:
+        options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads > 0:
+        options.inter_op_num_threads = inter_op_threads
+    session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def run(texts):
+        with timed("tokenize", backend="onnx"):
+            inputs = tokenizer(texts, return_tensors="np", padding=True, truncation=True, max_length=max_length)
+        feed = {
+            "input_ids": inputs["input_ids"].astype(np.int64),
+            "attention_mask": inputs["attention_mask"].astype(np.int64),
+        }
+        with timed("forward", backend="onnx"):
+            return session.run(["cls_embedding"], feed)[0]
+
+    return run
+
+
+def export_onnx(model, tokenizer, onnx_path: str, max_length: int):
+    """Export the fp32 model as a graph that returns only the [CLS] vector."""
+    import torch
+
+    class ClsOutput(torch.nn.Module):
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, input_ids, attention_mask):
+            return self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state[:, 0, :]
+
+    sample = tokenizer(["Python, React"], return_tensors="pt", padding=True, truncation=True, max_length=max_length)
+    os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+    # Export to a temporary name so concurrently starting workers never load a partial file
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    torch.onnx.export(
+        ClsOutput(model).eval(),
+        (sample["input_ids"], sample["attention_mask"]),
+        tmp_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["cls_embedding"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "cls_embedding": {0: "batch"},
+        },
+        opset_version=17,
+    )
+    os.replace(tmp_path, onnx_path)
+    print(f"✅ Exported ONNX embedding graph to {onnx_path}")
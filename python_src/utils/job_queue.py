@@ -0,0 +1,189 @@
+"""
+Background job processing backed by the Mongo `jobs` collection.
+
+Requests enqueue a job and return its id immediately; worker tasks running
+on each app process claim jobs atomically, report progress and renew a lease
+while they work. Jobs left running by a process that died are picked up again
+once their lease expires. Jobs for the same key run one at a time, newest
+last. A dedicated worker process can be run with:
+
+    python -m python_src.utils.job_queue
+"""
+import asyncio
+import os
+import socket
+import traceback
+
+from ..db import job_store
+from ..db.milvus_client import insert_hackathon, run_milvus
+from .embedder import get_skill_embedding_async
+from .hackathon_context import generate_hackathon_skills_async
+from .materializer import materialize_hackathon, MATERIALIZE_TOP_K
+from .metrics import timed
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # per process; 0 only enqueues
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # seconds
+
+HACKATHON_SYNC = "hackathon_sync"
+MATERIALIZE_RECOMMENDATIONS = "materialize_recommendations"
+
+
+async def _no_progress(stage: str, progress: float):
+    pass
+
+
+async def sync_hackathon(hidx: str, skills=None, report=_no_progress) -> dict:
+    """Generate skills if needed, embed them and upsert the hackathon vector."""
+    if not skills:
+        await report("generating_skills", 0.1)
+        print(f"Generating AI skills for hackathon {hidx}...")
+        out = await generate_hackathon_skills_async(hidx)
+        skills = out.get("target_skills")
+        print(f"Generated skills: {skills}")
+
+    await report("embedding", 0.6)
+    with timed("embed"):
+        embedding = await get_skill_embedding_async(skills)
+
+    await report("upserting", 0.8)
+    await run_milvus(insert_hackathon, hid=str(hidx), embedding=embedding)
+    return {"hackathonId": hidx, "skills": skills}
+
+
+async def _run_hackathon_sync(payload: dict, report):
+    result = await sync_hackathon(payload["hackathonId"], payload.get("skills"), report)
+    if payload.get("contextHash"):
+        # Queued by change sync: mark this context as synced only now that it is
+        from .change_sync import record_hashes  # change_sync imports this module
+        await record_hashes("hackathon", {payload["hackathonId"]: payload["contextHash"]})
+    return result
+
+
+async def _run_materialize(payload: dict, report):
+    return await materialize_hackathon(payload["hackathonId"], payload.get("topK") or MATERIALIZE_TOP_K, report)
+
+
+JOB_HANDLERS = {
+    HACKATHON_SYNC: _run_hackathon_sync,
+    MATERIALIZE_RECOMMENDATIONS: _run_materialize,
+}
+
+
+class JobQueue:
+    def __init__(self, handlers=JOB_HANDLERS, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = []
+        self._running = {}
+        self._wakeup = None
+
+    async def start(self):
+        if self._tasks or self.workers <= 0:
+            return
+        await job_store.ensure_job_indexes()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(f"{self.worker_id}/{i}")) for i in range(self.workers)]
+        print(f"✅ Started {self.workers} job workers ({self.worker_id})")
+
+    async def stop(self):
+        """Stop the workers and hand unfinished jobs back to the queue for another process."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job_id, worker_id in list(self._running.values()):
+            await job_store.release_job(job_id, worker_id)
+        self._running.clear()
+
+    async def enqueue(self, job_type: str, key: str, payload: dict) -> dict:
+        job = await job_store.enqueue_job(job_type, key, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def _worker(self, worker_id: str):
+        # Each task has its own id, so leases and final writes are matched per task
+        while True:
+            try:
+                job = await job_store.claim_next_job(worker_id)
+            except Exception as e:
+                print(f"❌ Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job, worker_id)
+
+    async def _run(self, job, worker_id: str):
+        job_id = job["_id"]
+        task = asyncio.current_task()
+        self._running[task] = (job_id, worker_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, worker_id))
+        cancelled = False
+        try:
+            if job.get("supersededBy") is not None:
+                raise job_store.JobSuperseded(str(job_id))
+            if job["attempts"] > job_store.JOB_MAX_ATTEMPTS:
+                await job_store.finish_job(job_id, worker_id, job_store.FAILED, error="Exceeded maximum attempts")
+                return
+            handler = self.handlers.get(job["type"])
+            if handler is None:
+                await job_store.finish_job(job_id, worker_id, job_store.FAILED, error=f"Unknown job type '{job['type']}'")
+                return
+
+            async def report(stage, progress):
+                await job_store.report_progress(job_id, worker_id, stage, progress)
+
+            with timed("job", job_type=job["type"]):
+                result = await handler(job["payload"], report)
+            await job_store.finish_job(job_id, worker_id, job_store.SUCCEEDED, result=result)
+        except job_store.JobSuperseded:
+            await job_store.finish_job(job_id, worker_id, job_store.SUPERSEDED)
+        except asyncio.CancelledError:
+            # Shutdown: leave the job registered so stop() releases it back to the queue
+            cancelled = True
+            raise
+        except Exception as e:
+            print(f"❌ Job {job_id} ({job['type']} {job['key']}) failed: {str(e)}")
+            traceback.print_exc()
+            await job_store.finish_job(job_id, worker_id, job_store.FAILED, error=str(e))
+        finally:
+            heartbeat.cancel()
+            if not cancelled:
+                self._running.pop(task, None)
+
+    async def _heartbeat(self, job_id, worker_id: str):
+        # Keep the lease alive through long stages (Gemini retries, slow Milvus)
+        while True:
+            await asyncio.sleep(job_store.JOB_LEASE_SECONDS / 3)
+            try:
+                if not await job_store.renew_lease(job_id, worker_id):
+                    # Its result will not be recorded; the next progress report stops the handler
+                    print(f"❌ Lost the lease on job {job_id}")
+                    return
+            except Exception as e:
+                print(f"❌ Error renewing lease for job {job_id}: {str(e)}")
+
+
+job_queue = JobQueue()
+
+
+async def _run_worker():
+    from .embedder import load_model
+    load_model()
+    queue = JobQueue(workers=max(1, JOB_WORKERS))
+    await queue.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await queue.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(_run_worker())
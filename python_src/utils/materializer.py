@@ -0,0 +1,231 @@
+"""
+Precomputed teammate recommendations for every participant of a hackathon.
+
+Right after registration closes most participants of an event ask for
+recommendations at once. Instead of one ANN search per request, the
+materialization job loads the hackathon's participant vectors into one
+matrix, builds every participant's `target - user` query and ranks all
+candidates with a blocked matrix product (exact cosine, same scoring as the
+live search). The top-k lists are stored in Mongo, one document per
+(hackathon, participant), and /getRecommendations serves them with a single
+primary-key lookup.
+
+Each stored list records a fingerprint of the participant and hackathon
+vectors it was computed from; when either has changed since (skills
+updated, hackathon re-synced), the request falls back to the live search.
+Scores of other candidates in a list are as of the last run, so the job is
+meant to be re-run on a schedule (or after large waves of registrations):
+
+    python -m python_src.utils.materializer <hackathonId> [<hackathonId> ...]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+from pymongo import ReplaceOne
+
+from ..db.membership import membership
+from ..db.milvus_client import get_hackathon_embedding, get_participant_embedding, get_participant_embeddings, run_milvus
+from ..db.mongo_client import get_async_materialized_recommendations_collection
+from .metrics import timed
+
+MATERIALIZE_TOP_K = int(os.getenv("MATERIALIZE_TOP_K", "50"))
+MATERIALIZE_FETCH_BATCH = int(os.getenv("MATERIALIZE_FETCH_BATCH", "2000"))
+# Upper bound for one block of the (queries x candidates) score matrix
+MATERIALIZE_BLOCK_BYTES = int(os.getenv("MATERIALIZE_BLOCK_BYTES", str(64 * 1024 * 1024)))
+SERVE_MATERIALIZED = os.getenv("SERVE_MATERIALIZED", "1") == "1"
+# How long this process trusts its list of materialized hackathons, seconds
+MATERIALIZED_HACKATHONS_TTL = float(os.getenv("MATERIALIZED_HACKATHONS_TTL", "60"))
+
+_WRITE_BATCH = 1000
+_indexes_ready = False
+_stats = {"hits": 0, "stale": 0, "misses": 0, "skipped": 0}
+_materialized_hids = (0.0, frozenset())  # (expires at, hackathon ids with stored lists)
+
+
+def vector_fingerprint(vector) -> str:
+    return hashlib.sha1(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()[:16]
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def rank_teammates(ids, user_matrix, target, top_k: int, block_bytes: int = MATERIALIZE_BLOCK_BYTES):
+    """
+    Top-k (pid, score) lists for every row of user_matrix, scored against all
+    other rows by cosine similarity to the row's `target - user` query.
+    The score matrix is computed a block of queries at a time to bound memory.
+    """
+    candidates = _normalize_rows(np.asarray(user_matrix, dtype=np.float32))
+    queries = _normalize_rows(np.asarray(target, dtype=np.float32)[None, :] - np.asarray(user_matrix, dtype=np.float32))
+    n = len(ids)
+    k = min(top_k, n - 1)
+    results = []
+    if k <= 0:
+        return [[] for _ in range(n)]
+    block = max(1, block_bytes // (4 * n))
+    for start in range(0, n, block):
+        end = min(start + block, n)
+        scores = queries[start:end] @ candidates.T
+        # A participant is never their own teammate
+        scores[np.arange(end - start), np.arange(start, end)] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+        results.extend(
+            [(ids[j], float(score)) for j, score in zip(row, row_scores)]
+            for row, row_scores in zip(top, top_scores)
+        )
+    return results
+
+
+def _compute(hidx: str, top_k: int):
+    members = membership.members(hidx)
+    if members is None:
+        raise ValueError(f"Hackathon {hidx} has no recorded participants to materialize")
+    target = get_hackathon_embedding(hidx)
+    if target is None:
+        raise ValueError(f"Hackathon {hidx} not found")
+
+    members = sorted(members)
+    embeddings = {}
+    for start in range(0, len(members), MATERIALIZE_FETCH_BATCH):
+        embeddings.update(get_participant_embeddings(members[start:start + MATERIALIZE_FETCH_BATCH]))
+    # Registered users who never synced their skills have no vector and get live results
+    ids = [pid for pid in members if pid in embeddings]
+    if not ids:
+        return [], {}, vector_fingerprint(target), 0
+    user_matrix = np.stack([np.asarray(embeddings[pid], dtype=np.float32) for pid in ids])
+    with timed("materialize_rank"):
+        ranked = rank_teammates(ids, user_matrix, target, top_k)
+    fingerprints = {pid: vector_fingerprint(user_matrix[i]) for i, pid in enumerate(ids)}
+    return list(zip(ids, ranked)), fingerprints, vector_fingerprint(target), len(members)
+
+
+async def _ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        await get_async_materialized_recommendations_collection().create_index([("hid", 1), ("runId", 1)])
+        _indexes_ready = True
+
+
+async def _no_progress(stage: str, progress: float):
+    pass
+
+
+async def materialize_hackathon(hidx: str, top_k: int = MATERIALIZE_TOP_K, report=_no_progress) -> dict:
+    """Rank and store the top-k teammates of every participant of hidx, replacing the previous run."""
+    hidx = str(hidx)
+    await _ensure_indexes()
+    await report("ranking", 0.1)
+    ranked, fingerprints, target_fingerprint, registered = await run_milvus(_compute, hidx, top_k)
+
+    await report("storing", 0.7)
+    collection = get_async_materialized_recommendations_collection()
+    run_id = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    operations = [
+        ReplaceOne({"_id": f"{hidx}:{pid}"}, {
+            "hid": hidx,
+            "pid": pid,
+            "runId": run_id,
+            "topK": top_k,
+            "userFingerprint": fingerprints[pid],
+            "targetFingerprint": target_fingerprint,
+            "recommendations": [
+                {"pid": candidate, "similarity_score": score, "distance": score}
+                for candidate, score in hits
+            ],
+            "materializedAt": now,
+        }, upsert=True)
+        for pid, hits in ranked
+    ]
+    for start in range(0, len(operations), _WRITE_BATCH):
+        await collection.bulk_write(operations[start:start + _WRITE_BATCH], ordered=False)
+    # Participants who left the hackathon since the previous run
+    removed = await collection.delete_many({"hid": hidx, "runId": {"$ne": run_id}})
+    _remember_materialized(hidx, bool(ranked))
+
+    return {
+        "hackathonId": hidx,
+        "registered": registered,
+        "materialized": len(ranked),
+        "removed": removed.deleted_count,
+        "topK": top_k,
+        "runId": run_id,
+    }
+
+
+def _fingerprints(pidx: str, hidx: str):
+    user, target = get_participant_embedding(pidx), get_hackathon_embedding(hidx)
+    if user is None or target is None:
+        return None, None
+    return vector_fingerprint(user), vector_fingerprint(target)
+
+
+def _remember_materialized(hidx: str, materialized: bool):
+    global _materialized_hids
+    expires_at, hids = _materialized_hids
+    _materialized_hids = (expires_at, (hids | {hidx}) if materialized else (hids - {hidx}))
+
+
+async def _is_materialized(hidx: str) -> bool:
+    """
+    Whether hidx has stored lists, from a per-process set refreshed with one
+    distinct() query per TTL, so requests for hackathons that were never
+    materialized cost no Mongo round trip.
+    """
+    global _materialized_hids
+    expires_at, hids = _materialized_hids
+    if expires_at < time.monotonic():
+        hids = frozenset(await get_async_materialized_recommendations_collection().distinct("hid"))
+        _materialized_hids = (time.monotonic() + MATERIALIZED_HACKATHONS_TTL, hids)
+    return hidx in hids
+
+
+async def get_materialized_recommendations(pidx: str, hidx: str, top_k: int):
+    """Stored recommendations for (pidx, hidx) if they are still current, else None (use the live search)."""
+    if not await _is_materialized(hidx):
+        _stats["skipped"] += 1
+        return None
+    doc = await get_async_materialized_recommendations_collection().find_one({"_id": f"{hidx}:{pidx}"})
+    if doc is None or doc.get("topK", 0) < top_k:
+        _stats["misses"] += 1
+        return None
+    # Both vectors are usually served from the in-process vector cache (the live path reads them too)
+    user_fingerprint, target_fingerprint = await run_milvus(_fingerprints, pidx, hidx)
+    if user_fingerprint != doc["userFingerprint"] or target_fingerprint != doc["targetFingerprint"]:
+        _stats["stale"] += 1
+        return None
+    _stats["hits"] += 1
+    return doc["recommendations"][:top_k]
+
+
+def materialized_stats():
+    return dict(_stats)
+
+
+async def _run(hids, top_k):
+    for hidx in hids:
+        print(f"✅ {await materialize_hackathon(hidx, top_k)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute teammate recommendations for hackathons")
+    parser.add_argument("hackathon_ids", nargs="+")
+    parser.add_argument("--top-k", type=int, default=MATERIALIZE_TOP_K)
+    args = parser.parse_args()
+    asyncio.run(_run(args.hackathon_ids, args.top_k))
+
+
+if __name__ == "__main__":
+    main()
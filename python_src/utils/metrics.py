@@ -0,0 +1,208 @@
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ContextDecorator
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-second LLM calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# For 0..1 ratios such as recall / overlap
+RATIO_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0)
+# Send a Server-Timing header on every response instead of only when the request asks for it
+SERVER_TIMING_ALWAYS = os.getenv("SERVER_TIMING", "0") == "1"
+
+_server_timings = contextvars.ContextVar("server_timings", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(name: str, value: float, buckets=BUCKETS, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(key, Histogram(buckets))
+    histogram.observe(value)
+
+
+class timed(ContextDecorator):
+    """
+    Time a block or function into the saathi_stage_seconds histogram:
+
+        with timed("forward"):
+            ...
+
+        @timed("mongo_find", collection="hackathons")
+        def fetch(...): ...
+
+    When the current request asked for Server-Timing, the duration is also
+    reported in that header. The header list lives in a context variable:
+    work handed to run_milvus or asyncio.to_thread carries it along, while
+    long-lived worker threads do not see it. The embedding batcher copies
+    the stages it collects into each caller's list (collect_timings); write
+    buffer flushes and index maintenance only reach the histograms.
+    """
+
+    def __init__(self, stage: str, metric: str = "saathi_stage_seconds", **labels):
+        self.stage = stage
+        self.metric = metric
+        self.labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call, so concurrent calls don't share a start time
+        return type(self)(self.stage, self.metric, **self.labels)
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._started
+        observe(self.metric, elapsed, stage=self.stage, **self.labels)
+        timings = _server_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+def timed_milvus(op: str, collection: str):
+    """Time one Milvus collection operation (query, search, upsert, flush, load, ...)."""
+    return timed(f"milvus_{op}", metric="saathi_milvus_op_seconds", op=op, collection=collection)
+
+
+def start_request_timing(requested: bool):
+    """Begin collecting Server-Timing entries for this request if asked for (or always-on)."""
+    if requested or SERVER_TIMING_ALWAYS:
+        return _server_timings.set([])
+    return None
+
+
+def finish_request_timing(token):
+    """Return the Server-Timing header value for this request, or None."""
+    if token is None:
+        return None
+    timings = _server_timings.get()
+    _server_timings.reset(token)
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings)
+
+
+def request_timings():
+    """The current request's Server-Timing entries (None when not collected), to hand to another thread."""
+    return _server_timings.get()
+
+
+def collect_timings(fn, *args):
+    """Run fn(*args) collecting the stages it times on this thread; returns (result, [(stage, seconds), ...])."""
+    timings = []
+    token = _server_timings.set(timings)
+    try:
+        return fn(*args), timings
+    finally:
+        _server_timings.reset(token)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def render_prometheus(gauges=None) -> str:
+    """Prometheus text exposition of every histogram plus optional {name: value} gauges."""
+    lines = []
+    seen = set()
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    for (name, labels), histogram in items:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        with histogram._lock:
+            counts, total, count = list(histogram.counts), histogram.total, histogram.count
+        cumulative = 0
+        for bound, bucket_count in zip(list(histogram.buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    for name, value in (gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock sampler: a background thread snapshots every
+    thread's stack at a fixed interval and counts collapsed stacks, which can
+    be rendered as folded text for flamegraph tools. Off unless started.
+    """
+
+    def __init__(self):
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self.interval = 0.01
+        self.samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = 10.0):
+        if self.running:
+            return
+        self.interval = max(1.0, interval_ms) / 1000.0
+        self._stacks = Counter()
+        self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self, limit: int = 200) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common(limit)) + "\n"
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+profiler = SamplingProfiler()
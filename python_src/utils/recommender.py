@@ -1,39 +1,130 @@
 # import heapq
+import os
+import random
 import numpy as np
 # from pymilvus import Collection
 # from typing import List, Tuple
 # from sklearn.metrics.pairwise import cosine_similarity
-from ..db.milvus_client import get_hackathon_collection, get_participant_collection
+from ..db.milvus_client import (
+    get_participant_collection, ensure_loaded, run_milvus,
+    get_participant_embedding, get_hackathon_embedding,
+    get_participant_embeddings, get_hackathon_embeddings, _in_expr,
+)
+from ..db.membership import hackathon_scope
+from ..db.recommendation_cache import recommendation_cache
+from ..db.local_search import get_participant_index
+from ..db.index_manager import search_params as index_search_params
+from .metrics import timed, timed_milvus, observe, RATIO_BUCKETS
 
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "milvus")  # milvus | local | shadow
+# Fraction of searches compared against the local index in shadow mode
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.05"))
 
 
-def recommend_teammates(pidx: str, hidx: str, top_k: int = 10):
-    participants = get_participant_collection()
-    hackathons = get_hackathon_collection()
+
+def _milvus_search(vectors, top_k: int, exclude, ef: int = None, nprobe: int = None, include=None):
+    participants = ensure_loaded(get_participant_collection())
     
-    participants.load()
-    hackathons.load()
+    # Scoped searches filter on the primary key, so Milvus only scores those rows
+    clauses = [_in_expr("pid", include)] if include is not None else []
+    # A single query can push its exclusions into the filter expression; a
+    # multi-vector search shares one expression, so over-fetch and filter instead
+    extra = max(len(ids) for ids in exclude) if exclude else 0
+    if len(vectors) == 1 and exclude:
+        clauses.extend(f'pid != "{pid}"' for pid in exclude[0])
+    expr = " and ".join(clauses) or None
     
-    # Get participant embedding (user_emb_a)
-    participant_data = participants.query(
-        expr=f'pid == "{pidx}"',
-        output_fields=["embedding"]
-    )
+    # ef / nprobe trade recall for latency; they apply to whichever index is built
+    search_params = index_search_params(participants, top_k + extra, ef=ef, nprobe=nprobe)
     
-    # Get hackathon embedding (target_emb)
-    hackathon_data = hackathons.query(
-        expr=f'hid == "{hidx}"',
-        output_fields=["embedding"]
+    with timed_milvus("search", "participants"):
+        results = participants.search(
+            data=[np.asarray(v, dtype=np.float32).tolist() for v in vectors],
+            anns_field="embedding",
+            param=search_params,
+            limit=top_k + extra,
+            expr=expr,
+            output_fields=["pid"]
+        )
+    
+    # Process results (filter out any accidental self-matches)
+    out = []
+    for i, hits in enumerate(results):
+        skip = set(exclude[i]) if exclude else set()
+        out.append([
+            (hit.entity.get("pid"), float(hit.score))
+            for hit in hits if hit.entity.get("pid") not in skip
+        ][:top_k])
+    return out
+
+
+def _local_search(vectors, top_k: int, exclude, nprobe: int = None, include=None):
+    """Search the in-process index; None while it is still being built."""
+    index = get_participant_index()
+    if index is None:
+        return None
+    with timed("local_search", engine=index.kind):
+        if index.kind == "ivf":
+            return index.search(vectors, top_k, exclude=exclude, include=include, nprobe=nprobe)
+        return index.search(vectors, top_k, exclude=exclude, include=include)
+
+
+def search_participants(vectors, top_k: int, exclude=None, ef: int = None, nprobe: int = None, include=None):
+    """
+    Cosine top-k over the participants for each query vector, skipping the ids
+    in the matching entry of exclude. Returns one list of (pid, score) per query.
+    SEARCH_BACKEND picks Milvus, the in-process index, or shadow mode (serve
+    Milvus, compare a sample against the local index and record the top-k
+    overlap in the saathi_shadow_overlap histogram). ef (HNSW)
+    and nprobe (IVF) override the index's default search breadth; include
+    restricts every query to those ids (e.g. a hackathon's participants).
+    """
+    if include is not None and not include:
+        return [[] for _ in range(len(vectors))]
+    if SEARCH_BACKEND == "local":
+        results = _local_search(vectors, top_k, exclude, nprobe=nprobe, include=include)
+        if results is not None:
+            return results
+
+    results = _milvus_search(vectors, top_k, exclude, ef=ef, nprobe=nprobe, include=include)
+    if SEARCH_BACKEND == "shadow" and random.random() < SHADOW_SAMPLE_RATE:
+        try:
+            local = _local_search(vectors, top_k, exclude, nprobe=nprobe, include=include) or []
+            for milvus_hits, local_hits in zip(results, local):
+                expected = {pid for pid, _ in milvus_hits}
+                overlap = len(expected & {pid for pid, _ in local_hits}) / len(expected) if expected else 1.0
+                observe("saathi_shadow_overlap", overlap, buckets=RATIO_BUCKETS, scoped=str(include is not None).lower())
+        except Exception as e:
+            print(f"❌ Shadow local search failed: {str(e)}")
+    return results
+
+
+def _cache_kind(kind: str, ef: int = None, nprobe: int = None) -> str:
+    # Results searched with non-default breadth are cached separately
+    if ef is None and nprobe is None:
+        return kind
+    return f"{kind}[ef={ef},nprobe={nprobe}]"
+
+
+def recommend_teammates(pidx: str, hidx: str, top_k: int = 10, ef: int = None, nprobe: int = None):
+    """Ranked teammates for pidx in hidx, served from the recommendation cache when possible."""
+    return recommendation_cache.get_or_compute(
+        _cache_kind("teammates", ef, nprobe), pidx, hidx, top_k,
+        lambda: _recommend_teammates(pidx=pidx, hidx=hidx, top_k=top_k, ef=ef, nprobe=nprobe),
     )
+
+
+def _recommend_teammates(pidx: str, hidx: str, top_k: int = 10, ef: int = None, nprobe: int = None):
+    # Get participant embedding (user_emb_a) and hackathon embedding (target_emb);
+    # both reflect writes still sitting in the write-behind buffer
+    user_emb_a = get_participant_embedding(pidx)
+    target_emb = get_hackathon_embedding(hidx)
     
-    if not participant_data:
+    if user_emb_a is None:
         raise ValueError(f"Participant {pidx} not found")
-    if not hackathon_data:
+    if target_emb is None:
         raise ValueError(f"Hackathon {hidx} not found")
     
-    user_emb_a = participant_data[0]["embedding"]
-    target_emb = hackathon_data[0]["embedding"]
-    
     # Step 2: Calculate adjusted target embedding
     user_emb_a_np = np.array(user_emb_a)
     target_emb_np = np.array(target_emb)
@@ -51,35 +142,201 @@ def recommend_teammates(pidx: str, hidx: str, top_k: int = 10):
 
     # print(np.linalg.norm(normalized_user_emb_b_np))
 
-    # Convert back to list for Milvus search
-    user_emb_b = normalized_user_emb_b_np.tolist()
-    
-    # Step 3: Search for similar participants (excluding the original pidx)
-    search_params = {
-        "metric_type": "COSINE",
-        "params": {"nprobe": 10}  # Adjust based on your index
-    }
+    # Step 3: Search the hackathon's participants (excluding the original pidx)
+    hits = search_participants([normalized_user_emb_b_np], top_k=top_k, exclude=[[pidx]], ef=ef, nprobe=nprobe,
+                               include=hackathon_scope(hidx))[0]
     
-    # Search in participants collection (excluding the original participant)
-    results = participants.search(
-        data=[user_emb_b],  # Search with adjusted target
-        anns_field="embedding",
-        param=search_params,
-        limit=top_k + 1,  # Get extra to account for potential self-match
-        expr=f'pid != "{pidx}"',  # Exclude the original participant
-        output_fields=["pid"]  # Return participant IDs
+    # Return top_k results
+    return [
+        {"pid": pid, "similarity_score": score, "distance": score}
+        for pid, score in hits
+    ]
+
+
+def recommend_teammates_batch(pairs, top_k: int = 10, ef: int = None, nprobe: int = None):
+    """
+    recommend_teammates for many (pidx, hidx) pairs at once. Cached pairs are
+    served directly; for the rest all embeddings are fetched with one query
+    per collection, every `target - user` vector is computed in one NumPy step
+    and they go out as one multi-vector search per hackathon.
+    Returns one {"uidx", "hidx", "recommendations" | "error"} dict per pair.
+    """
+    pairs = list(dict.fromkeys((str(pidx), str(hidx)) for pidx, hidx in pairs))
+    results = {}
+    pending = []
+    for pidx, hidx in pairs:
+        key, cached = recommendation_cache.lookup(_cache_kind("teammates", ef, nprobe), pidx, hidx, top_k)
+        if cached is not None:
+            results[(pidx, hidx)] = {"recommendations": cached}
+        else:
+            pending.append((pidx, hidx, key))
+
+    if pending:
+        users = get_participant_embeddings([pidx for pidx, _, _ in pending])
+        targets = get_hackathon_embeddings([hidx for _, hidx, _ in pending])
+        ready = []
+        for pidx, hidx, key in pending:
+            if pidx not in users:
+                results[(pidx, hidx)] = {"error": f"Participant {pidx} not found"}
+            elif hidx not in targets:
+                results[(pidx, hidx)] = {"error": f"Hackathon {hidx} not found"}
+            else:
+                ready.append((pidx, hidx, key))
+
+        if ready:
+            user_matrix = np.stack([users[pidx] for pidx, _, _ in ready]).astype(np.float32)
+            target_matrix = np.stack([targets[hidx] for _, hidx, _ in ready]).astype(np.float32)
+            queries = target_matrix - user_matrix
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            queries /= norms
+
+            # One multi-vector search per hackathon, scoped to its participants
+            by_hackathon = {}
+            for i, (_, hidx, _) in enumerate(ready):
+                by_hackathon.setdefault(hidx, []).append(i)
+            hits = [None] * len(ready)
+            for hidx, rows in by_hackathon.items():
+                group_hits = search_participants(
+                    queries[rows], top_k=top_k, exclude=[[ready[i][0]] for i in rows],
+                    ef=ef, nprobe=nprobe, include=hackathon_scope(hidx),
+                )
+                for i, row_hits in zip(rows, group_hits):
+                    hits[i] = row_hits
+            for (pidx, hidx, key), pair_hits in zip(ready, hits):
+                recommendations = [
+                    {"pid": pid, "similarity_score": score, "distance": score}
+                    for pid, score in pair_hits
+                ]
+                recommendation_cache.store(key, recommendations)
+                results[(pidx, hidx)] = {"recommendations": recommendations}
+
+    return [{"uidx": pidx, "hidx": hidx, **results[(pidx, hidx)]} for pidx, hidx in pairs]
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def recommend_team(member_pids, hidx: str, team_size: int = 4, beam_width: int = 3, pool_size: int = 50,
+                   ef: int = None, nprobe: int = None):
+    """
+    Complete a partial team for a hackathon.
+
+    One ANN search with the team's residual (target - current team vector)
+    pulls a pool of candidates; a beam search then fills the open slots,
+    scoring each extension by the cosine between the summed team vector and
+    the hackathon embedding. Each step scores every beam x candidate
+    extension in one vectorized pass. Returns up to beam_width suggestions,
+    best first.
+    """
+    member_pids = [str(pid) for pid in dict.fromkeys(member_pids)]
+    open_slots = team_size - len(member_pids)
+    if not member_pids:
+        raise ValueError("At least one team member is required")
+    if open_slots <= 0:
+        raise ValueError(f"Team already has {len(member_pids)} members (team_size={team_size})")
+
+    members = get_participant_embeddings(member_pids)
+    missing = [pid for pid in member_pids if pid not in members]
+    if missing:
+        raise ValueError(f"Participants not found: {', '.join(missing)}")
+    target = get_hackathon_embedding(hidx)
+    if target is None:
+        raise ValueError(f"Hackathon {hidx} not found")
+
+    target = _normalize_rows(np.asarray(target, dtype=np.float32))
+    team_sum = np.sum([members[pid] for pid in member_pids], axis=0).astype(np.float32)
+
+    # Candidate pool from a single search with the team's residual
+    residual = _normalize_rows(target - _normalize_rows(team_sum))
+    pool_hits = search_participants([residual], top_k=max(pool_size, open_slots), exclude=[member_pids],
+                                    ef=ef, nprobe=nprobe, include=hackathon_scope(hidx))[0]
+    pool_vectors = get_participant_embeddings([pid for pid, _ in pool_hits])
+    pool_ids = [pid for pid, _ in pool_hits if pid in pool_vectors]
+    if not pool_ids:
+        return []
+    pool = np.stack([pool_vectors[pid] for pid in pool_ids]).astype(np.float32)
+    open_slots = min(open_slots, len(pool_ids))
+
+    # Each beam: (chosen pool indices, summed team vector)
+    beams = [((), team_sum)]
+    for _ in range(open_slots):
+        sums = np.stack([beam_sum for _, beam_sum in beams])          # (B, d)
+        extended = sums[:, None, :] + pool[None, :, :]                 # (B, m, d)
+        scores = _normalize_rows(extended) @ target                    # (B, m)
+        for b, (chosen, _) in enumerate(beams):
+            scores[b, list(chosen)] = -np.inf
+
+        next_beams = []
+        seen = set()
+        for flat in np.argsort(-scores, axis=None):
+            b, c = divmod(int(flat), len(pool_ids))
+            if not np.isfinite(scores[b, c]):
+                break
+            chosen = tuple(sorted(beams[b][0] + (c,)))
+            if chosen in seen:
+                continue
+            seen.add(chosen)
+            next_beams.append((chosen, extended[b, c]))
+            if len(next_beams) == beam_width:
+                break
+        beams = next_beams
+
+    return [
+        {
+            "pids": [pool_ids[c] for c in chosen],
+            "coverage": float(_normalize_rows(beam_sum) @ target),
+        }
+        for chosen, beam_sum in beams
+    ]
+
+
+def recommend_similar_participants(pidx: str, top_k: int = 50, ef: int = None, nprobe: int = None):
+    """
+    Pure AI-based teammate recommendations without hackathon context.
+    Finds users with complementary skills using vector similarity.
+    """
+    return recommendation_cache.get_or_compute(
+        _cache_kind("similar", ef, nprobe), pidx, None, top_k,
+        lambda: _recommend_similar_participants(pidx=pidx, top_k=top_k, ef=ef, nprobe=nprobe),
     )
+
+
+def _recommend_similar_participants(pidx: str, top_k: int = 50, ef: int = None, nprobe: int = None):
+    # Get user's skill embedding
+    user_embedding = get_participant_embedding(pidx)
     
-    # Process results (filter out any accidental self-matches)
-    similar_participants = []
-    for hits in results:
-        for hit in hits:
-            if hit.entity.get("pid") != pidx:  # Double-check exclusion
-                similar_participants.append({
-                    "pid": hit.entity.get("pid"),
-                    "similarity_score": hit.score,
-                    "distance": hit.distance
-                })
+    if user_embedding is None:
+        raise ValueError(f"User {pidx} not found in AI database. Please sync their skills first.")
     
-    # Return top_k results
-    return similar_participants[:top_k]
\ No newline at end of file
+    # Search for similar users (complementary skills)
+    # Using COSINE similarity to find users with related but different skill sets
+    hits = search_participants([user_embedding], top_k=top_k, exclude=[[pidx]], ef=ef, nprobe=nprobe)[0]
+    
+    return [
+        {"pid": pid, "ai_score": score, "distance": score}
+        for pid, score in hits
+    ]
+
+
+async def recommend_teammates_async(pidx: str, hidx: str, top_k: int = 10, ef: int = None, nprobe: int = None):
+    return await run_milvus(recommend_teammates, pidx=pidx, hidx=hidx, top_k=top_k, ef=ef, nprobe=nprobe)
+
+
+async def recommend_teammates_batch_async(pairs, top_k: int = 10, ef: int = None, nprobe: int = None):
+    return await run_milvus(recommend_teammates_batch, pairs=pairs, top_k=top_k, ef=ef, nprobe=nprobe)
+
+
+async def recommend_team_async(member_pids, hidx: str, team_size: int = 4, beam_width: int = 3, pool_size: int = 50,
+                               ef: int = None, nprobe: int = None):
+    return await run_milvus(
+        recommend_team, member_pids=member_pids, hidx=hidx,
+        team_size=team_size, beam_width=beam_width, pool_size=pool_size, ef=ef, nprobe=nprobe,
+    )
+
+
+async def recommend_similar_participants_async(pidx: str, top_k: int = 50, ef: int = None, nprobe: int = None):
+    return await run_milvus(recommend_similar_participants, pidx=pidx, top_k=top_k, ef=ef, nprobe=nprobe)
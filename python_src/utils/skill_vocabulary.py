@@ -0,0 +1,89 @@
+import threading
+
+import numpy as np
+
+
+class SkillVocabulary:
+    """
+    One embedding row per distinct (normalized) skill, for composing skill-list
+    vectors without running the model over the whole list.
+
+    Rows live in a growing float32 matrix; each skill is embedded once, on its
+    own, and persisted through the embedding cache under the same key a
+    one-skill list gets, so rows survive restarts and are shared by workers.
+    A list vector is the L2-normalized (optionally weighted) sum of its rows,
+    computed for many lists at once with a single gather and np.add.reduceat,
+    so an edited list is simply recomposed from its rows.
+    """
+
+    def __init__(self, dim: int, cache, cache_key):
+        self.dim = dim
+        self.cache = cache
+        self.cache_key = cache_key  # skill -> embedding cache key
+        self._matrix = np.zeros((256, dim), dtype=np.float32)
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, skill):
+        return skill in self._rows
+
+    def missing(self, skills):
+        """
+        Skills that still need a model call. Skills unknown to the matrix but
+        present in the embedding cache are loaded into it on the way.
+        """
+        with self._lock:
+            unknown = [skill for skill in dict.fromkeys(skills) if skill not in self._rows]
+        still_missing = []
+        for skill in unknown:
+            embedding = self.cache.get(self.cache_key(skill))
+            if embedding is None:
+                still_missing.append(skill)
+            else:
+                self._store([skill], [embedding])
+        return still_missing
+
+    def add(self, skills, embeddings):
+        """Store freshly embedded skills in the matrix and the persistent cache."""
+        for skill, embedding in zip(skills, embeddings):
+            self.cache.put(self.cache_key(skill), embedding)
+        self._store(skills, embeddings)
+
+    def _store(self, skills, embeddings):
+        with self._lock:
+            for skill, embedding in zip(skills, embeddings):
+                row = self._rows.get(skill)
+                if row is None:
+                    row = len(self._rows)
+                    if row == self._matrix.shape[0]:
+                        grown = np.zeros((2 * row, self.dim), dtype=np.float32)
+                        grown[:row] = self._matrix
+                        self._matrix = grown
+                    self._rows[skill] = row
+                self._matrix[row] = embedding
+
+    def pooled_sums(self, skill_lists, weights=None):
+        """Unnormalized (weighted) sum of the rows of each list; every skill must be present."""
+        lengths = np.array([len(skills) for skills in skill_lists], dtype=np.int64)
+        sums = np.zeros((len(skill_lists), self.dim), dtype=np.float32)
+        if lengths.sum() == 0:
+            return sums
+        flat = [skill for skills in skill_lists for skill in skills]
+        with self._lock:
+            gathered = self._matrix[[self._rows[skill] for skill in flat]]
+        if weights:
+            gathered *= np.array([weights.get(skill, 1.0) for skill in flat], dtype=np.float32)[:, None]
+        non_empty = lengths > 0
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])[non_empty]
+        sums[non_empty] = np.add.reduceat(gathered, offsets, axis=0)
+        return sums
+
+    def compose(self, skill_lists, weights=None):
+        """(n, dim) L2-normalized pooled vectors, one per skill list; empty lists give zero rows."""
+        sums = self.pooled_sums(skill_lists, weights)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return sums / norms